@@ -37,5 +37,6 @@ def config():
         # 'affect' : GPTAffectTransducer()
     },
     'embedder': STEmbedder(),
+    'parallel_transducers': True,
     'session_number': 1
   }
\ No newline at end of file
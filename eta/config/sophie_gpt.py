@@ -36,5 +36,6 @@ def config():
         'affect' : GPTAffectTransducer()
     },
     'embedder': DummyEmbedder(),
+    'parallel_transducers': True,
     'session_number': SESSION_NUMBER
   }
\ No newline at end of file
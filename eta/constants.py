@@ -5,7 +5,10 @@ other Eta modules. Generally, it can be imported using `from eta.constants impor
 """
 
 SLEEPTIME = .1
-"""float: The time used to sleep between each iteration of Eta's core processes."""
+"""float: The time used to sleep between each iteration of Eta's core processes that poll for external inputs (i.e., perception)."""
+
+UPDATE_CHANNELS = ['observations', 'inferences', 'actions', 'plans', 'plan', 'context']
+"""list[str]: The channels of the dialogue state whose modifications wake any core processes waiting on them, i.e., the buffers, plan, and context."""
 
 REASONING_DEPTH_LIMIT = 3
 """int: How many 'inference steps' from a direct observation to take during the reasoning process."""
@@ -16,11 +19,32 @@ EMBEDDING_DEFAULT_API = "https://api-inference.huggingface.co/pipeline/feature-e
 EMBEDDING_DEFAULT_MODEL = "sentence-transformers/all-distilroberta-v1"
 """str: Default embedding model, used if no other model is specified in an embedder."""
 
+EMBEDDING_BATCH_SIZE = 64
+"""int: Default number of texts embedded per call to an embedding model or API, used if no other batch size is specified in an embedder."""
+
+DEFAULT_EMBEDDING_CACHE = True
+"""bool: Whether to cache the embeddings computed by an embedder (both in memory and on disk), if not specified in agent-config."""
+
+EMBEDDING_CACHE_SIZE = 10000
+"""int: The maximum number of embeddings kept in the in-memory (LRU) tier of an embedding cache."""
+
 KEY_PATH = '_keys/'
 """str: Directory to check for API keys."""
 
+CACHE_PATH = '_cache/'
+"""str: Directory used to cache artifacts built from source files (e.g., parsed schemas and choice trees)."""
+
+CACHE_VERSION = 1
+"""int: The version of the cache format, which should be incremented whenever the format of cached artifacts changes."""
+
+USE_CACHE = True
+"""bool: Whether to cache artifacts built from source files, such that they are only rebuilt if the source file changes."""
+
 SYMTAB_PATH = 'io/symtab.json'
-"""str: Path used to create the symbol table (a dict structure maintaining indices for each unique symbol)."""
+"""str: Path used to create the symbol table (a dict structure maintaining the highest index reserved for each unique symbol)."""
+
+SYMTAB_BLOCK_SIZE = 100
+"""int: The number of symbol indices that each process reserves from the symbol table at a time."""
 
 COREFERENCE_MODE = 1
 """int: The level of coreference to use.
@@ -82,6 +106,72 @@ DEFAULT_IMPORTANCE = .25
 DEFAULT_IMPORTANCE_THRESHOLD = .5
 """float: The default threshold to place on importance when retrieving facts from memory."""
 
+MEMORY_INITIAL_CAPACITY = 1024
+"""int: The initial number of memory slots allocated for the arrays used for retrieval in memory storage (doubled whenever full)."""
+
+DEFAULT_MEMORY_CAPACITY = None
+"""int or None: The default maximum number of memories stored in memory storage (beyond which the least relevant are evicted), if not specified in agent-config. If None, memory is unbounded."""
+
+MEMORY_EVICTION_FRACTION = .1
+"""float: The fraction of memory capacity that is freed whenever memory storage exceeds its capacity."""
+
+MEMORY_ARCHIVE_FILE = 'memory-archive.pkl'
+"""str: The file (within the IO directory of a session) used to archive memories evicted from memory storage, if enabled in agent-config."""
+
+DEFAULT_MEMORY_BACKEND = 'memory'
+"""str: The default backend of memory storage, if not specified in agent-config (either ``memory`` for in-memory storage, or ``sqlite`` for storage persisted across sessions)."""
+
+MEMORY_DB_DIR = 'memory/'
+"""str: The directory (within the IO directory of a user) in which persistent memory storage is kept."""
+
+MEMORY_DB_FILE = 'memory.db'
+"""str: The SQLite database (within the persistent memory directory) containing each persisted memory."""
+
+MEMORY_EMBEDDINGS_FILE = 'embeddings.f32'
+"""str: The append-only file (within the persistent memory directory) containing the embedding of each persisted memory, as raw float32 rows."""
+
+DEFAULT_VECTOR_INDEX = 'flat'
+"""str: The default type of vector index used to retrieve schemas and memories (``flat``, ``ivf``, or ``hnsw``), if not specified in agent-config."""
+
+VECTOR_INDEX_INITIAL_CAPACITY = 1024
+"""int: The initial number of vectors allocated for in a vector index (doubled whenever full)."""
+
+VECTOR_INDEX_CANDIDATE_FACTOR = 10
+"""int: When retrieving memories using an approximate vector index, the number of candidates retrieved by salience (as a multiple of the number of memories to retrieve)."""
+
+IVF_NPROBE = 16
+"""int: The default number of clusters searched for each query in an IVF vector index."""
+
+IVF_MIN_TRAIN = 1024
+"""int: The minimum number of vectors in an IVF vector index before its clusters are trained (the index is searched exhaustively until then)."""
+
+IVF_RETRAIN_FACTOR = 4
+"""float: The factor by which an IVF vector index must grow before its clusters are re-trained."""
+
+IVF_NITER = 10
+"""int: The number of k-means iterations used to train the clusters of an IVF vector index."""
+
+IVF_TRAIN_SAMPLE = 64
+"""int: The number of vectors sampled per cluster to train the clusters of an IVF vector index."""
+
+IVF_ASSIGN_BATCH = 4096
+"""int: The number of vectors assigned to clusters at a time after training an IVF vector index."""
+
+HNSW_M = 16
+"""int: The default number of links created for each new element of an HNSW vector index."""
+
+HNSW_EF_CONSTRUCTION = 200
+"""int: The default size of the candidate list used to construct an HNSW vector index."""
+
+HNSW_EF = 64
+"""int: The default size of the candidate list used to search an HNSW vector index."""
+
+DEFAULT_PARALLEL_TRANSDUCERS = False
+"""bool: Whether to apply independent transducer calls in parallel by default, if not specified in agent-config."""
+
+HOST_MAX_WORKERS = 16
+"""int: The default maximum number of threads used to run the core loop steps of all sessions in a session host."""
+
 
 
 # Common variables/constants
@@ -22,28 +22,37 @@ over the dialogue session, which is necessary for:
 """
 
 import argparse
+import asyncio
+from time import thread_time
 from importlib import import_module
+from contextlib import contextmanager
 
 from multiprocessing import Process
 from multiprocessing import Lock
+from multiprocessing import Condition
+from threading import Lock as ThreadLock
+from concurrent.futures import ThreadPoolExecutor
 from multiprocessing.managers import BaseManager
 
 from eta.constants import *
-from eta.util.general import gentemp, clear_symtab, remove_duplicates, remove_nil, append, variablep, episode_name
+from eta.util.general import (gentemp, clear_symtab, save_symtab, remove_duplicates, remove_nil, append, variablep, episode_name,
+                              listp)
 import eta.util.file as file
 import eta.util.time as time
 import eta.util.buffer as buffer
+from eta.util.cache import clear_cache
 from eta.lf import (equal_prop_p, not_prop_p, and_prop_p, or_prop_p, characterizes_prop_p, expectation_p,
-                    from_lisp_dirs, list_to_s_expr)
+                    from_lisp_dirs, list_to_s_expr, embed_eventualities)
+from eta.embedding import cache_embedder
 from eta.discourse import get_prior_words
-from eta.memory import MemoryStorage
+from eta.memory import MemoryStorage, MemoryArchive, PersistentMemoryStorage
 from eta.schema import SchemaLibrary
 from eta.plan import init_plan_from_eventualities
 
-from eta.core.perception import perception_loop
-from eta.core.reasoning import reasoning_loop
-from eta.core.planning import planning_loop
-from eta.core.execution import execution_loop
+from eta.core.perception import perception_loop, perception_step
+from eta.core.reasoning import reasoning_loop, reasoning_step
+from eta.core.planning import planning_loop, planning_step
+from eta.core.execution import execution_loop, execution_step, time_until_step_failure
 
 
 class DialogueState():
@@ -55,6 +64,19 @@ class DialogueState():
     The config parameters for the agent.
   config_user : dict
     The config parameters for the user.
+  schemas : SchemaLibrary, optional
+    A prebuilt schema library (e.g., shared between multiple sessions). If not given, the schema
+    library is read from the schema directories in the agent config.
+  init_knowledge : list[Eventuality], optional
+    A prebuilt list of initial facts. If not given, these are read from the knowledge directories
+    in the agent config (if any).
+  log_path : str, optional
+    The path used to write logs for this session. If not given, a directory named after the start time
+    of the session is used.
+  transducer_executor : concurrent.futures.Executor, optional
+    An executor used to run parallel transducer calls (e.g., shared between multiple sessions). If not given,
+    and `parallel_transducers` is enabled, a thread pool is created for this session, and shut down when the
+    session is closed (see `close`).
 
   Attributes
   ----------
@@ -81,10 +103,19 @@ class DialogueState():
     A POSIX time record used to track time before failing an expected event.
   quit_conversation : bool
     Whether to quit the current session.
+  turn_start_time : float or None
+    A POSIX time record of the most recent user input that hasn't yet been responded to, if any.
+  turn_latencies : list[float]
+    The latency (in seconds) between each user input and the subsequent output of the agent.
   transducers : dict[str, Transducer or list[Transducer]]
     A dict associating Transducer object(s) with named mapping functions (e.g., 'gist').
+  parallel_transducers : bool
+    Whether independent transducer calls (i.e., those made together through `apply_transducers`)
+    should be run in parallel, as opposed to in sequence.
   embedder : Embedder
     An embedder object used to compute object embeddings and perform retrieval.
+  vector_index : str
+    The type of vector index used to retrieve schemas and memories by embedding similarity (see ``eta.index``).
   schemas : SchemaLibrary
     A library of dialogue, episode, and object schemas that form the agent's generic knowledge.
   concept_aliases : None
@@ -109,10 +140,24 @@ class DialogueState():
     The episodic memory of the agent, initialized from `init_knowledge`.
   timegraph : None
     TODO
+
+  Notes
+  -----
+  Each modification to the buffers, plan, or context increments the version of the corresponding update channel
+  (see `UPDATE_CHANNELS`), allowing the core processes to block until their inputs change using `wait_for_update`,
+  rather than continuously polling the dialogue state.
+
+  When the dialogue state is shared by core loops running in a single process (see `eta_async`), objects
+  returned by the dialogue state are not copied, so the steps of each loop are run under a shared "step lock",
+  which is only released during blocking calls (i.e., transducer and embedding calls).
   """
 
-  def __init__(self, config_agent, config_user):
+  def __init__(self, config_agent, config_user, schemas=None, init_knowledge=None, log_path=None, transducer_executor=None):
     self._lock = Lock()
+    self._update = Condition()
+    self._versions = {channel: 0 for channel in UPDATE_CHANNELS}
+    self._listeners = []
+    self._step_lock = None
 
     # session variables
     self.id = gentemp('SESSION')
@@ -121,25 +166,61 @@ class DialogueState():
     self.start_schema = config_agent['start_schema'] if 'start_schema' in config_agent else DEFAULT_START
     self.start_time = time.TimePoint()
     self.io_path = IO_PATH + config_agent['agent'] + '/' + config_user['user_id'] + '/'
-    self.log_path = LOG_PATH + self.start_time.format_date() + '/'
+    self.log_path = log_path if log_path else LOG_PATH + self.start_time.format_date() + '/'
     self.me = config_agent['agent_name']
     self.you = config_user['user_name']
     self.output_buffer = []
     self.step_failure_timer = time.now()
     self.quit_conversation = False
+    self.turn_start_time = None
+    self.turn_latencies = []
 
     # internal mechanisms
     self.transducers = self.config_agent.pop('transducers')
+    self.parallel_transducers = (config_agent['parallel_transducers'] if 'parallel_transducers' in config_agent
+                                 else DEFAULT_PARALLEL_TRANSDUCERS)
+    self._transducer_locks = {type: Lock() for type in self.transducers}
+    self._transducer_executor = transducer_executor
+    self._owns_transducer_executor = False
+    if transducer_executor is None and self.parallel_transducers:
+      self._transducer_executor = ThreadPoolExecutor(max_workers=max(1, len(self.transducers)))
+      self._owns_transducer_executor = True
     self.embedder = None
     if 'embedder' in config_agent:
       self.embedder = self.config_agent.pop('embedder')
+    if self.embedder and (config_agent['embedding_cache'] if 'embedding_cache' in config_agent else DEFAULT_EMBEDDING_CACHE):
+      self.embedder = cache_embedder(self.embedder)
+    self.vector_index = config_agent['vector_index'] if 'vector_index' in config_agent else DEFAULT_VECTOR_INDEX
+
+    # memory (persisted memories are loaded before any new episodes are generated, to avoid name collisions)
+    importance_threshold = (config_agent['importance_threshold'] if 'importance_threshold' in config_agent 
+                            else DEFAULT_IMPORTANCE_THRESHOLD)
+    memory_capacity = (config_agent['memory_capacity'] if 'memory_capacity' in config_agent
+                       else DEFAULT_MEMORY_CAPACITY)
+    memory_backend = config_agent['memory_backend'] if 'memory_backend' in config_agent else DEFAULT_MEMORY_BACKEND
+    memory_archive = None
+    if 'memory_archive' in config_agent and config_agent['memory_archive']:
+      memory_archive = MemoryArchive(self.io_path + MEMORY_ARCHIVE_FILE, embedder=self.embedder, index=self.vector_index)
+    if memory_backend == 'memory':
+      self.memory = MemoryStorage(self.embedder, importance_threshold=importance_threshold, index=self.vector_index,
+                                  capacity=memory_capacity, archive=memory_archive)
+    elif memory_backend == 'sqlite':
+      self.memory = PersistentMemoryStorage(self.io_path + MEMORY_DB_DIR, self.embedder, importance_threshold=importance_threshold,
+                                            index=self.vector_index, capacity=memory_capacity, archive=memory_archive)
+    else:
+      raise Exception(f'Unknown memory backend: {memory_backend}')
 
     # static knowledge
-    self.schemas = SchemaLibrary(self.embedder).from_lisp_dirs(config_agent['schema_dirs'])
+    if schemas is not None:
+      self.schemas = schemas
+    else:
+      self.schemas = SchemaLibrary(self.embedder, index=self.vector_index).from_lisp_dirs(config_agent['schema_dirs'])
     self.concept_aliases = None # TODO
     self.concept_sets = None # TODO
     self.init_knowledge = []
-    if 'knowledge_dirs' in config_agent:
+    if init_knowledge is not None:
+      self.init_knowledge = init_knowledge
+    elif 'knowledge_dirs' in config_agent:
       self.init_knowledge = from_lisp_dirs(config_agent['knowledge_dirs'])
 
     # dialogue variables
@@ -151,10 +232,12 @@ class DialogueState():
     self.reference_list = []
     self.equality_sets = {}
     self.conversation_log = []
-    importance_threshold = (config_agent['importance_threshold'] if 'importance_threshold' in config_agent 
-                            else DEFAULT_IMPORTANCE_THRESHOLD)
-    self.memory = MemoryStorage(self.embedder, importance_threshold=importance_threshold)
-    self.add_to_memory(self.init_knowledge, importance=[1. for _ in self.init_knowledge])
+    init_knowledge = self.init_knowledge
+    if init_knowledge and self.memory.memories:
+      # Only add initial knowledge that wasn't already persisted in a previous session (which requires
+      # loading any persisted memories, see ``PersistentMemoryStorage``)
+      init_knowledge = [fact for fact in init_knowledge if not self.memory.get_matching(fact.get_wff())]
+    self.add_to_memory(init_knowledge, importance=[1. for _ in init_knowledge])
     self.timegraph = self._make_timegraph()
 
     self._create_session_io_files()
@@ -203,6 +286,65 @@ class DialogueState():
     """Set whether to quit the conversation."""
     with self._lock:
       self.quit_conversation = quit
+    self._notify(*UPDATE_CHANNELS)
+
+  def start_turn_timer(self):
+    """Record the time of a new user input, if the agent hasn't yet responded to a prior input."""
+    with self._lock:
+      if self.turn_start_time is None:
+        self.turn_start_time = time.now()
+
+  def get_turn_latencies(self):
+    """Get the latency (in seconds) between each user input and the subsequent output of the agent."""
+    with self._lock:
+      return self.turn_latencies
+
+  # ----------------
+  # update functions
+  # ----------------
+
+  def wait_for_update(self, channels, versions={}, timeout=None):
+    """Block until any of the given update channels has changed from the given versions, or until quitting the conversation.
+
+    Parameters
+    ----------
+    channels : list[str]
+      The update channels to wait on (see `UPDATE_CHANNELS`).
+    versions : dict[str, int], default={}
+      The versions of each channel that were previously observed. Any channel not included is considered to have
+      changed, i.e., this returns immediately if no versions are given.
+    timeout : float, optional
+      The maximum time (in seconds) to block for, if given.
+
+    Returns
+    -------
+    dict[str, int]
+      The current versions of each of the given channels.
+    """
+    with self._update:
+      self._update.wait_for(lambda: self.quit_conversation or any([self._versions[c] != versions.get(c) for c in channels]),
+                            timeout=timeout)
+      return {c: self._versions[c] for c in channels}
+
+  def get_versions(self, channels):
+    """Get the current versions of each of the given update channels."""
+    with self._update:
+      return {c: self._versions[c] for c in channels}
+
+  def add_listener(self, channels, callback):
+    """Register a callback function to be called (with no arguments) whenever any of the given update channels changes.
+
+    Notes
+    -----
+    The callback is called from whichever thread modified the dialogue state, so it should not block.
+    Since callbacks cannot be shared between processes, this is only supported for an in-process dialogue state.
+    """
+    with self._update:
+      self._listeners.append((channels, callback))
+
+  def set_step_lock(self, lock):
+    """Set a lock held by the core loop steps sharing this dialogue state, to be released during blocking calls."""
+    self._step_lock = lock
 
   # ----------------
   # schema functions
@@ -233,6 +375,7 @@ class DialogueState():
       return
     with self._lock:
       self.plan = plan
+    self._notify('plan')
     
   def do_continue(self):
     """Check whether to continue with the current dialogue."""
@@ -278,8 +421,11 @@ class DialogueState():
     with self._lock:
       if self.plan is not None and self.plan.next:
         self.plan = self.plan.next
+        channels = ['plan']
       else:
         self.quit_conversation = True
+        channels = UPDATE_CHANNELS
+    self._notify(*channels)
 
   def instantiate_curr_step(self):
     """Instantiate the current plan step.
@@ -328,19 +474,25 @@ class DialogueState():
       return
     with self._lock:
       buffer.enqueue(x, self.buffers[type])
+    self._notify(type)
 
   def add_to_buffer_if_empty(self, x, type):
     """Add an element to the buffer of the given type iff that buffer is currently empty."""
     if x is None:
       return
     with self._lock:
-      if buffer.is_empty(self.buffers[type]):
-        buffer.enqueue(x, self.buffers[type])
+      if not buffer.is_empty(self.buffers[type]):
+        return
+      buffer.enqueue(x, self.buffers[type])
+    self._notify(type)
 
   def add_all_to_buffer(self, xs, type):
     """Add all elements in a list to the buffer of the given type."""
+    if not xs:
+      return
     with self._lock:
       buffer.enqueue_ordered(xs, self.buffers[type])
+    self._notify(type)
 
   def replace_buffer(self, x, type):
     """Replace the buffer of the given type with a single element."""
@@ -349,12 +501,14 @@ class DialogueState():
     with self._lock:
       buffer.pop_all(self.buffers[type])
       buffer.enqueue(x, self.buffers[type])
+    self._notify(type)
 
   def replace_all_buffer(self, xs, type):
     """Replace the buffer of the given type with a list of elements."""
     with self._lock:
       buffer.pop_all(self.buffers[type])
       buffer.enqueue_ordered(xs, self.buffers[type])
+    self._notify(type)
 
   def get_buffer(self, type):
     """Get the buffer of the given type."""
@@ -409,33 +563,52 @@ class DialogueState():
 
   def add_to_memory(self, fact, importance=DEFAULT_IMPORTANCE):
     """Add a fact to the memory."""
+    self._embed(fact)
     with self._lock:
-      self.memory.instantiate(fact, importance=importance, context=False)
+      self.memory.instantiate(fact, importance=importance, context=False, embed=False)
 
   def add_to_context(self, fact, importance=DEFAULT_IMPORTANCE):
     """Add a fact to the context."""
+    if not fact:
+      return
+    self._embed(fact)
     with self._lock:
-      self.memory.instantiate(fact, importance=importance)
+      self.memory.instantiate(fact, importance=importance, embed=False)
+    self._notify('context')
 
   def remove_from_context(self, fact):
     """Remove a fact from the context."""
     with self._lock:
       self.memory.remove_matching_from_context(fact)
+    self._notify('context')
 
-  def access_from_context(self, pred_patt):
-    """Access facts from context matching a given predicate pattern."""
+  def access_from_context(self, pred_patt, bindings=False):
+    """Access facts from context matching a given predicate pattern (along with the bindings of each match, if `bindings` is True)."""
     with self._lock:
-      return self.memory.get_from_context(pred_patt, access=True)
+      return self.memory.get_from_context(pred_patt, access=True, bindings=bindings)
     
   def flush_context(self):
     """Flush the dialogue context of "instantaneous" events."""
     with self._lock:
       self.memory.flush_context()
+    self._notify('context')
 
   def get_memory(self):
     """Get the memory storage object."""
     with self._lock:
       return self.memory
+
+  def close_memory(self):
+    """Close the memory storage, writing any remaining changes to disk (if memory is persisted)."""
+    with self._lock:
+      self.memory.close()
+
+  def close(self):
+    """Close the session, closing the memory storage and shutting down the transducer thread pool (if owned by this session)."""
+    self.close_memory()
+    if self._owns_transducer_executor:
+      self._transducer_executor.shutdown()
+      self._owns_transducer_executor = False
     
   def eval_truth_value(self, wff):
     """Evaluate the truth value of a wff in memory/context."""
@@ -471,14 +644,39 @@ class DialogueState():
   # --------------------
     
   def apply_transducer(self, type, *args):
-    """Apply the transducer(s) of the given type to a list of arguments."""
-    with self._lock:
-      if type not in self.transducers:
-        return []
-      if isinstance(self.transducers[type], list):
-        return remove_nil(remove_duplicates(append([t(*args) for t in self.transducers[type]]), order=True))
-      else:
-        return self.transducers[type](*args)
+    """Apply the transducer(s) of the given type to a list of arguments.
+    
+    Notes
+    -----
+    The dialogue state lock is only held while looking up the transducer(s), since transducer calls may take
+    a long time (e.g., in the case of GPT-based transduction), and the arguments are already copies of the dialogue
+    state. Each transducer type instead has its own lock, so that transducers of the same type are never applied
+    concurrently, while transducers of different types may be. If a step lock is set, it is also released for
+    the duration of the call.
+    """
+    with self._blocking():
+      return self._apply_transducer(type, *args)
+    
+  def apply_transducers(self, calls):
+    """Apply a list of independent transducer calls, each given as a tuple of a transducer type followed by the arguments.
+
+    If `parallel_transducers` is enabled, the calls are run in parallel; otherwise, they are run in sequence.
+
+    Parameters
+    ----------
+    calls : list[tuple]
+      A list of tuples of the form ``(type, arg1, arg2, ...)``.
+
+    Returns
+    -------
+    list[list]
+      The result of each transducer call, in the same order as the given calls.
+    """
+    with self._blocking():
+      if not self.parallel_transducers or len(calls) <= 1:
+        return [self._apply_transducer(*call) for call in calls]
+      futures = [self._transducer_executor.submit(self._apply_transducer, *call) for call in calls]
+      return [future.result() for future in futures]
     
   # ---------------
   # other functions
@@ -489,12 +687,14 @@ class DialogueState():
     with self._lock:
       if self.plan:
         self.plan.bind(var, val)
+    self._notify('plan')
     
   def unbind(self, var):
     """Unbind the given variable symbol throughout the dialogue state."""
     with self._lock:
       if self.plan:
         self.plan.unbind(var)
+    self._notify('plan')
 
   def cost(self):
     """Compute the accumulated (monetary) cost of each transducer for this session."""
@@ -562,6 +762,9 @@ class DialogueState():
       file.write_file(self.get_io_path('turn-output.txt'), output)
       file.write_file(self.get_io_path('turn-affect.txt'), affect)
       self.output_buffer = []
+      if self.turn_start_time is not None:
+        self.turn_latencies.append(time.now() - self.turn_start_time)
+        self.turn_start_time = None
 
   def push_output_buffer(self, utt):
     """Push an utterance onto the output buffer."""
@@ -577,6 +780,44 @@ class DialogueState():
   # helper functions
   # ----------------
 
+  def _notify(self, *channels):
+    with self._update:
+      for channel in channels:
+        self._versions[channel] += 1
+      self._update.notify_all()
+      for (listen_channels, callback) in self._listeners:
+        if any([c in listen_channels for c in channels]):
+          callback()
+
+  @contextmanager
+  def _blocking(self):
+    if self._step_lock is None:
+      yield
+      return
+    self._step_lock.release()
+    try:
+      yield
+    finally:
+      self._step_lock.acquire()
+
+  def _apply_transducer(self, type, *args):
+    with self._lock:
+      if type not in self.transducers:
+        return []
+      transducer = self.transducers[type]
+    with self._transducer_locks[type]:
+      if isinstance(transducer, list):
+        return remove_nil(remove_duplicates(append([t(*args) for t in transducer]), order=True))
+      else:
+        return transducer(*args)
+
+  def _embed(self, fact):
+    # Embeddings are computed outside of the dialogue state lock, since embedders may be slow
+    if not self.embedder:
+      return
+    with self._blocking():
+      embed_eventualities(fact if listp(fact) else [fact], self.embedder)
+
   def _make_buffers(self):
     return {
       'observations' : [],
@@ -666,22 +907,121 @@ def eta(config_agent, config_user):
     planning.join()
     execution.join()
 
-    # Write any remaining output
-    ds.write_output_buffer()
+    end_session(ds)
 
-    print(ds.get_memory())
-    print()
-    print(ds.get_plan())
 
-    print(f'total cost of session: ${ds.cost()}')
+def eta_async(config_agent, config_user):
+  """Initialize the dialogue state for a new session and run each core loop as an asyncio task within a single process.
 
+  This is an alternative to `eta`, avoiding the overhead of sharing the dialogue state between processes
+  (i.e., pickling every argument and result of a dialogue state method).
 
-def main(agent_config_name, user_config_name):
-  """Clear the symbol table, read the agent and user configs, and start Eta."""
+  Each task waits (without blocking the event loop) until its inputs in the dialogue state are modified, and then
+  runs a single step of the corresponding core loop in a thread pool executor. The steps are run under a shared
+  step lock, which the dialogue state releases during blocking transducer and embedding calls, allowing the steps
+  of other loops to proceed in the meantime.
+  
+  Parameters
+  ----------
+  config_agent : dict
+    A dict of config parameters for the agent.
+  config_user : dict
+    A dict of config parameters for the user.
+  """
+  ds = DialogueState(config_agent, config_user)
+  with ThreadPoolExecutor(max_workers=4) as executor:
+    asyncio.run(run_session(ds, executor))
+  end_session(ds)
+
+
+async def run_session(ds, executor, stats=None):
+  """Run each core loop for an in-process dialogue state as an asyncio task, until the session ends.
+
+  Parameters
+  ----------
+  ds : DialogueState
+    An in-process dialogue state for the session.
+  executor : concurrent.futures.Executor
+    The executor used to run the steps of each loop (which may be shared between multiple sessions).
+  stats : dict, optional
+    If given, a dict in which to accumulate the number of steps run for the session (``steps``), as well as
+    the total thread CPU time (``cpu_time``) and wall time (``step_time``) spent running those steps.
+  """
+  step_lock = ThreadLock()
+  ds.set_step_lock(step_lock)
+  loop = asyncio.get_running_loop()
+
+  def run_step(step):
+    with step_lock:
+      if not ds.do_continue():
+        return
+      start_cpu, start_time = thread_time(), time.now()
+      step(ds)
+      if stats is not None:
+        stats['steps'] = stats.get('steps', 0) + 1
+        stats['cpu_time'] = stats.get('cpu_time', 0.) + thread_time() - start_cpu
+        stats['step_time'] = stats.get('step_time', 0.) + time.now() - start_time
+
+  async def run_loop(step, channels, timeout=None):
+    update = asyncio.Event()
+    ds.add_listener(channels, lambda: loop.call_soon_threadsafe(update.set))
+    versions = {}
+    while ds.do_continue():
+      update.clear()
+      current = ds.get_versions(channels)
+      if current == versions:
+        try:
+          await asyncio.wait_for(update.wait(), timeout=timeout(ds) if timeout else None)
+          continue
+        except asyncio.TimeoutError:
+          pass
+      versions = current
+      await loop.run_in_executor(executor, run_step, step)
+
+  async def run_polling_loop(step):
+    while ds.do_continue():
+      await asyncio.sleep(SLEEPTIME)
+      await loop.run_in_executor(executor, run_step, step)
+
+  await asyncio.gather(
+    run_polling_loop(perception_step),
+    run_loop(reasoning_step, ['inferences', 'observations']),
+    run_loop(planning_step, ['actions', 'plans']),
+    run_loop(execution_step, ['plan', 'context'], timeout=time_until_step_failure)
+  )
+  ds.set_step_lock(None)
+
+
+def end_session(ds):
+  """Write any remaining output at the end of a session, and report the final state and statistics of the session."""
+  ds.write_output_buffer()
+
+  print(ds.get_memory())
+  print()
+  print(ds.get_plan())
+
+  print(f'total cost of session: ${ds.cost()}')
+
+  latencies = ds.get_turn_latencies()
+  if latencies:
+    print(f'mean turn latency: {sum(latencies)/len(latencies):.3f}s (max: {max(latencies):.3f}s, turns: {len(latencies)})')
+
+  # Save a snapshot of the symbol table, allowing the session to be resumed
+  save_symtab(ds.get_log_path('symtab.json'))
+  ds.close()
+
+
+def main(agent_config_name, user_config_name, engine='process', rebuild_cache=False):
+  """Clear the symbol table (and the cache, if `rebuild_cache` is True), read the agent and user configs, and start Eta using the given engine."""
   clear_symtab()
+  if rebuild_cache:
+    clear_cache()
   agent_config = import_module(f'eta.config.{agent_config_name}').config()
   user_config = file.load_json(f'user_config/{user_config_name}.json')
-  eta(agent_config, user_config)
+  if engine == 'async':
+    eta_async(agent_config, user_config)
+  else:
+    eta(agent_config, user_config)
 
 
 if __name__ == "__main__":
@@ -690,5 +1030,8 @@ if __name__ == "__main__":
                     description='Starts the Eta dialogue manager')
   parser.add_argument('--agent', type=str, default='sophie_offline', help='The name of an agent config in eta.config')
   parser.add_argument('--user', type=str, default='test', help='The name of a user config in ./user_config/')
+  parser.add_argument('--engine', type=str, default='process', choices=['process', 'async'],
+                      help='Whether to run each core loop as a separate process, or as an asyncio task within a single process')
+  parser.add_argument('--rebuild-cache', action='store_true', help='Whether to clear the cache of parsed schemas and rules, rebuilding it from source')
   args = parser.parse_args()
-  main(args.agent, args.user)
+  main(args.agent, args.user, engine=args.engine, rebuild_cache=args.rebuild_cache)
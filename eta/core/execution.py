@@ -1,10 +1,10 @@
 """The core process responsible for executing primitive actions and matching expected events."""
 
-from time import sleep
+import numpy as np
 
 import eta.util.time as time
 from eta.constants import *
-from eta.util.general import listp, variablep, has_elapsed_certainty_period
+from eta.util.general import listp, variablep, has_elapsed_certainty_period, certainty_to_period
 from eta.discourse import DialogueTurn, Utterance, parse_utt_str
 from eta.lf import Condition, Repetition, parse_eventuality
 
@@ -35,35 +35,72 @@ def execution_loop(ds):
   Parameters
   ----------
   ds : DialogueState
+
+  Notes
+  -----
+  Rather than polling, the loop blocks until either the plan or the context has been modified, or until the
+  period for failing the currently pending step has elapsed.
   """
+  versions = {}
   while ds.do_continue():
-    sleep(SLEEPTIME)
-
-    plan = ds.get_plan()
-    event = plan.step.event
-    wff = event.get_wff()
-
-    if isinstance(event, Condition):
-      advance_plan = process_condition_step(event, ds)
-    elif isinstance(event, Repetition):
-      advance_plan = process_repetition_step(event, ds)
-    elif you_pred(wff):
-      advance_plan = process_expected_step(event, ds)
-    elif me_pred(wff):
-      advance_plan = process_intended_step(event, ds)
-    else:
-      advance_plan = process_expected_step(event, ds)
+    versions = ds.wait_for_update(['plan', 'context'], versions, timeout=time_until_step_failure(ds))
+    if ds.do_continue():
+      execution_step(ds)
+
+
+def execution_step(ds):
+  """Run a single iteration of the execution loop.
+  
+  Parameters
+  ----------
+  ds : DialogueState
+  """
+  plan = ds.get_plan()
+  event = plan.step.event
+  wff = event.get_wff()
+
+  if isinstance(event, Condition):
+    advance_plan = process_condition_step(event, ds)
+  elif isinstance(event, Repetition):
+    advance_plan = process_repetition_step(event, ds)
+  elif you_pred(wff):
+    advance_plan = process_expected_step(event, ds)
+  elif me_pred(wff):
+    advance_plan = process_intended_step(event, ds)
+  else:
+    advance_plan = process_expected_step(event, ds)
+
+  if advance_plan:
+    ds.reset_step_failure_timer()
+    ds.advance_plan()
 
+  if advance_plan or type(event) in [Condition, Repetition]:
+    new_plan = ds.get_plan()
     if advance_plan:
-      ds.reset_step_failure_timer()
-      ds.advance_plan()
+      ds.replace_buffer(new_plan, 'plans')
+    else:
+      ds.add_to_buffer_if_empty(new_plan, 'plans')
 
-    if advance_plan or type(event) in [Condition, Repetition]:
-      new_plan = ds.get_plan()
-      if advance_plan:
-        ds.replace_buffer(new_plan, 'plans')
-      else:
-        ds.add_to_buffer_if_empty(new_plan, 'plans')
+
+def time_until_step_failure(ds):
+  """Get the time remaining (in seconds) before the period for failing the currently pending step elapses.
+
+  Parameters
+  ----------
+  ds : DialogueState
+
+  Returns
+  -------
+  float or None
+    The time remaining, or None if the pending step cannot fail.
+  """
+  plan = ds.get_plan()
+  if not plan:
+    return None
+  period = certainty_to_period(plan.step.event.prob)
+  if period == np.inf:
+    return None
+  return max(0., period - (time.now() - ds.get_step_failure_timer()))
 
 
 def process_condition_step(event, ds):
@@ -162,18 +199,18 @@ def inquire_truth_of_curr_step(event, ds):
   ep_var = event.get_ep()
   wff = event.get_wff()
 
-  match = ds.access_from_context(wff)
+  match = ds.access_from_context(wff, bindings=True)
   if not match:
     return False
   
-  match = match[0].event
-  ep = match.get_ep()
+  memory, bindings = match[0]
+  ep = memory.event.get_ep()
 
   ds.bind(ep_var, ep)
 
-  for x, y in zip(wff, match.get_wff()):
-    if variablep(x) and y:
-      ds.bind(x, y)
+  for var, val in bindings.items():
+    if val:
+      ds.bind(var, val)
   
   return True
 
@@ -271,15 +308,18 @@ def execute_say_to(step, ds):
   else:
     utt = expr.strip('"')
 
-  # Get affect of utterance and create Utterance object
+  # Get affect of utterance (if not given) and find additional gist clauses corresponding to Eta's utterance,
+  # which are independent of each other
   affect, words = parse_utt_str(utt)
+  utt = Utterance(ME, words, affect)
   if not affect:
-    affects = ds.apply_transducer('affect', words, conversation_log)
+    gists, affects = ds.apply_transducers([('gist', utt, conversation_log), ('affect', words, conversation_log)])
     affect = affects[0] if affects and affects[0] else EMOTIONS_LIST[0]
-  utt = Utterance(ME, words, affect)
+    utt = Utterance(ME, words, affect)
+  else:
+    gists = ds.apply_transducer('gist', utt, conversation_log)
 
-  # Find and store additional gist clauses corresponding to Eta's utterance
-  gists = ds.apply_transducer('gist', utt, conversation_log)
+  # Store gist clauses corresponding to Eta's utterance
   for e in [parse_eventuality([ME, PARAPHRASE_TO, YOU, f'"{gist}"'], ep=ep) for gist in gists]:
     ds.add_to_context(e)
   gists1 = ds.get_memory().get_characterizing_episode(PARAPHRASE_TO, ep)
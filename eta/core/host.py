@@ -0,0 +1,197 @@
+"""A host for running many concurrent dialogue sessions for a single agent within one server process.
+
+Running this module will read an agent config from eta.config, as well as one or more user configs from
+user_config, before running a dialogue session for each user concurrently.
+
+Rather than each session re-reading every schema and rule directory and reloading any models, the schema library,
+initial knowledge, transducers (including TT trees), and embedder are loaded once by the host and shared read-only
+between sessions. Each session has its own DialogueState (and thus its own plan, memory, and IO directory), and the
+core loops of every session are run as asyncio tasks over a single bounded thread pool (see ``eta.core.eta.run_session``).
+The parallel transducer calls of every session are likewise run over a second bounded thread pool, such that the number
+of threads does not grow with the number of sessions.
+
+Notes
+-----
+Each session receives a copy of each transducer, such that any accumulated state (e.g., the cost of GPT-based
+transducers, or the latency countdowns of TT trees) is kept per session, while the underlying resources (e.g., the
+TT trees themselves, models) are shared. Since the transducers of the host are never applied, each session starts
+from the initial state of every transducer.
+"""
+
+import argparse
+import asyncio
+from copy import copy, deepcopy
+from importlib import import_module
+from concurrent.futures import ThreadPoolExecutor
+
+from eta.constants import *
+from eta.util.general import clear_symtab
+from eta.util.cache import clear_cache
+import eta.util.file as file
+import eta.util.time as time
+from eta.embedding import cache_embedder
+from eta.lf import from_lisp_dirs
+from eta.schema import SchemaLibrary
+from eta.core.eta import DialogueState, run_session
+
+class SessionHost:
+  """Hosts concurrent dialogue sessions for a single agent, sharing static knowledge and models between sessions.
+
+  Parameters
+  ----------
+  agent_config_name : str
+    The name of an agent config in eta.config.
+  max_workers : int, default=HOST_MAX_WORKERS
+    The maximum number of threads used to run the steps of all sessions.
+
+  Attributes
+  ----------
+  config_agent : dict
+    The config parameters for the agent (excluding transducers and embedder).
+  transducers : dict[str, Transducer or list[Transducer]]
+    The transducers shared by each session.
+  embedder : Embedder or None
+    The embedder shared by each session.
+  schemas : SchemaLibrary
+    The schema library shared by each session.
+  init_knowledge : list[Eventuality]
+    The initial facts used to initialize the memory of each session.
+  executor : ThreadPoolExecutor
+    The bounded thread pool used to run the steps of all sessions.
+  transducer_executor : ThreadPoolExecutor
+    The bounded thread pool used to run the parallel transducer calls of all sessions (separate from `executor`,
+    since transducer calls are made from within steps).
+  sessions : dict[str, DialogueState]
+    The dialogue state of each session (keyed on session ID).
+  stats : dict[str, dict]
+    The resource accounting for each session (keyed on session ID).
+  """
+
+  def __init__(self, agent_config_name, max_workers=HOST_MAX_WORKERS):
+    self.config_agent = import_module(f'eta.config.{agent_config_name}').config()
+    self.transducers = self.config_agent.pop('transducers')
+    self.embedder = None
+    if 'embedder' in self.config_agent:
+      self.embedder = self.config_agent.pop('embedder')
+    if self.embedder and (self.config_agent['embedding_cache'] if 'embedding_cache' in self.config_agent else DEFAULT_EMBEDDING_CACHE):
+      self.embedder = cache_embedder(self.embedder)
+    vector_index = self.config_agent['vector_index'] if 'vector_index' in self.config_agent else DEFAULT_VECTOR_INDEX
+    self.schemas = SchemaLibrary(self.embedder, index=vector_index).from_lisp_dirs(self.config_agent['schema_dirs'])
+    self.init_knowledge = []
+    if 'knowledge_dirs' in self.config_agent:
+      self.init_knowledge = from_lisp_dirs(self.config_agent['knowledge_dirs'])
+    self.executor = ThreadPoolExecutor(max_workers=max_workers)
+    self.transducer_executor = ThreadPoolExecutor(max_workers=max_workers)
+    self.sessions = {}
+    self.stats = {}
+
+  def create_session(self, config_user):
+    """Create a new dialogue state for a given user config, using the shared resources of this host."""
+    config_agent = copy(self.config_agent)
+    # TT transducers copy their tree overlays (see ``TTTransducer.__copy__``), so latency countdowns are not shared
+    config_agent['transducers'] = {type: [copy(t1) for t1 in t] if isinstance(t, list) else copy(t)
+                                   for type, t in self.transducers.items()}
+    if self.embedder:
+      config_agent['embedder'] = self.embedder
+    log_path = LOG_PATH + time.TimePoint().format_date() + '/' + config_user['user_id'] + '/'
+    ds = DialogueState(config_agent, config_user,
+                       schemas=self.schemas,
+                       init_knowledge=deepcopy(self.init_knowledge),
+                       log_path=log_path,
+                       transducer_executor=self.transducer_executor)
+    self.sessions[ds.id] = ds
+    return ds
+
+  async def run_session(self, config_user):
+    """Create and run a new dialogue session for a given user config, returning the resource accounting for that session."""
+    loop = asyncio.get_running_loop()
+    start_time = time.now()
+    ds = await loop.run_in_executor(self.executor, self.create_session, config_user)
+    stats = self.stats[ds.id] = {'user_id': config_user['user_id'], 'init_time': time.now() - start_time}
+    await run_session(ds, self.executor, stats)
+    ds.write_output_buffer()
+    stats['wall_time'] = time.now() - start_time
+    stats.update(self.session_report(ds))
+    ds.close()
+    return stats
+
+  async def run_sessions(self, config_users):
+    """Run a dialogue session for each of the given user configs concurrently."""
+    return await asyncio.gather(*[self.run_session(config_user) for config_user in config_users])
+
+  def run(self, config_users):
+    """Run a dialogue session for each of the given user configs concurrently, blocking until all sessions end.
+
+    Parameters
+    ----------
+    config_users : list[dict]
+      A list of user configs, each of which must have a unique user ID.
+
+    Returns
+    -------
+    list[dict]
+      The resource accounting for each session.
+    """
+    if len(set([config_user['user_id'] for config_user in config_users])) < len(config_users):
+      raise Exception('Each session hosted concurrently must have a unique user ID.')
+    return asyncio.run(self.run_sessions(config_users))
+
+  def session_report(self, ds):
+    """Report the current resource usage of a given session (in addition to the step accounting of `run_session`)."""
+    latencies = ds.get_turn_latencies()
+    memory_stats = ds.get_memory().stats()
+    return {
+      'turns': len(ds.get_conversation_log()),
+      'mean_turn_latency': sum(latencies)/len(latencies) if latencies else None,
+      'memories': memory_stats['memories'],
+      'context': memory_stats['context'],
+      'evicted': memory_stats['evicted'],
+      'memory_bytes': memory_stats['array_bytes'],
+      'cost': ds.cost()
+    }
+
+  def shutdown(self):
+    """Shut down the thread pools used by this host."""
+    self.executor.shutdown()
+    self.transducer_executor.shutdown()
+
+
+def format_stats(stats):
+  """Format the resource accounting for a session as a single line."""
+  latency = f"{stats['mean_turn_latency']:.3f}s" if stats['mean_turn_latency'] is not None else 'n/a'
+  return (f"{stats['user_id']}: turns={stats['turns']} mean_turn_latency={latency} steps={stats.get('steps', 0)} "
+          f"cpu_time={stats.get('cpu_time', 0.):.3f}s step_time={stats.get('step_time', 0.):.3f}s "
+          f"init_time={stats['init_time']:.3f}s wall_time={stats['wall_time']:.3f}s "
+          f"memories={stats['memories']} context={stats['context']} evicted={stats['evicted']} "
+          f"memory_bytes={stats['memory_bytes']} cost=${stats['cost']}")
+
+
+def main(agent_config_name, user_config_names, copies=1, max_workers=HOST_MAX_WORKERS, rebuild_cache=False):
+  """Clear the symbol table (and the cache, if `rebuild_cache` is True), read the agent and user configs, and host a session for each user."""
+  clear_symtab()
+  if rebuild_cache:
+    clear_cache()
+  host = SessionHost(agent_config_name, max_workers=max_workers)
+  config_users = []
+  for user_config_name in user_config_names:
+    config_user = file.load_json(f'user_config/{user_config_name}.json')
+    if copies == 1:
+      config_users.append(config_user)
+    else:
+      config_users += [{**config_user, 'user_id': f"{config_user['user_id']}-{i}"} for i in range(copies)]
+  for stats in host.run(config_users):
+    print(format_stats(stats))
+  host.shutdown()
+
+
+if __name__ == "__main__":
+  parser = argparse.ArgumentParser(
+                    prog='eta-host',
+                    description='Hosts concurrent sessions of the Eta dialogue manager')
+  parser.add_argument('--agent', type=str, default='sophie_offline', help='The name of an agent config in eta.config')
+  parser.add_argument('--users', type=str, nargs='+', default=['test'], help='The names of user configs in ./user_config/')
+  parser.add_argument('--copies', type=int, default=1, help='The number of sessions to host for each user config (with suffixed user IDs)')
+  parser.add_argument('--workers', type=int, default=HOST_MAX_WORKERS, help='The maximum number of threads used to run all sessions')
+  parser.add_argument('--rebuild-cache', action='store_true', help='Whether to clear the cache of parsed schemas and rules, rebuilding it from source')
+  args = parser.parse_args()
+  main(args.agent, args.users, copies=args.copies, max_workers=args.workers, rebuild_cache=args.rebuild_cache)
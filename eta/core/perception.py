@@ -23,30 +23,46 @@ def perception_loop(ds):
   Parameters
   ----------
   ds : DialogueState
+
+  Notes
+  -----
+  Unlike the other core processes, which block until their inputs are modified, this process polls
+  the perception servers' input files every `SLEEPTIME` seconds, since these are written externally.
   """
   while ds.do_continue():
     sleep(SLEEPTIME)
+    perception_step(ds)
 
-    # Observe all facts from registered perception servers
-    for source in ds.get_perception_servers():
-      inputs = observe(ds.get_io_path(f'{IO_IN_DIR}{source}.txt'))
-
-      # Shortcut for quitting conversation
-      if any([input == ':q' for input in inputs]):
-        ds.set_quit_conversation(True)
-
-      # Process utterances/observations
-      if source == 'speech':
-        observations = process_utterances(inputs, ds)
-      else:
-        observations = process_observations(inputs)
-        
-      ds.add_to_context(observations)
-      ds.add_all_to_buffer(observations, 'observations')
 
-      # Each observation is a new fact for inference with depth 0
-      new_facts = [{'fact':o, 'depth':1} for o in observations]
-      ds.add_all_to_buffer(new_facts, 'inferences')
+def perception_step(ds):
+  """Run a single iteration of the perception loop.
+  
+  Parameters
+  ----------
+  ds : DialogueState
+  """
+  # Observe all facts from registered perception servers
+  for source in ds.get_perception_servers():
+    inputs = observe(ds.get_io_path(f'{IO_IN_DIR}{source}.txt'))
+    if source == 'speech' and inputs:
+      ds.start_turn_timer()
+
+    # Shortcut for quitting conversation
+    if any([input == ':q' for input in inputs]):
+      ds.set_quit_conversation(True)
+
+    # Process utterances/observations
+    if source == 'speech':
+      observations = process_utterances(inputs, ds)
+    else:
+      observations = process_observations(inputs)
+      
+    ds.add_to_context(observations)
+    ds.add_all_to_buffer(observations, 'observations')
+
+    # Each observation is a new fact for inference with depth 0
+    new_facts = [{'fact':o, 'depth':1} for o in observations]
+    ds.add_all_to_buffer(new_facts, 'inferences')
 
 
 def observe(source):
@@ -97,12 +113,11 @@ def process_utterances(inputs, ds):
     gists = remove_duplicates(ds.apply_transducer('gist', utt, conversation_log), order=True)
     observations += [parse_eventuality([YOU, PARAPHRASE_TO, ME, f'"{gist}"'], ep=ep) for gist in gists]
 
-    # Interpret semantic meanings of gist clauses
-    semantics = remove_duplicates(append([ds.apply_transducer('semantic', gist) for gist in gists]), order=True)
+    # Interpret semantic and pragmatic meanings of gist clauses (which are independent of each other)
+    results = ds.apply_transducers([('semantic', gist) for gist in gists] + [('pragmatic', gist) for gist in gists])
+    semantics = remove_duplicates(append(results[:len(gists)]), order=True)
     observations += [parse_eventuality([YOU, ARTICULATE_TO, ME, semantic], ep=ep) for semantic in semantics]
-
-    # Interpret pragmatic meanings of gist clauses
-    pragmatics = remove_duplicates(append([ds.apply_transducer('pragmatic', gist) for gist in gists]), order=True)
+    pragmatics = remove_duplicates(append(results[len(gists):]), order=True)
     observations += [parse_eventuality(pragmatic, ep=ep) for pragmatic in pragmatics]
 
     # An utterance may always be considered a reply to the preceeding Eta turn, if any
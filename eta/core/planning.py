@@ -10,8 +10,6 @@ assume it only holds one element at a time, and this element is simply replaced
 the plan is modified in some way.
 """
 
-from time import sleep
-
 from eta.constants import *
 from eta.util.general import listp
 from eta.lf import Condition, Repetition, parse_eventuality, extract_set, is_set, set_union, atom
@@ -35,25 +33,40 @@ def planning_loop(ds):
   Parameters
   ----------
   ds : DialogueState
+
+  Notes
+  -----
+  Rather than polling, the loop blocks until either the ``actions`` or ``plans`` buffer has been modified.
   """
+  versions = {}
   while ds.do_continue():
-    sleep(SLEEPTIME)
+    versions = ds.wait_for_update(['actions', 'plans'], versions)
+    if ds.do_continue():
+      planning_step(ds)
+
 
-    # Pop from buffer of possible actions and attempt to add to plan
-    actions = ds.pop_all_buffer('actions')
-    new_plan = add_possible_actions_to_plan(actions, ds)
+def planning_step(ds):
+  """Run a single iteration of the planning loop.
+  
+  Parameters
+  ----------
+  ds : DialogueState
+  """
+  # Pop from buffer of possible actions and attempt to add to plan
+  actions = ds.pop_all_buffer('actions')
+  new_plan = add_possible_actions_to_plan(actions, ds)
+  ds.set_plan(new_plan)
+  ds.replace_buffer(new_plan, 'plans')
+
+  # Attempt to modify current plan by expanding, merging, and reordering steps
+  plan = ds.pop_buffer('plans')
+  if plan:
+    new_plan = expand_plan_steps(plan, ds)
+    new_plan = merge_plan_steps(new_plan, ds)
+    new_plan = reorder_plan_steps(new_plan, ds)
     ds.set_plan(new_plan)
     ds.replace_buffer(new_plan, 'plans')
 
-    # Attempt to modify current plan by expanding, merging, and reordering steps
-    plan = ds.pop_buffer('plans')
-    if plan:
-      new_plan = expand_plan_steps(plan, ds)
-      new_plan = merge_plan_steps(new_plan, ds)
-      new_plan = reorder_plan_steps(new_plan, ds)
-      ds.set_plan(new_plan)
-      ds.replace_buffer(new_plan, 'plans')
-
 
 def add_possible_actions_to_plan(actions, ds):
   """Given a list of possible actions, attempt to add actions into the current plan.
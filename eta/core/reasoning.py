@@ -1,7 +1,5 @@
 """The core process responsible for inferring new facts and possible actions to take from previous facts/observations."""
 
-from time import sleep
-
 from eta.constants import *
 from eta.util.general import remove_duplicates
 
@@ -30,27 +28,42 @@ def reasoning_loop(ds):
   Parameters
   ----------
   ds : DialogueState
+
+  Notes
+  -----
+  Rather than polling, the loop blocks until either the ``inferences`` or ``observations`` buffer has been modified.
   """
+  versions = {}
   while ds.do_continue():
-    sleep(SLEEPTIME)
-
-    # Infer new facts from prior facts (that haven't yet surpassed the depth limit)
-    facts = ds.pop_all_buffer('inferences')
-    if facts:
-      min_depth = min([f['depth'] for f in facts])
-      facts = [f['fact'] for f in facts if not f['depth'] > REASONING_DEPTH_LIMIT]
-
-    new_facts = []
-    new_facts += infer_top_down(facts, ds)
-    new_facts += infer_bottom_up(facts, ds)
-    ds.add_to_context(new_facts)
-    new_facts = [{'fact':f, 'depth':min_depth+1} for f in new_facts]
-    ds.add_all_to_buffer(new_facts, 'inferences')
-
-    # Infer possible actions to take based on observations
-    observations = ds.pop_all_buffer('observations')
-    actions = suggest_possible_actions(observations, ds)
-    ds.add_all_to_buffer(actions, 'actions')
+    versions = ds.wait_for_update(['inferences', 'observations'], versions)
+    if ds.do_continue():
+      reasoning_step(ds)
+
+
+def reasoning_step(ds):
+  """Run a single iteration of the reasoning loop.
+  
+  Parameters
+  ----------
+  ds : DialogueState
+  """
+  # Infer new facts from prior facts (that haven't yet surpassed the depth limit)
+  facts = ds.pop_all_buffer('inferences')
+  if facts:
+    min_depth = min([f['depth'] for f in facts])
+    facts = [f['fact'] for f in facts if not f['depth'] > REASONING_DEPTH_LIMIT]
+
+  new_facts = []
+  new_facts += infer_top_down(facts, ds)
+  new_facts += infer_bottom_up(facts, ds)
+  ds.add_to_context(new_facts)
+  new_facts = [{'fact':f, 'depth':min_depth+1} for f in new_facts]
+  ds.add_all_to_buffer(new_facts, 'inferences')
+
+  # Infer possible actions to take based on observations
+  observations = ds.pop_all_buffer('observations')
+  actions = suggest_possible_actions(observations, ds)
+  ds.add_all_to_buffer(actions, 'actions')
 
 
 def infer_top_down(facts, ds):
@@ -5,21 +5,40 @@ These classes serve as interfaces for invoking various embedding models or APIs.
 
 import os
 import json
+import hashlib
+import threading
 import requests
 import numpy as np
+from collections import OrderedDict
 
 from eta.constants import *
 import eta.util.file as file
+from eta.index import cosine_scores
 
 class Embedder():
   """Defines an abstract embedder class.
 
   An embedder minimally contains a method for embedding a text or list of texts, and a
   method for scoring a set of documents (possibly with precomputed embeddings) relative to a text.
+
+  Attributes
+  ----------
+  batch_size : int
+    The maximum number of texts embedded per call to `embed` when embedding many texts using `embed_batch`.
   """
+  batch_size = EMBEDDING_BATCH_SIZE
+
   def __init__(self):
     pass
 
+  def embeds_text(self):
+    """Check whether the embeddings computed by this embedder depend on the input text (if not, callers need not compute the text)."""
+    return True
+
+  def get_model_name(self):
+    """Get the name of the model used by this embedder (used to key cached embeddings)."""
+    return type(self).__name__
+
   def embed(self, texts):
     """Embed a text or list of texts.
     
@@ -38,6 +57,25 @@ class Embedder():
     else:
       return []
 
+  def embed_batch(self, texts):
+    """Embed a list of texts in batches of at most `batch_size` texts (embedding each distinct text only once).
+
+    Parameters
+    ----------
+    texts : list[str]
+
+    Returns
+    -------
+    np.ndarray
+      A float32 array containing the embedding of each text as a row (with zero columns if the embeddings are empty).
+    """
+    if not texts:
+      return np.zeros((0, 0), dtype=np.float32)
+    unique, inverse = np.unique(np.array(texts, dtype=object).astype(str), return_inverse=True)
+    batches = [self.embed(unique[i:i+self.batch_size].tolist()) for i in range(0, len(unique), self.batch_size)]
+    embeddings = np.asarray([v for batch in batches for v in batch], dtype=np.float32)
+    return embeddings[inverse]
+
   def score(self, text, documents, embeddings=[]):
     """Score a set of documents relative to a text.
     
@@ -56,15 +94,13 @@ class Embedder():
     list[float]
       Scores for each document.
     """
-    if not documents:
+    if not len(documents):
       return []
-    
-    documents = np.array(documents)
 
-    if embeddings and len(embeddings) == len(documents):
+    if len(embeddings) == len(documents):
       e_d = embeddings
     else:
-      e_d = self.embed(documents)
+      e_d = self.embed(list(documents))
     e_t = self.embed(text)
 
     scores = sim(e_d, e_t)
@@ -80,20 +116,36 @@ class STEmbedder(Embedder):
     The name of a SentenceTransformer model to use.
   parallelism : bool, default=False
     Whether to enable or disable model parallelism.
+  batch_size : int, optional
+    The number of texts encoded by the model at a time when embedding many texts.
 
   Attributes
   ----------
   model : SentenceTransformer
+  model_name : str
+  batch_size : int
   """
 
-  def __init__(self, model=EMBEDDING_DEFAULT_MODEL, parallelism=False):
+  def __init__(self, model=EMBEDDING_DEFAULT_MODEL, parallelism=False, batch_size=EMBEDDING_BATCH_SIZE):
     from sentence_transformers import SentenceTransformer
     self.model = SentenceTransformer(model)
+    self.model_name = model
+    self.batch_size = batch_size
     if not parallelism:
       os.environ['TOKENIZERS_PARALLELISM'] = 'false'
 
+  def get_model_name(self):
+    return self.model_name
+
   def embed(self, texts):
     return list(self.model.encode(texts))
+
+  def embed_batch(self, texts):
+    if not texts:
+      return np.zeros((0, 0), dtype=np.float32)
+    unique, inverse = np.unique(np.array(texts, dtype=object).astype(str), return_inverse=True)
+    embeddings = self.model.encode(unique.tolist(), batch_size=self.batch_size, convert_to_numpy=True)
+    return np.asarray(embeddings, dtype=np.float32)[inverse]
   
 
 class HFEmbedder(Embedder):
@@ -105,6 +157,8 @@ class HFEmbedder(Embedder):
     The URL of the embedding API to use.
   model : str
     The name of the specific model to use.
+  batch_size : int, optional
+    The number of texts sent in each request to the API when embedding many texts.
 
   Attributes
   ----------
@@ -112,15 +166,20 @@ class HFEmbedder(Embedder):
   model : str
   url : str
   header : dict
+  batch_size : int
   """
 
-  def __init__(self, host=EMBEDDING_DEFAULT_API, model=EMBEDDING_DEFAULT_MODEL):
+  def __init__(self, host=EMBEDDING_DEFAULT_API, model=EMBEDDING_DEFAULT_MODEL, batch_size=EMBEDDING_BATCH_SIZE):
     self.host = host
     self.model = model
+    self.batch_size = batch_size
     self.url = host+model
     self.header = { "Authorization" : f"Bearer {file.read_file(f'{KEY_PATH}hf.txt').strip()}" }
     self.embed_api('init')
 
+  def get_model_name(self):
+    return self.url
+
   def embed(self, texts):
     if isinstance(texts, np.ndarray):
       texts = texts.tolist()
@@ -140,12 +199,194 @@ class DummyEmbedder(Embedder):
 
   def __init__(self):
     pass
+
+  def embeds_text(self):
+    return False
   
 
+class CachedEmbedder(Embedder):
+  """An embedder that caches the embeddings computed by another embedder, keyed on the model name and (normalized) text.
+
+  The cache consists of two tiers: an in-memory LRU cache of recently used embeddings, and an on-disk cache of every
+  embedding computed with the same model (across sessions). The on-disk cache is an append-only file of fixed-size
+  records, each containing a hash of a text and its embedding, which is memory-mapped and indexed by hash upon loading.
+  Records appended by other processes are indexed upon the next cache miss.
+
+  Parameters
+  ----------
+  embedder : Embedder
+    The embedder used to compute embeddings that are not cached.
+  size : int, optional
+    The maximum number of embeddings in the in-memory tier.
+  path : str, optional
+    The directory of the on-disk tier. If not given, a directory within the cache directory is used for the model
+    of the embedder (or the on-disk tier is disabled, if caching is disabled in eta.constants).
+
+  Attributes
+  ----------
+  embedder : Embedder
+  size : int
+  path : str or None
+  batch_size : int
+  hits : int
+    The number of embeddings retrieved from the in-memory tier.
+  disk_hits : int
+    The number of embeddings retrieved from the on-disk tier.
+  misses : int
+    The number of embeddings computed by the embedder.
+  """
+
+  def __init__(self, embedder, size=EMBEDDING_CACHE_SIZE, path=None):
+    self.embedder = embedder
+    self.size = size
+    self.batch_size = embedder.batch_size
+    if path is None and USE_CACHE:
+      path = os.path.join(CACHE_PATH, 'embeddings', hashlib.sha256(embedder.get_model_name().encode()).hexdigest(), '')
+    self.path = path
+    self._model = embedder.get_model_name()
+    self.hits = 0
+    self.disk_hits = 0
+    self.misses = 0
+    self._lru = OrderedDict()
+    self._init_disk()
+
+  def _init_disk(self):
+    self._lock = threading.Lock()
+    self._rows = {}
+    self._records = None
+    self.dim = None
+    if self.path is not None and file.exists(self.path + 'meta.json'):
+      self.dim = file.load_json(self.path + 'meta.json')['dim']
+      self._refresh()
+
+  def _dtype(self):
+    return np.dtype([('key', 'S16'), ('embedding', '<f4', (self.dim,))])
+
+  def _refresh(self):
+    """Index any records appended to the on-disk tier since it was last indexed."""
+    fname = self.path + 'embeddings.rec'
+    size = os.path.getsize(fname) if file.exists(fname) else 0
+    n = size // self._dtype().itemsize
+    if n <= len(self._rows):
+      return
+    self._records = np.memmap(fname, dtype=self._dtype(), mode='r', shape=(n,))
+    for row in range(len(self._rows), n):
+      self._rows[self._records[row]['key'].tobytes()] = row
+
+  def _key(self, text):
+    """Compute the key of a text, i.e., a hash of the model name and the text (with whitespace normalized)."""
+    return hashlib.sha256((self._model + '\n' + ' '.join(str(text).split())).encode()).digest()[:16]
+
+  def _write(self, keys, embeddings):
+    """Append new embeddings to the on-disk tier."""
+    if self.path is None or not embeddings.shape[1]:
+      return
+    if self.dim is None:
+      self.dim = embeddings.shape[1]
+      file.ensure_dir_exists(self.path)
+      file.write_json(self.path + 'meta.json', {'dim': self.dim})
+    records = np.zeros(len(keys), dtype=self._dtype())
+    records['key'] = keys
+    records['embedding'] = embeddings
+    with open(self.path + 'embeddings.rec', 'ab') as f:
+      f.write(records.tobytes())
+
+  def _lookup(self, key):
+    """Look up an embedding in the in-memory and on-disk tiers, returning None if not cached."""
+    if key in self._lru:
+      self._lru.move_to_end(key)
+      self.hits += 1
+      return self._lru[key]
+    if key in self._rows:
+      v = np.array(self._records[self._rows[key]]['embedding'])
+      self._remember(key, v)
+      self.disk_hits += 1
+      return v
+    return None
+
+  def _remember(self, key, v):
+    self._lru[key] = v
+    if len(self._lru) > self.size:
+      self._lru.popitem(last=False)
+
+  def embeds_text(self):
+    return self.embedder.embeds_text()
+
+  def get_model_name(self):
+    return self.embedder.get_model_name()
+
+  def embed(self, texts):
+    if isinstance(texts, (list, np.ndarray)):
+      return list(self.embed_batch(list(texts)))
+    return self.embed_batch([texts])[0].tolist()
+
+  def embed_batch(self, texts):
+    if not texts:
+      return np.zeros((0, 0), dtype=np.float32)
+    with self._lock:
+      keys = [self._key(text) for text in texts]
+      cached = [self._lookup(key) for key in keys]
+      missing = {}
+      for i, (key, v) in enumerate(zip(keys, cached)):
+        if v is None:
+          missing.setdefault(key, []).append(i)
+      if missing and self.path is not None and self.dim is not None:
+        self._refresh()
+        for key in list(missing.keys()):
+          v = self._lookup(key)
+          if v is not None:
+            for i in missing.pop(key):
+              cached[i] = v
+    if missing:
+      new_keys = list(missing.keys())
+      embeddings = np.asarray(self.embedder.embed_batch([texts[missing[key][0]] for key in new_keys]), dtype=np.float32)
+      with self._lock:
+        self.misses += len(new_keys)
+        for key, v in zip(new_keys, embeddings):
+          self._remember(key, v)
+          for i in missing[key]:
+            cached[i] = v
+        self._write(new_keys, embeddings)
+        self._refresh()
+    return np.asarray(cached, dtype=np.float32)
+
+  def stats(self):
+    """Get the number of hits (in each tier) and misses of this cache, along with the number of embeddings cached in each tier."""
+    return {
+      'hits': self.hits,
+      'disk_hits': self.disk_hits,
+      'misses': self.misses,
+      'memory_entries': len(self._lru),
+      'disk_entries': len(self._rows)
+    }
+
+  def __getstate__(self):
+    state = self.__dict__.copy()
+    for k in ['_lock', '_rows', '_records']:
+      del state[k]
+    return state
+
+  def __setstate__(self, state):
+    self.__dict__.update(state)
+    self._init_disk()
+
+
+def cache_embedder(embedder):
+  """Wrap an embedder in a `CachedEmbedder`, unless it is already cached (or its embeddings don't depend on the text)."""
+  if isinstance(embedder, CachedEmbedder) or not embedder.embeds_text():
+    return embedder
+  return CachedEmbedder(embedder)
+
+
 def sim(x, y):
-  """Compute the cosine similarity between vectors."""
-  if not y:
-    return np.array(1.) if not x else np.array([sim(x1, y) for x1 in x])
-  if not x:
+  """Compute the cosine similarity between vectors.
+
+  If `x` is a list (or 2-D array) of vectors, the similarity of each with `y` is computed using a single matrix
+  product (see ``eta.index.cosine_scores``). If `y` is empty, every similarity is 1.
+  """
+  if not len(y):
+    return np.array(1.) if not len(x) else np.ones(len(x))
+  if not len(x):
     return np.array([])
-  return np.dot(x, y)/(np.linalg.norm(x)*np.linalg.norm(y))
\ No newline at end of file
+  scores = cosine_scores(np.asarray(y, dtype=np.float32), np.atleast_2d(np.asarray(x, dtype=np.float32)))
+  return scores if np.ndim(x) == 2 else scores[0]
\ No newline at end of file
@@ -0,0 +1,502 @@
+"""Vector indexes for retrieving embedded documents (e.g., schemas, schema facts, or memories) by cosine similarity.
+
+Each index maps integer keys to normalized embedding vectors, supports incremental insertion and removal of keys,
+and can be searched for the keys whose vectors are most similar to a query embedding. The following index types are
+supported (see `make_index`):
+
+- ``flat`` : an exact index, which computes the similarity of the query with every stored vector as a single matrix product.
+- ``ivf`` : an approximate inverted file index, implemented in NumPy, which partitions the stored vectors into clusters
+  using k-means, and only searches the clusters whose centroids are most similar to the query.
+- ``hnsw`` : an approximate index using a hierarchical navigable small world graph, which requires the ``hnswlib`` library.
+
+Indexes may be saved to and loaded from disk using `VectorIndex.save` and `load_index`.
+"""
+
+import os
+import pickle
+import numpy as np
+
+from eta.constants import *
+import eta.util.file as file
+
+def normalize(embedding):
+  """Convert an embedding to a normalized float32 vector (returning None if the embedding is empty)."""
+  if embedding is None or len(embedding) == 0:
+    return None
+  v = np.asarray(embedding, dtype=np.float32).ravel()
+  norm = np.linalg.norm(v)
+  return v / norm if norm else v
+
+
+def cosine_scores(queries, matrix, normalized=False):
+  """Compute the cosine similarity between one or more queries and each row of a matrix, using a single matrix product.
+
+  Parameters
+  ----------
+  queries : np.ndarray
+    A query vector, or a 2-D array containing a query vector in each row.
+  matrix : np.ndarray
+    A 2-D float32 array containing an embedding in each row.
+  normalized : bool, default=False
+    Whether the queries and the rows of the matrix are already normalized, in which case only their dot products are computed.
+
+  Returns
+  -------
+  np.ndarray
+    The similarity of each row of the matrix with the query, or if multiple queries are given, a 2-D array
+    containing the similarities with each query in each row.
+  """
+  matrix = np.asarray(matrix, dtype=np.float32)
+  queries = np.asarray(queries, dtype=np.float32)
+  scores = (matrix @ queries.T).T
+  if not normalized:
+    # Rather than normalizing a copy of the matrix, the products are divided by the norms of the rows and queries
+    norms = np.multiply.outer(np.sqrt(np.einsum('...j,...j->...', queries, queries)), np.sqrt(np.einsum('ij,ij->i', matrix, matrix)))
+    scores = scores / np.where(norms > 0, norms, 1)
+  return scores
+
+
+def top_k(keys, sims, k):
+  """Select the `k` keys with the highest similarities, sorted in descending order of similarity."""
+  if k is None or k >= len(sims):
+    top = np.argsort(-sims, kind='stable')
+  elif k <= 0:
+    top = np.zeros(0, dtype=int)
+  else:
+    top = np.argpartition(-sims, k-1)[:k]
+    top = top[np.argsort(-sims[top], kind='stable')]
+  return keys[top], sims[top]
+
+
+class VectorIndex:
+  """An abstract vector index class.
+
+  The base class is an index that stores nothing, such that searching it always returns no keys.
+
+  Attributes
+  ----------
+  exact : bool
+    Whether searching this index is guaranteed to return the exact most similar keys.
+  """
+
+  exact = True
+
+  def add(self, key, embedding):
+    """Add the embedding of a given key to the index, replacing any existing embedding of that key.
+
+    If the embedding is empty, the key is removed from the index instead.
+
+    Parameters
+    ----------
+    key : int
+      A non-negative integer key.
+    embedding : list[float] or np.ndarray
+      The embedding vector of the key (normalized before being stored).
+    """
+    return None
+
+  def remove(self, key):
+    """Remove a given key from the index (if it exists)."""
+    return None
+
+  def search(self, query, k=None):
+    """Search for the keys whose embeddings are most similar to a query embedding.
+
+    Parameters
+    ----------
+    query : list[float] or np.ndarray
+      A query embedding.
+    k : int, optional
+      The number of keys to return. If not given, all keys in the index are returned.
+
+    Returns
+    -------
+    keys : np.ndarray
+      The retrieved keys, sorted in descending order of similarity.
+    sims : np.ndarray
+      The cosine similarity of each retrieved key with the query.
+    """
+    return np.zeros(0, dtype=np.int64), np.zeros(0, dtype=np.float32)
+
+  def scores(self, query):
+    """Compute the cosine similarity of a query embedding with the embedding of every key in the index, in no particular order.
+
+    Parameters
+    ----------
+    query : list[float] or np.ndarray
+      A query embedding.
+
+    Returns
+    -------
+    keys : np.ndarray
+      Every key in the index.
+    sims : np.ndarray
+      The cosine similarity of each key with the query.
+    """
+    return self.search(query)
+
+  def nbytes(self):
+    """Get the number of bytes used by the arrays of this index (or None if unknown)."""
+    return None
+
+  def __len__(self):
+    return 0
+
+  def __contains__(self, key):
+    return False
+
+  def save(self, fname):
+    """Save the index to a given file."""
+    file.ensure_dir_exists(os.path.dirname(fname))
+    tmp_fname = f'{fname}.{os.getpid()}.tmp'
+    with open(tmp_fname, 'wb') as f:
+      pickle.dump(self, f, protocol=pickle.HIGHEST_PROTOCOL)
+    os.replace(tmp_fname, fname)
+
+
+class FlatIndex(VectorIndex):
+  """An exact vector index, which stores each normalized vector as a row of a contiguous matrix.
+
+  The matrix is preallocated, and doubled in size whenever full; the rows of removed keys are reused.
+
+  Parameters
+  ----------
+  capacity : int, default=VECTOR_INDEX_INITIAL_CAPACITY
+    The initial number of rows to allocate (once the dimension of the vectors is known).
+
+  Attributes
+  ----------
+  dim : int or None
+    The dimension of the stored vectors, set upon adding the first vector.
+  """
+
+  exact = True
+
+  def __init__(self, capacity=VECTOR_INDEX_INITIAL_CAPACITY):
+    self.dim = None
+    self._capacity = capacity
+    self._rows = {}
+    self._free_rows = []
+    self._nrows = 0
+    self._keys = np.zeros(0, dtype=np.int64)
+    self._vectors = None
+
+  def _grow(self, capacity):
+    """Grow the matrix of vectors (and the corresponding array of keys) to the given capacity."""
+    vectors = np.zeros((capacity, self.dim), dtype=np.float32)
+    keys = np.full(capacity, -1, dtype=np.int64)
+    if self._vectors is not None:
+      vectors[:len(self._vectors)] = self._vectors
+      keys[:len(self._keys)] = self._keys
+    self._vectors = vectors
+    self._keys = keys
+
+  def add(self, key, embedding):
+    v = normalize(embedding)
+    if v is None:
+      return self.remove(key)
+    if self.dim is None:
+      self.dim = len(v)
+      self._grow(self._capacity)
+    if len(v) != self.dim:
+      raise Exception(f'Embedding of dimension {len(v)} cannot be added to an index of dimension {self.dim}.')
+    if key in self._rows:
+      row = self._rows[key]
+    elif self._free_rows:
+      row = self._free_rows.pop()
+    else:
+      row = self._nrows
+      self._nrows += 1
+      if row >= len(self._keys):
+        self._grow(max(1, 2*len(self._keys)))
+    self._rows[key] = row
+    self._keys[row] = key
+    self._vectors[row] = v
+    return row
+
+  def remove(self, key):
+    if key not in self._rows:
+      return None
+    row = self._rows.pop(key)
+    self._keys[row] = -1
+    self._vectors[row] = 0.
+    self._free_rows.append(row)
+    return row
+
+  def get(self, key):
+    """Get the normalized vector of a given key (or None if the key is not in the index)."""
+    return self._vectors[self._rows[key]] if key in self._rows else None
+
+  def search(self, query, k=None):
+    q = normalize(query)
+    if q is None or not self._rows:
+      return np.zeros(0, dtype=np.int64), np.zeros(0, dtype=np.float32)
+    return top_k(*self.score_rows(q), k)
+
+  def scores(self, query):
+    q = normalize(query)
+    if q is None or not self._rows:
+      return np.zeros(0, dtype=np.int64), np.zeros(0, dtype=np.float32)
+    return self.score_rows(q)
+
+  def score_rows(self, q, rows=None):
+    """Compute the similarity of a normalized query vector `q` with the vector in each row of this index (or in a given array of occupied rows)."""
+    if rows is None:
+      keys = self._keys[:self._nrows]
+      sims = cosine_scores(q, self._vectors[:self._nrows], normalized=True)
+      if self._free_rows:
+        live = keys >= 0
+        keys = keys[live]
+        sims = sims[live]
+    else:
+      keys = self._keys[rows]
+      sims = cosine_scores(q, self._vectors[rows], normalized=True)
+    return keys, sims
+
+  def nbytes(self):
+    return self._keys.nbytes + (self._vectors.nbytes if self._vectors is not None else 0)
+
+  def __len__(self):
+    return len(self._rows)
+
+  def __contains__(self, key):
+    return key in self._rows
+
+
+class IVFIndex(VectorIndex):
+  """An approximate inverted file (IVF) vector index.
+
+  The vectors are stored in a flat index, but are additionally partitioned into ``nlist`` clusters by spherical
+  k-means, such that a search only computes the similarity of the query with the vectors in the ``nprobe`` clusters
+  whose centroids are most similar to the query. Until the index contains at least ``min_train`` vectors, it is
+  searched exhaustively; the clusters are (re-)trained whenever the index grows by a factor of ``retrain_factor``
+  since it was last trained, and new vectors are otherwise assigned to the nearest existing centroid.
+
+  Parameters
+  ----------
+  nlist : int, optional
+    The number of clusters. If not given, this is set to the square root of the number of vectors when trained.
+  nprobe : int, default=IVF_NPROBE
+    The number of clusters to search for each query.
+  min_train : int, default=IVF_MIN_TRAIN
+    The minimum number of vectors required to train the clusters.
+  retrain_factor : float, default=IVF_RETRAIN_FACTOR
+    The factor by which the index must grow before the clusters are re-trained.
+  niter : int, default=IVF_NITER
+    The number of k-means iterations used in training.
+  seed : int, default=0
+    The random seed used in training.
+  """
+
+  exact = False
+
+  def __init__(self, nlist=None, nprobe=IVF_NPROBE, min_train=IVF_MIN_TRAIN, retrain_factor=IVF_RETRAIN_FACTOR,
+               niter=IVF_NITER, seed=0):
+    self.nlist = nlist
+    self.nprobe = nprobe
+    self.min_train = min_train
+    self.retrain_factor = retrain_factor
+    self.niter = niter
+    self.seed = seed
+    self._flat = FlatIndex()
+    self._centroids = None
+    self._assign = {}
+    self._lists = []
+    self._trained_size = 0
+
+  @property
+  def dim(self):
+    return self._flat.dim
+
+  def train(self):
+    """Train the clusters of this index by spherical k-means over the stored vectors, and reassign each vector."""
+    rows = np.array(sorted(self._flat._rows.values()), dtype=np.int64)
+    if len(rows) == 0:
+      return
+    vectors = self._flat._vectors[rows]
+    nlist = min(len(rows), self.nlist if self.nlist else max(1, int(np.sqrt(len(rows)))))
+    rng = np.random.default_rng(self.seed)
+    sample = vectors[rng.choice(len(rows), min(len(rows), nlist*IVF_TRAIN_SAMPLE), replace=False)]
+    centroids = sample[rng.choice(len(sample), nlist, replace=False)]
+    for _ in range(self.niter):
+      labels = np.argmax(cosine_scores(sample, centroids, normalized=True), axis=1)
+      sums = np.zeros_like(centroids)
+      np.add.at(sums, labels, sample)
+      norms = np.linalg.norm(sums, axis=1, keepdims=True)
+      centroids = np.where(norms > 0, sums / np.where(norms > 0, norms, 1.), centroids)
+    self._centroids = centroids.astype(np.float32)
+    self._lists = [set() for _ in range(nlist)]
+    self._assign = {}
+    for start in range(0, len(rows), IVF_ASSIGN_BATCH):
+      batch = rows[start:start+IVF_ASSIGN_BATCH]
+      labels = np.argmax(cosine_scores(self._flat._vectors[batch], self._centroids, normalized=True), axis=1)
+      for row, label in zip(batch.tolist(), labels.tolist()):
+        self._assign[row] = label
+        self._lists[label].add(row)
+    self._trained_size = len(rows)
+
+  def is_trained(self):
+    """Check whether the clusters of this index have been trained."""
+    return self._centroids is not None
+
+  def add(self, key, embedding):
+    self.remove(key)
+    row = self._flat.add(key, embedding)
+    if row is None:
+      return None
+    if len(self) >= max(self.min_train, self.retrain_factor*self._trained_size):
+      self.train()
+    elif self.is_trained():
+      label = int(np.argmax(cosine_scores(self._flat._vectors[row], self._centroids, normalized=True)))
+      self._assign[row] = label
+      self._lists[label].add(row)
+    return row
+
+  def remove(self, key):
+    row = self._flat.remove(key)
+    if row is not None and row in self._assign:
+      self._lists[self._assign.pop(row)].discard(row)
+    return row
+
+  def search(self, query, k=None):
+    q = normalize(query)
+    if q is None or not len(self):
+      return np.zeros(0, dtype=np.int64), np.zeros(0, dtype=np.float32)
+    if not self.is_trained():
+      return top_k(*self._flat.score_rows(q), k)
+    nprobe = min(self.nprobe, len(self._lists))
+    probe = np.argpartition(-cosine_scores(q, self._centroids, normalized=True), nprobe-1)[:nprobe]
+    rows = np.fromiter((row for label in probe for row in self._lists[label]), dtype=np.int64)
+    return top_k(*self._flat.score_rows(q, rows), k)
+
+  def nbytes(self):
+    return self._flat.nbytes() + (self._centroids.nbytes if self._centroids is not None else 0)
+
+  def __len__(self):
+    return len(self._flat)
+
+  def __contains__(self, key):
+    return key in self._flat
+
+
+class HNSWIndex(VectorIndex):
+  """An approximate vector index using a hierarchical navigable small world (HNSW) graph.
+
+  This requires the ``hnswlib`` library to be installed. Removed keys are marked as deleted in the graph,
+  and the graph is resized (doubling its capacity) whenever full.
+
+  Parameters
+  ----------
+  m : int, default=HNSW_M
+    The number of bidirectional links created for each new element.
+  ef_construction : int, default=HNSW_EF_CONSTRUCTION
+    The size of the dynamic candidate list used in construction.
+  ef : int, default=HNSW_EF
+    The size of the dynamic candidate list used in search (at least the number of keys to return).
+  capacity : int, default=VECTOR_INDEX_INITIAL_CAPACITY
+    The initial capacity of the graph.
+  """
+
+  exact = False
+
+  def __init__(self, m=HNSW_M, ef_construction=HNSW_EF_CONSTRUCTION, ef=HNSW_EF, capacity=VECTOR_INDEX_INITIAL_CAPACITY):
+    import hnswlib
+    self._hnswlib = hnswlib
+    self.m = m
+    self.ef_construction = ef_construction
+    self.ef = ef
+    self.dim = None
+    self._capacity = capacity
+    self._index = None
+    self._keys = set()
+    self._deleted = set()
+
+  def add(self, key, embedding):
+    v = normalize(embedding)
+    if v is None:
+      return self.remove(key)
+    if self._index is None:
+      self.dim = len(v)
+      self._index = self._hnswlib.Index(space='ip', dim=self.dim)
+      self._index.init_index(max_elements=self._capacity, ef_construction=self.ef_construction, M=self.m)
+    if len(v) != self.dim:
+      raise Exception(f'Embedding of dimension {len(v)} cannot be added to an index of dimension {self.dim}.')
+    if key in self._deleted:
+      self._index.unmark_deleted(key)
+      self._deleted.remove(key)
+    elif key not in self._keys and self._index.get_current_count() >= self._index.get_max_elements():
+      self._index.resize_index(2*self._index.get_max_elements())
+    self._index.add_items(v[None, :], np.array([key]))
+    self._keys.add(key)
+    return key
+
+  def remove(self, key):
+    if key not in self._keys:
+      return None
+    self._index.mark_deleted(key)
+    self._keys.remove(key)
+    self._deleted.add(key)
+    return key
+
+  def search(self, query, k=None):
+    q = normalize(query)
+    if q is None or not self._keys:
+      return np.zeros(0, dtype=np.int64), np.zeros(0, dtype=np.float32)
+    k = len(self._keys) if k is None else min(k, len(self._keys))
+    if k <= 0:
+      return np.zeros(0, dtype=np.int64), np.zeros(0, dtype=np.float32)
+    self._index.set_ef(max(self.ef, k))
+    labels, dists = self._index.knn_query(q[None, :], k=k)
+    return labels[0].astype(np.int64), (1. - dists[0]).astype(np.float32)
+
+  def __len__(self):
+    return len(self._keys)
+
+  def __contains__(self, key):
+    return key in self._keys
+
+  def __getstate__(self):
+    state = self.__dict__.copy()
+    del state['_hnswlib']
+    return state
+
+  def __setstate__(self, state):
+    import hnswlib
+    self.__dict__.update(state)
+    self._hnswlib = hnswlib
+
+
+INDEX_TYPES = {
+  'flat' : FlatIndex,
+  'ivf' : IVFIndex,
+  'hnsw' : HNSWIndex
+}
+
+
+def make_index(index=DEFAULT_VECTOR_INDEX, **kwargs):
+  """Create a new vector index of a given type.
+
+  Parameters
+  ----------
+  index : str, default=DEFAULT_VECTOR_INDEX
+    The type of index (``flat``, ``ivf``, or ``hnsw``). Each call creates a new, empty index, such that
+    different consumers (e.g., memory storage and schema libraries) never share the keys of a single index.
+  **kwargs
+    Parameters passed to the constructor of the index.
+
+  Returns
+  -------
+  VectorIndex
+  """
+  if not isinstance(index, str) or index not in INDEX_TYPES:
+    raise Exception(f"Unsupported vector index type '{index}' (must be one of {', '.join(INDEX_TYPES)}).")
+  return INDEX_TYPES[index](**kwargs)
+
+
+def load_index(fname):
+  """Load a vector index from a file saved using `VectorIndex.save`."""
+  with open(fname, 'rb') as f:
+    index = pickle.load(f)
+  if not isinstance(index, VectorIndex):
+    raise Exception(f'{fname} does not contain a vector index.')
+  return index
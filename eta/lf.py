@@ -6,10 +6,15 @@ TODO: short writeup
 """
 
 import glob
+import numpy as np
+from copy import copy
+from types import MappingProxyType
 from ulf2english import ulf2english
 
 from eta.constants import *
 from eta.util.sexpr import parse_s_expr, list_to_str, list_to_s_expr, read_lisp
+from eta.util.cache import load_cached
+import eta.util.sexpr
 from eta.util.general import listp, atom, cons, flatten, episode_name, episode_var, subst, substall, rec_replace, dict_substall_keys, replaceall, remove_duplicates
 
 KEYWORDS = ['not', 'plur', 'past', 'pres', 'perf', 'prog', 'pasv', 'k', 'ka', 'ke', 'to', 'that', 'tht', 'fquan', 'nquan',
@@ -21,6 +26,16 @@ KEYWORDS = ['not', 'plur', 'past', 'pres', 'perf', 'prog', 'pasv', 'k', 'ka', 'k
 KEYWORDS_R = [k for k in KEYWORDS if k not in ['not', 'that', "'s", '?', '!']]
 """list[str] : a subset of keywords that don't mirror natural language words/punctuation."""
 
+NO_BINDINGS = MappingProxyType({})
+"""MappingProxyType : a read-only empty mapping, used as the bindings of all logical forms and eventualities without any variable assignments."""
+
+
+def formula_to_nl(formula):
+  """Convert a ULF formula to a natural language string."""
+  formula = rec_replace(['^me', "'s"], '^my', formula)
+  formula = rec_replace(['^you', "'s"], '^your', formula)
+  return ulf2english.convert(formula, standardize=True)
+
 
 def remove_type(atm):
   """Remove the type suffix from a ULF atom."""
@@ -158,42 +173,88 @@ class LF:
   formula : s-expr
     The formula for this logical form.
   bindings : dict
-    A mapping from variables to bound values.
+    A mapping from variables to bound values (or `NO_BINDINGS`, if there are none).
+  version : int
+    A counter that is incremented whenever the formula or bindings are modified.
+
+  Notes
+  -----
+  The formula obtained after applying variable assignments is cached along with the version at which it
+  was computed, so that it is only recomputed once the bindings (or formula) are next modified. Since the
+  cached formula may be shared between callers, it should not be modified in-place.
+
+  Logical forms without any variable assignments do not store a bindings dict (i.e., the `bindings` of such a logical
+  form are the read-only `NO_BINDINGS`); a new dict is created upon the first assignment. Since no dict is shared,
+  copies made by pickling or deep copying may be bound independently as well.
   """
 
+  __slots__ = ('formula', '_bindings', 'version', '_bound_formula', '_bound_version')
+
   def __init__(self, formula):
     if isinstance(formula, str):
       self.formula = parse_s_expr(formula)
     else:
       self.formula = formula
-    self.bindings = {}
+    self._bindings = None
+    self.version = 0
+    self._bound_formula = None
+    self._bound_version = -1
+
+  @property
+  def bindings(self):
+    return self._bindings if self._bindings is not None else NO_BINDINGS
+
+  @bindings.setter
+  def bindings(self, bindings):
+    self._bindings = bindings if bindings else None
+    self.version += 1
 
   def bind(self, var, val):
     """Bind the given variable symbol to the given value."""
-    self.bindings[var] = val
+    if self._bindings is None:
+      self._bindings = {}
+    self._bindings[var] = val
+    self.version += 1
     return self
   
   def unbind(self, var):
     """Unbind the given variable symbol."""
-    if var in self.bindings:
-      self.bindings.pop(var)
+    if self._bindings and var in self._bindings:
+      self._bindings.pop(var)
+      self.version += 1
     return self
   
   def replacevar(self, var1, var2):
     """Replace the first variable symbol with the second variable symbol throughout the logical form."""
-    self.bindings = dict_substall_keys(self.bindings, [(var1, var2)])
-    self.formula = subst(var2, var1, self.formula)
+    self.replacevars([(var1, var2)])
+
+  def replacevars(self, mappings):
+    """Make a list of ``(var1, var2)`` variable replacements throughout the logical form, in sequence."""
+    if self._bindings:
+      self._bindings = dict_substall_keys(self._bindings, mappings)
+    self.formula = substall(self.formula, mappings)
+    self.version += 1
+
+  def copy(self, bindings=True):
+    """Copy this logical form, such that the copy may be bound or modified independently (the formula itself is shared).
+
+    If `bindings` is given as False, the copy has no variable assignments.
+    """
+    lf = copy(self)
+    lf._bindings = copy(self._bindings) if bindings and self._bindings else None
+    lf.version += 1
+    return lf
   
   def get_formula(self):
     """Get the formula, applying any variable assignments first."""
-    return substall(self.formula, list(self.bindings.items()))
+    if self._bound_version != self.version:
+      self._bound_formula = substall(self.formula, list(self.bindings.items()))
+      self._bound_version = self.version
+    return self._bound_formula
   
   def to_nl(self):
     """Convert the formula to a natural language string."""
-    formula = self.get_formula()
-    formula = rec_replace(['^me', "'s"], '^my', formula)
-    formula = rec_replace(['^you', "'s"], '^your', formula)
-    return ulf2english.convert(formula, standardize=True)
+    return formula_to_nl(self.get_formula())
 
   def __str__(self):
     return list_to_s_expr(self.get_formula())
@@ -208,6 +269,8 @@ class ULF(LF):
     The formula for this logical form (an S-expression or LISP-formatted string representation thereof).
   """
 
+  __slots__ = ()
+
   def __init__(self, formula):
     super().__init__(formula)
     
@@ -221,6 +284,8 @@ class ELF(LF):
     The formula for this logical form (an S-expression or LISP-formatted string representation thereof).
   """
 
+  __slots__ = ()
+
   def __init__(self, formula):
     super().__init__(formula)
     
@@ -242,8 +307,9 @@ class Eventuality:
   ----------
   ep : str
     A symbol denoting the episode variable or constant.
-  nl : str
-    The natural language representation of the formula characterizing the event.
+  nl : str or None
+    The natural language representation of the formula characterizing the event. If None, the natural
+    language representation is derived from the ULF formula when it is first needed.
   ulf : ULF, optional
     The ULF formula characterizing the event.
   elf : ELF, optional
@@ -259,23 +325,67 @@ class Eventuality:
   elf : ELF or None
   prob : float
   bindings : dict
-    A mapping from variables to bound values.
-  embedding : list[float]
-    A vector embedding of this eventuality.
+    A mapping from variables to bound values (or `NO_BINDINGS`, if there are none).
+  embedding : np.ndarray or list
+    A vector embedding of this eventuality (or an empty list, if not embedded).
+
+  Notes
+  -----
+  Since converting ULF to natural language is relatively expensive, and the natural language representation
+  of most eventualities is never used (e.g., unless an embedder or GPT prompt requires it), the natural language
+  representation is computed lazily from the (unbound) ULF formula at the time of creation; any variable replacements
+  made before then are recorded and applied to the computed string. The natural language representation after
+  applying variable assignments is also memoized until the bindings are next modified.
+
+  Likewise, the hash of an eventuality is cached until either the eventuality or its logical forms are next modified
+  (as tracked by a version counter for each), since eventualities are frequently hashed when stored in memory.
+
+  Since eventualities are numerous (e.g., every stored memory and every step of every schema), they are represented
+  compactly: unbound eventualities do not store a bindings dict (see `LF`), and embeddings are stored as float32 arrays.
   """
 
+  __slots__ = ('ep', '_version', '_hash', '_hash_version', 'ulf', 'elf', '_nl', '_nl_formula', '_nl_replacements',
+               '_bound_nl', 'prob', '_bindings', 'embedding')
+
   def __init__(self, ep, nl, ulf, elf, prob=1.):
     self.ep = ep
-    self.nl = nl
+    self._version = 0
+    self._hash = None
+    self._hash_version = None
     self.set_ulf(ulf)
     self.set_elf(elf)
+    self._nl = nl
+    self._nl_formula = self.ulf.formula if nl is None and self.ulf else None
+    self._nl_replacements = []
+    self._bound_nl = None
     self.prob = prob
-    self.bindings = {}
+    self._bindings = None
     self.embedding = []
 
+  @property
+  def nl(self):
+    """str : the natural language representation of the formula characterizing the event."""
+    if self._nl_formula is not None:
+      nl = formula_to_nl(self._nl_formula)
+      for var1, var2 in self._nl_replacements:
+        nl = nl.replace(var1, var2)
+      self._nl = nl
+      self._nl_formula = None
+      self._nl_replacements = []
+    return self._nl
+
+  @nl.setter
+  def nl(self, nl):
+    self._nl = nl
+    self._nl_formula = None
+    self._nl_replacements = []
+    self._bound_nl = None
+    self._version += 1
+
   def set_ep(self, ep):
     """Set the episode symbol."""
     self.ep = ep
+    self._version += 1
 
   def set_ulf(self, ulf):
     """Set the ULF formula."""
@@ -285,6 +395,7 @@ class Eventuality:
       self.ulf = ulf
     else:
       self.ulf = ULF(ulf)
+    self._version += 1
 
   def set_elf(self, elf):
     """Set the ULF formula."""
@@ -294,14 +405,29 @@ class Eventuality:
       self.elf = elf
     else:
       self.elf = ELF(elf)
+    self._version += 1
 
   def set_prob(self, prob):
     """Set the probability of this event."""
     self.prob = prob
     
+  @property
+  def bindings(self):
+    return self._bindings if self._bindings is not None else NO_BINDINGS
+
+  @bindings.setter
+  def bindings(self, bindings):
+    self._bindings = bindings if bindings else None
+    self._bound_nl = None
+    self._version += 1
+
   def bind(self, var, val):
     """Bind the given variable symbol to the given value."""
-    self.bindings[var] = val
+    if self._bindings is None:
+      self._bindings = {}
+    self._bindings[var] = val
+    self._bound_nl = None
+    self._version += 1
     if self.ulf:
       self.ulf.bind(var, val)
     if self.elf:
@@ -310,8 +436,10 @@ class Eventuality:
 
   def unbind(self, var):
     """Unbind the given variable symbol."""
-    if var in self.bindings:
-      self.bindings.pop(var)
+    if self._bindings and var in self._bindings:
+      self._bindings.pop(var)
+      self._bound_nl = None
+      self._version += 1
     if self.ulf:
       self.ulf.unbind(var)
     if self.elf:
@@ -320,27 +448,56 @@ class Eventuality:
 
   def replacevar(self, var1, var2):
     """Replace the first variable symbol with the second variable symbol throughout the eventuality."""
-    self.bindings = dict_substall_keys(self.bindings, [(var1, var2)])
-    if self.ep == var1:
-      self.ep = var2
-    self.nl = self.nl.replace(var1, var2)
+    self.replacevars([(var1, var2)])
+
+  def replacevars(self, mappings):
+    """Make a list of ``(var1, var2)`` variable replacements throughout the eventuality, in sequence."""
+    if self._bindings:
+      self._bindings = dict_substall_keys(self._bindings, mappings)
+    for var1, var2 in mappings:
+      if self.ep == var1:
+        self.ep = var2
+    if self._nl_formula is not None:
+      self._nl_replacements = self._nl_replacements + mappings
+    else:
+      for var1, var2 in mappings:
+        self._nl = self._nl.replace(var1, var2)
+    self._bound_nl = None
+    self._version += 1
     if self.ulf:
-      self.ulf.replacevar(var1, var2)
+      self.ulf.replacevars(mappings)
     if self.elf:
-      self.elf.replacevar(var1, var2)
+      self.elf.replacevars(mappings)
+
+  def copy(self, bindings=True):
+    """Copy this eventuality, such that the copy may be bound or modified independently.
+    
+    The formulas, natural language representation, and embedding are shared with the copy, since these are never
+    modified in-place. If `bindings` is given as False, the copy has no variable assignments.
+    """
+    e = copy(self)
+    e._bindings = copy(self._bindings) if bindings and self._bindings else None
+    e.ulf = self.ulf.copy(bindings) if self.ulf else None
+    e.elf = self.elf.copy(bindings) if self.elf else None
+    e._bound_nl = self._bound_nl if bindings else None
+    e._version += 1
+    return e
 
   def embed(self, embedder):
     """Embed the eventuality based on the natural language representation, given an embedder object."""
-    self.embedding = embedder.embed(self.get_nl())
+    embedding = embedder.embed(self.get_nl()) if embedder.embeds_text() else []
+    self.embedding = np.asarray(embedding, dtype=np.float32) if len(embedding) else []
 
   def get_ep(self):
     """Get the episode symbol for this eventuality, applying any variable assignments."""
-    return self.bindings[self.ep] if self.ep in self.bindings else self.ep
+    return self._bindings[self.ep] if self._bindings and self.ep in self._bindings else self.ep
 
   def get_nl(self):
     """Get the natural language representation for this eventuality, applying any variable assignments."""
-    nl_bindings = [(var, list_to_str(val)) for var, val in self.bindings.items()]
-    return replaceall(self.nl, nl_bindings)
+    if self._bound_nl is None:
+      nl_bindings = [(var, list_to_str(val)) for var, val in self.bindings.items()]
+      self._bound_nl = replaceall(self.nl, nl_bindings)
+    return self._bound_nl
 
   def get_ulf(self):
     """Get the ULF representation for this eventuality, applying any variable assignments."""
@@ -372,7 +529,11 @@ class Eventuality:
     return self.get_wff() == other.get_wff()
   
   def __hash__(self):
-    return hash(f'({self.get_ep()} {self.get_wff()})')
+    version = (self._version, self.ulf.version if self.ulf else None, self.elf.version if self.elf else None)
+    if self._hash_version != version:
+      self._hash = hash(f'({self.get_ep()} {self.get_wff()})')
+      self._hash_version = version
+    return self._hash
 
 
 class Condition(Eventuality):
@@ -392,10 +553,12 @@ class Condition(Eventuality):
   elf : ELF or None
   prob : float
   bindings : dict
-  embedding : list[float]
+  embedding : np.ndarray or list
   conditions : list[tuple[True or ULF, list[Eventuality]]]
     A list of pairs of conditions and eventuality lists.
   """
+  __slots__ = ('conditions',)
+
   def __init__(self, ep, nl, ulf, elf, conditions, prob=1.):
     super().__init__(ep, nl, ulf, elf, prob)
     self.conditions = conditions
@@ -418,13 +581,19 @@ class Condition(Eventuality):
         e.unbind(var)
     return self
 
-  def replacevar(self, var1, var2):
-    super().replacevar(var1, var2)
+  def replacevars(self, mappings):
+    super().replacevars(mappings)
     for (cond, eventualities) in self.conditions:
       if isinstance(cond, ULF):
-        cond.replacevar(var1, var2)
+        cond.replacevars(mappings)
       for e in eventualities:
-        e.replacevar(var1, var2)
+        e.replacevars(mappings)
+
+  def copy(self, bindings=True):
+    c = super().copy(bindings)
+    c.conditions = [(cond.copy(bindings) if isinstance(cond, ULF) else cond, [e.copy(bindings) for e in eventualities])
+                    for (cond, eventualities) in self.conditions]
+    return c
     
 
 class Repetition(Eventuality):
@@ -444,12 +613,14 @@ class Repetition(Eventuality):
   elf : ELF or None
   prob : float
   bindings : dict
-  embedding : list[float]
+  embedding : np.ndarray or list
   condition : True or ULF
     The stopping condition for repetition.
   eventualities : list[Eventuality]
     The list of eventualities to repeat.
   """
+  __slots__ = ('condition', 'eventualities')
+
   def __init__(self, ep, nl, ulf, elf, condition, eventualities, prob=1.):
     super().__init__(ep, nl, ulf, elf, prob)
     self.condition = condition
@@ -471,12 +642,48 @@ class Repetition(Eventuality):
       e.unbind(var)
     return self
 
-  def replacevar(self, var1, var2):
-    super().replacevar(var1, var2)
+  def replacevars(self, mappings):
+    super().replacevars(mappings)
     if isinstance(self.condition, ULF):
-      self.condition.replacevar(var1, var2)
+      self.condition.replacevars(mappings)
     for e in self.eventualities:
-      e.replacevar(var1, var2)
+      e.replacevars(mappings)
+
+  def copy(self, bindings=True):
+    r = super().copy(bindings)
+    r.condition = self.condition.copy(bindings) if isinstance(self.condition, ULF) else self.condition
+    r.eventualities = [e.copy(bindings) for e in self.eventualities]
+    return r
+
+
+def embed_eventualities(eventualities, embedder, texts=[]):
+  """Embed a list of eventualities in batches, given an embedder object.
+
+  Rather than embedding each eventuality separately, the natural language representations of all eventualities are
+  collected and embedded using `Embedder.embed_batch`, and the embedding of each eventuality is assigned as a row of
+  the resulting array.
+
+  Parameters
+  ----------
+  eventualities : list[Eventuality]
+  embedder : Embedder
+  texts : list[str], optional
+    Any additional texts to embed in the same batches (e.g., the contents of schemas).
+
+  Returns
+  -------
+  list
+    The embeddings of the additional texts, if any were given.
+  """
+  if not embedder.embeds_text():
+    for e in eventualities:
+      e.embedding = []
+    return [[] for _ in texts]
+  embeddings = embedder.embed_batch([e.get_nl() for e in eventualities] + texts)
+  embeddings = list(embeddings) if embeddings.shape[1] else [[] for _ in embeddings]
+  for e, v in zip(eventualities, embeddings):
+    e.embedding = v
+  return embeddings[len(eventualities):]
 
 
 def parse_eventuality(s, ep=None, expectation=False, prob_dict={}):
@@ -521,7 +728,7 @@ def parse_eventuality(s, ep=None, expectation=False, prob_dict={}):
     elif parsed[0] in [':repeat-until']:
       return parse_repetition(parsed, ulf, ep, prob, prob_dict=prob_dict)
     else:
-      return Eventuality(ep, ulf.to_nl(), ulf, None, prob=prob)
+      return Eventuality(ep, None, ulf, None, prob=prob)
   
   # otherwise s is a natural language string
   else:
@@ -545,14 +752,14 @@ def parse_condition(s, ulf, ep, prob, prob_dict={}):
         conditions.append((ULF(cond[1]), parse_eventuality_list(cond[2:], prob_dict=prob_dict)))
       elif cond[0] == ':else':
         conditions.append((True, parse_eventuality_list(cond[1:], prob_dict=prob_dict)))
-  return Condition(ep, ulf.to_nl(), ulf, None, conditions, prob=prob)
+  return Condition(ep, None, ulf, None, conditions, prob=prob)
 
 
 def parse_repetition(s, ulf, ep, prob, prob_dict={}):
   """Parse an S-expression containing repetition keywords into a Repetition eventuality."""
   condition = ULF(s[1])
   eventualities = parse_eventuality_list(s[2:], prob_dict=prob_dict)
-  return Repetition(ep, ulf.to_nl(), ulf, None, condition, eventualities, prob=prob)
+  return Repetition(ep, None, ulf, None, condition, eventualities, prob=prob)
 
 
 def parse_eventuality_list(lst, prob_dict={}):
@@ -575,21 +782,41 @@ def parse_eventuality_list(lst, prob_dict={}):
   return ret
 
 
-def from_lisp_file(fname, eventualities):
-  """Read a list of eventualities from a LISP file, modifying the list in-place.
+def read_eventualities_file(fname):
+  """Read a list of eventualities from a LISP file.
+
+  The S-expressions read from the file are cached, such that the file is only re-read if it is modified. The
+  eventualities themselves are not cached, since each is given a newly generated episode name.
   
   Parameters
   ----------
   fname : str
     The LISP file to read.
-  eventualities : list[Eventuality]
-    The list of eventualities to modify in-place.
+
+  Returns
+  -------
+  list[Eventuality]
   """
-  for expr in read_lisp(fname):
+  eventualities = []
+  for expr in load_cached('lisp', fname, read_lisp, deps=[eta.util.sexpr]):
     if expr[0] == 'defparameter':
       contents = expr[2]
       for wff in contents:
         eventualities.append(parse_eventuality(wff))
+  return eventualities
+
+
+def from_lisp_file(fname, eventualities):
+  """Read a list of eventualities from a LISP file, modifying the list in-place.
+  
+  Parameters
+  ----------
+  fname : str
+    The LISP file to read.
+  eventualities : list[Eventuality]
+    The list of eventualities to modify in-place.
+  """
+  eventualities += read_eventualities_file(fname)
 
 
 def from_lisp_dirs(dirs):
@@ -1,8 +1,24 @@
 """Tools for storing and retrieving eventualities in Eta's semantic memory."""
 
+import os
+import re
+import copy
+import json
+import pickle
+import sqlite3
+import numpy as np
+from contextlib import contextmanager
+
 from eta.constants import *
-from eta.util.general import cons_dict, listp, atom, cons, variablep, to_key, dict_get, dict_rem_val, squash, linsum, argmax
-from eta.util.time import TimePoint
+from eta.util.general import (cons_dict, listp, atom, cons, variablep, to_key, dict_get, dict_rem_val, squash, linsum,
+                              snapshot_symtab, merge_symtab)
+import eta.util.file as file
+from eta.util.time import TimePoint, from_num
+from eta.index import make_index, normalize
+from eta.lf import embed_eventualities
+from eta.util.dtree import DiscriminationTree
+
+_TELIC_VERBS = frozenset(TELIC_VERBS)
 
 class Memory:
   """Represents a single memory, which consists of a temporally bounded event with some importance value.
@@ -26,6 +42,8 @@ class Memory:
   last_access : TimePoint
     The most recent time that this memory was accessed from memory storage, initialized as the start time.
   importance : float
+  telic : bool or None
+    Whether the event of this memory is telic (see `is_telic`), computed when the memory is first stored.
 
   Notes
   -----
@@ -38,12 +56,15 @@ class Memory:
   Where ``<end_time>`` is to be read as an indexical variable ``^now`` if no value is supplied.
   """
 
+  __slots__ = ('event', 'start_time', 'end_time', 'last_access', 'importance', 'telic')
+
   def __init__(self, event, importance=DEFAULT_IMPORTANCE):
     self.event = event
     self.start_time = TimePoint()
     self.end_time = None
     self.last_access = self.start_time.copy()
     self.importance = importance
+    self.telic = None
 
   def update_last_access(self):
     """Update the most recent access of this memory to the current time."""
@@ -73,7 +94,7 @@ class Memory:
   def is_telic(self):
     """Check whether this memory represents a telic event (i.e., one that is essentially instantaneous)."""
     wff = self.get_wff()
-    return listp(wff) and any([v in wff for v in TELIC_VERBS])
+    return listp(wff) and any([isinstance(v, str) and v in _TELIC_VERBS for v in wff])
   
   def __hash__(self):
     return hash(self.event)
@@ -85,6 +106,86 @@ class Memory:
     return self.event.format()
 
 
+def get_wff_keys(wff):
+  """Create keys for storing a given `wff` in a `wff_ht` dict (provided the wff is a logical formula and not a string)."""
+  if isinstance(wff, str):
+    return [wff]
+  if not wff or not listp(wff):
+    return []
+  if len(wff) == 1:
+    return [to_key(wff), to_key(wff[0])]
+  keys = [to_key(wff), to_key(wff[1])]
+  if len(wff) > 2:
+    keys.append(to_key(wff[:2]+[None for _ in wff[2:]]))
+    for i in range(2, len(wff)):
+      keys.append(to_key([None, wff[1]]+[None for _ in wff[2:i]]+[wff[i]]+[None for _ in wff[i+1:]]))
+  return keys
+
+
+def get_pattern_key(pred_patt):
+  """Get the key used to look up wffs matching a given predicate pattern in a `wff_ht` dict.
+
+  Parameters
+  ----------
+  pred_patt : str or s-expr
+    A predicate symbol or predicate pattern, i.e., an S-expression possibly containing variables
+    at the top level, e.g., ``between.p`` or ``[Block1, between.p, ?x, Block2]``.
+
+  Returns
+  -------
+  key : str or tuple
+    The key to look up.
+  filter : bool
+    Whether the wffs stored under the key must additionally be filtered using `match_pattern`, i.e.,
+    if the pattern contains more than one constant argument, only the first of which is used in the key.
+  """
+  if atom(pred_patt):
+    return to_key(pred_patt), False
+  elif len(pred_patt) == 1:
+    return to_key(pred_patt[0]), False
+  arglist = cons(pred_patt[0], pred_patt[2:])
+  pred = pred_patt[1]
+  nvars = len([arg for arg in arglist if variablep(arg)])
+  nconst = len(arglist) - nvars
+  if nvars == 0:
+    return to_key(cons(arglist[0], cons(pred, arglist[1:]))), False
+  elif nconst == 0:
+    return to_key(pred), False
+  elif nconst == 1:
+    return to_key([None if variablep(x) else x for x in pred_patt]), False
+  else:
+    const = [arg for arg in arglist if not variablep(arg)][0]
+    key = [arg if arg == const else None for arg in arglist]
+    return to_key(cons(key[0], cons(pred, key[1:]))), True
+
+
+def is_predicate_pattern(pred_patt):
+  """Check whether a predicate pattern constrains only its predicate, i.e., it has a constant predicate and only variable arguments (e.g., ``[?x, pred.v, ?y]``)."""
+  return (listp(pred_patt) and len(pred_patt) > 1 and not listp(pred_patt[1]) and not variablep(pred_patt[1])
+          and all([variablep(x) for x in cons(pred_patt[0], pred_patt[2:])]))
+
+
+def is_structural_pattern(pred_patt):
+  """Check whether a predicate pattern is matched by structure against a `wff_tree`, rather than looked up by key in a `wff_ht` (see `MemoryStorage.get_matching`)."""
+  return listp(pred_patt) and len(pred_patt) > 1 and not is_predicate_pattern(pred_patt)
+
+
+def zip_bindings(pred_patt, wff):
+  """Bind each variable of a predicate pattern to the top-level element of a wff in the same position (if any)."""
+  bindings = {}
+  if listp(wff):
+    for x, y in zip(pred_patt, wff):
+      if variablep(x) and x not in bindings:
+        bindings[x] = y
+  return bindings
+
+
+def match_pattern(wff, pred_patt):
+  """Check whether the constant arguments of a predicate pattern (with at least two arguments) match those of a wff."""
+  arglist = cons(pred_patt[0], pred_patt[2:])
+  return all([(variablep(x) or x == y) for x, y in zip(arglist, cons(wff[0], wff[2:]))])
+
+
 class MemoryStorage:
   """Stores memories and a context of "true now" facts, keyed on both episode names and predicates for efficient lookup.
 
@@ -96,6 +197,14 @@ class MemoryStorage:
     The threshold to place on importance values when retrieving memories (i.e.,
     only memories above this threshold will be retrieved). If not given, the
     default threshold defined in eta.constants will be used.
+  index : str, optional
+    The type of vector index used to compute the salience of memories (see ``eta.index``). If not given,
+    the default index type defined in eta.constants will be used.
+  capacity : int, optional
+    The maximum number of memories to store, beyond which the least relevant memories outside of context are evicted
+    (see `forget`). If not given, the default capacity defined in eta.constants will be used; if None, memory is unbounded.
+  archive : MemoryArchive, optional
+    If provided, an archive to which evicted memories are spilled, such that they remain queryable.
   
   Attributes
   ----------
@@ -114,35 +223,85 @@ class MemoryStorage:
         - ``(None, pred, obj1, None, ...)``
         - ``(None, pred, None, obj2, ...)``
         
+  wff_tree : DiscriminationTree
+    A discrimination tree indexing the wff of each memory (provided the wff is a logical formula and not a string),
+    used to retrieve memories matching predicate patterns with variables at any level.
   context : set[Memory]
     A set containing all memories that are "true now".
+  telic_context : set[Memory]
+    The subset of `context` containing telic memories, which are removed from context upon being accessed or flushed.
   embedder : Embedder or None
   importance_threshold : float
+  index : VectorIndex
+    A vector index containing the embedding of each stored memory, keyed on the slot of that memory.
+  capacity : int or None
+  archive : MemoryArchive or None
+  evicted : int
+    The number of memories evicted from this storage so far.
+
+  Notes
+  -----
+  For efficient retrieval, each stored memory is also assigned a slot in a set of parallel arrays, containing
+  the last access time and importance of each memory, and the embedding of each memory is added to `index`
+  under that slot. These arrays are preallocated, and doubled in size whenever full; the slots of removed
+  memories are reused.
   """
 
-  def __init__(self, embedder=None, importance_threshold=DEFAULT_IMPORTANCE_THRESHOLD):
+  def __init__(self, embedder=None, importance_threshold=DEFAULT_IMPORTANCE_THRESHOLD, index=DEFAULT_VECTOR_INDEX,
+               capacity=DEFAULT_MEMORY_CAPACITY, archive=None):
     self.memories = set()
     self.ep_ht = {}
     self.wff_ht = {}
+    self.wff_tree = DiscriminationTree()
     self.context = set()
+    self.telic_context = set()
     self.embedder = embedder
     self.importance_threshold = importance_threshold
+    self._slots = {}
+    self._slot_memories = []
+    self._free_slots = []
+    self._live = np.zeros(0, dtype=bool)
+    self._recency = np.zeros(0)
+    self._importance = np.zeros(0)
+    self.index = make_index(index)
+    self.capacity = capacity
+    self.archive = archive
+    self.evicted = 0
+
+  def _grow(self, capacity):
+    """Grow the arrays used for retrieval to the given capacity."""
+    def grow(a):
+      a1 = np.zeros((capacity,)+a.shape[1:], dtype=a.dtype)
+      a1[:len(a)] = a
+      return a1
+    self._live = grow(self._live)
+    self._recency = grow(self._recency)
+    self._importance = grow(self._importance)
+
+  def _add_slot(self, memory):
+    """Assign a slot in the retrieval arrays to a new memory."""
+    if self._free_slots:
+      slot = self._free_slots.pop()
+      self._slot_memories[slot] = memory
+    else:
+      slot = len(self._slot_memories)
+      self._slot_memories.append(memory)
+      if slot >= len(self._live):
+        self._grow(max(MEMORY_INITIAL_CAPACITY, 2*len(self._live)))
+    self._slots[memory] = slot
+    self._live[slot] = True
+    self._recency[slot] = memory.last_access.to_num()
+    self._importance[slot] = memory.importance
+    self.index.add(slot, memory.event.embedding)
+
+  def _remove_slot(self, memory):
+    """Free the slot in the retrieval arrays assigned to a removed memory."""
+    slot = self._slots.pop(memory)
+    self._slot_memories[slot] = None
+    self._live[slot] = False
+    self.index.remove(slot)
+    self._free_slots.append(slot)
 
-  def _get_wff_keys(self, wff):
-    """Create keys for storing a given `wff` in the `wff_ht` dict (provided the wff is a logical formula and not a string)."""
-    if isinstance(wff, str):
-      return [wff]
-    if not wff or not listp(wff):
-      return []
-    if len(wff) == 1:
-      return [to_key(wff), to_key(wff[0])]
-    keys = [to_key(wff), to_key(wff[1])]
-    if len(wff) > 2:
-      keys.append(to_key(wff[:2]+[None for _ in wff[2:]]))
-      for i in range(2, len(wff)):
-        keys.append(to_key([None, wff[1]]+[None for _ in wff[2:i]]+[wff[i]]+[None for _ in wff[i+1:]]))
-    return keys
-  
   def access(self, memory):
     """"Access" a memory (or list of memories) by updating the most recent access date of that memory.
 
@@ -162,7 +321,8 @@ class MemoryStorage:
     if memory not in self.memories:
       return None
     memory.update_last_access()
-    if memory.is_telic():
+    self._recency[self._slots[memory]] = memory.last_access.to_num()
+    if memory in self.telic_context:
       self.remove_from_context(memory)
     return memory
     
@@ -191,16 +351,26 @@ class MemoryStorage:
     are both sub-events of E5.
     """
     if listp(memory):
-      return [self.store(m) for m in memory]
+      return [self.store(m, context=context) for m in memory]
     
-    self.memories.add(memory)
-    ep = memory.get_ep()
-    wff = memory.get_wff()
-    cons_dict(self.ep_ht, ep, memory)
-    for key in self._get_wff_keys(wff):
-      cons_dict(self.wff_ht, key, memory)
+    if memory.telic is None:
+      memory.telic = memory.is_telic()
+    if memory not in self.memories:
+      self.memories.add(memory)
+      self._add_slot(memory)
+      ep = memory.get_ep()
+      wff = memory.get_wff()
+      cons_dict(self.ep_ht, ep, memory)
+      for key in get_wff_keys(wff):
+        cons_dict(self.wff_ht, key, memory)
+      if listp(wff):
+        self.wff_tree.insert(wff, memory)
     if context:
       self.context.add(memory)
+      if memory.telic:
+        self.telic_context.add(memory)
+    if self.capacity is not None and len(self.memories) > self.capacity:
+      self.forget(int(self.capacity * (1 - MEMORY_EVICTION_FRACTION)), keep=[memory])
 
   def remove(self, memory):
     """Remove a memory (or list of memories) from all sets and hash tables.
@@ -215,13 +385,17 @@ class MemoryStorage:
     if not memory in self.memories:
       return None
     self.memories.remove(memory)
+    self._remove_slot(memory)
     ep = memory.get_ep()
     wff = memory.get_wff()
     dict_rem_val(self.ep_ht, ep, memory)
-    for key in self._get_wff_keys(wff):
+    for key in get_wff_keys(wff):
       dict_rem_val(self.wff_ht, key, memory)
+    if listp(wff):
+      self.wff_tree.remove(wff, memory)
     if memory in self.context:
       self.context.remove(memory)
+      self.telic_context.discard(memory)
 
   def remove_from_context(self, memory):
     """Remove a memory (or list of memories) from `context`.
@@ -243,8 +417,9 @@ class MemoryStorage:
     if memory in self.context:
       memory.end()
       self.context.remove(memory)
+      self.telic_context.discard(memory)
       
-  def instantiate(self, event, importance=DEFAULT_IMPORTANCE, context=True):
+  def instantiate(self, event, importance=DEFAULT_IMPORTANCE, context=True, embed=True):
     """Instantiate an event (or list of events) as a new memory and store it.
     
     Parameters
@@ -255,13 +430,18 @@ class MemoryStorage:
       The importance value(s) to assign to each new memory.
     context : bool, default=True
       Whether to store the instantiated memory in context.
+    embed : bool, default=True
+      Whether to embed the event(s) using the embedder of this storage, if any. This may be given as False
+      if the event(s) were already embedded by the caller. A list of events is embedded in batches.
     """
     if listp(event):
       if not (listp(importance) and len(event) == len(importance)):
         importance = [DEFAULT_IMPORTANCE for _ in event]
-      return [self.instantiate(e, i) for e, i in zip(event, importance)]
+      if self.embedder and embed:
+        embed_eventualities(event, self.embedder)
+      return [self.instantiate(e, i, embed=False) for e, i in zip(event, importance)]
     
-    if self.embedder:
+    if self.embedder and embed:
       event.embed(self.embedder)
     memory = Memory(event, importance=importance)
     self.store(memory, context=context)
@@ -283,78 +463,65 @@ class MemoryStorage:
     memories = dict_get(self.ep_ht, ep)
     return self.access(memories) if access else memories
 
-  def get_matching(self, pred_patt, access=False):
+  def get_matching(self, pred_patt, access=False, bindings=False):
     """Get memories matching a given predicate pattern potentially containing variables.
 
     Parameters
     ----------
     pred_patt : str or s-expr
       A predicate symbol or predicate pattern, i.e., an S-expression possibly containing variables
-      at the top level, e.g., ``between.p`` or ``[Block1, between.p, ?x, Block2]``.
+      at any level, e.g., ``between.p``, ``[Block1, between.p, ?x, Block2]``, or ``[?x, say-to.v, ^me, [?y, ?z]]``.
     access : bool, default=False
       Whether to update the last access time of the memories.
+    bindings : bool, default=False
+      Whether to also return the bindings of the variables in the pattern for each matching memory.
     
     Returns
     -------
-    list[Memory]
+    list[Memory] or list[tuple[Memory, dict]]
 
     Notes
     -----
-    TODO: currently, due to the indexing scheme used by `wff_ht`, we only allow variables in the
-    top level of a predication (i.e., variables may not be nested within an S-expression). In
-    the future, we may wish to allow for more general matching.
+    A predicate symbol (or a pattern with a single element) is looked up in `wff_ht`, matching any memory with that
+    predicate. Likewise, a pattern whose arguments are all variables (e.g., ``[?x, say-to.v, ?y]``) matches any memory
+    with that predicate, regardless of the number of arguments of its wff; each variable is bound to the element of
+    the wff in the same position, if any.
+
+    Any other pattern with multiple elements is matched against `wff_tree`, such that a memory matches only if its wff
+    has the same structure as the pattern and the constants of the pattern are equal to the corresponding parts of the
+    wff, with each variable matching a single (possibly nested) expression.
     """
-    def match_patt(pred_patt):
-      if atom(pred_patt):
-        return dict_get(self.wff_ht, to_key(pred_patt))
-      elif len(pred_patt) == 1:
-        return dict_get(self.wff_ht, to_key(pred_patt[0]))
-      else:
-        arglist = cons(pred_patt[0], pred_patt[2:])
-        pred = pred_patt[1]
-        nvars = len([arg for arg in arglist if variablep(arg)])
-        nconst = len(arglist) - nvars
-        if nvars == 0:
-          return dict_get(self.wff_ht, to_key(cons(arglist[0], cons(pred, arglist[1:]))))
-        elif nconst == 0:
-          return dict_get(self.wff_ht, to_key(pred))
-        elif nconst == 1:
-          return dict_get(self.wff_ht, to_key([None if variablep(x) else x for x in pred_patt]))
-        else:
-          const = [arg for arg in arglist if not variablep(arg)][0]
-          key = [arg if arg == const else None for arg in arglist]
-          key = cons(key[0], cons(pred, key[1:]))
-          memories = dict_get(self.wff_ht, to_key(key))
-          # Filter out memories whose constant args don't match pred_patt
-          selected = []
-          for m in memories:
-            wff = m.get_wff()
-            if all([(variablep(x) or x == y) for x, y in zip(arglist, cons(wff[0], wff[2:]))]):
-              selected.append(m)
-          return selected
-    
-    memories = match_patt(pred_patt)
-    return self.access(memories) if access else memories
-      
-  def get_from_context(self, pred_patt, access=False):
+    if is_structural_pattern(pred_patt):
+      matches = self.wff_tree.match(pred_patt)
+    else:
+      key, _ = get_pattern_key(pred_patt)
+      matches = [(m, zip_bindings(pred_patt, m.get_wff()) if listp(pred_patt) else {}) for m in dict_get(self.wff_ht, key)]
+    if access:
+      self.access([m for m, _ in matches])
+    return matches if bindings else [m for m, _ in matches]
+
+  def get_from_context(self, pred_patt, access=False, bindings=False):
     """Get a memory from `context` matching a given predicate pattern potentially containing variables.
     
     Parameters
     ----------
     pred_patt : str or s-expr
       A predicate symbol or predicate pattern, i.e., an S-expression possibly containing variables
-      at the top level, e.g., ``between.p`` or ``[Block1, between.p, ?x, Block2]``.
+      at any level, e.g., ``between.p`` or ``[Block1, between.p, ?x, Block2]`` (see `get_matching`).
     access : bool, default=False
       Whether to update the last access time of the memories.
+    bindings : bool, default=False
+      Whether to also return the bindings of the variables in the pattern for each matching memory.
     
     Returns
     -------
-    list[Memory]
+    list[Memory] or list[tuple[Memory, dict]]
     """
-    memories = self.get_matching(pred_patt)
-    memories = [m for m in memories if m in self.context]
-    return self.access(memories) if access else memories
-      
+    matches = [(m, b) for m, b in self.get_matching(pred_patt, bindings=True) if m in self.context]
+    if access:
+      self.access([m for m, _ in matches])
+    return matches if bindings else [m for m, _ in matches]
+
   def remove_episode(self, ep):
     """Remove all memories characterizing a given episode.
     
@@ -402,9 +569,12 @@ class MemoryStorage:
     self.remove_from_context(memories)
 
   def flush_context(self):
-    """Remove from `context` all "telic" events (i.e., events that we regard as essentially instantaneous)."""
-    memories = [m for m in self.context if m.is_telic()]
-    for memory in memories:
+    """Remove from `context` all "telic" events (i.e., events that we regard as essentially instantaneous).
+
+    Since telicity is computed when a memory is stored, and telic memories in context are kept in `telic_context`,
+    this takes time proportional to the number of telic memories in context, rather than the size of context.
+    """
+    for memory in list(self.telic_context):
       self.remove_from_context(memory)
 
   def get_characterizing_episode(self, pred_patt, ep):
@@ -457,6 +627,12 @@ class MemoryStorage:
     each sub-score multiplied by the respective coefficient in 'coeffs'. The highest scoring memories
     are returned.
 
+    The scores are computed over the retrieval arrays of this storage, and the top memories are selected by
+    partitioning the scores rather than sorting them. If the vector index of this storage is exact, salience is
+    computed for every memory; otherwise, only the memories retrieved from the index as the most salient
+    candidates (a multiple of `n`, given by VECTOR_INDEX_CANDIDATE_FACTOR) are scored, and memories without
+    an embedding are not retrieved.
+
     Parameters
     ----------
     query : str, optional
@@ -471,29 +647,498 @@ class MemoryStorage:
     -------
     list[Memory]
     """
-    memories = list(self.memories)
-    memories = [m for m in memories if m.importance >= self.importance_threshold]
+    nslots = len(self._slot_memories)
+    q = None
+    if query and self.embedder and len(self.index):
+      q = normalize(self.embedder.embed(query))
 
-    recency = squash([m.last_access.to_num() for m in memories])
-    importance = squash([m.importance for m in memories])
-    if not query or not self.embedder:
-      salience = squash([1. for _ in memories])
+    if q is not None and not self.index.exact:
+      idx, sims = self.index.search(q, n*VECTOR_INDEX_CANDIDATE_FACTOR)
+      eligible = self._live[idx] & (self._importance[idx] >= self.importance_threshold)
+      idx, sims = idx[eligible], sims[eligible]
     else:
-      salience = squash(self.embedder.score(query, memories, [m.event.embedding for m in memories]))
-      
+      idx = np.flatnonzero(self._live[:nslots] & (self._importance[:nslots] >= self.importance_threshold))
+    if len(idx) == 0 or n <= 0:
+      return []
+
+    recency = squash(self._recency[idx])
+    importance = squash(self._importance[idx])
+    if q is None:
+      salience = np.ones(len(idx))
+    elif self.index.exact:
+      salience = squash(self._salience(q, nslots)[idx])
+    else:
+      salience = squash(sims)
+
     scores = linsum([recency, importance, salience], coeffs)
-    return argmax(memories, scores, n)
+    n = min(n, len(idx))
+    top = np.argpartition(-scores, n-1)[:n]
+    top = top[np.argsort(-scores[top], kind='stable')]
+    return [self._slot_memories[i] for i in idx[top]]
 
-  def forget(self):
-    """Evict some facts from memory in order to reduce memory size (TBC).
+  def _salience(self, q, nslots):
+    """Compute the cosine similarity between a normalized query vector and the embedding of each of the first `nslots` memory slots."""
+    slots, sims = self.index.scores(q)
+    salience = np.zeros(nslots)
+    salience[slots] = sims
+    return salience
 
-    Notes
-    -----
-    TODO: this function should be implemented to permanently evict facts from memory as memory
-    sizes become too large for tractable retrieval. It should remove facts where the combined relevance
-    and importance values fall below some threshold.
+  def forget(self, n=None, coeffs=(1.,1.), keep=[]):
+    """Evict the least relevant memories from storage, until at most `n` memories remain.
+
+    Each memory is scored by a linear sum of its recency and importance (each mapped to [0,1], as in `retrieve`),
+    and the lowest scoring memories are removed from all sets, hash tables, and indexes. If this storage has an
+    archive, the evicted memories are spilled to it.
+
+    Memories in `context` (including telic context) are never evicted, since these are "true now", nor are any
+    memories given in `keep`. Hence, more than `n` memories may remain if too few other memories are stored.
+
+    This is called automatically whenever the number of stored memories exceeds `capacity`, in which case memories
+    are evicted until a fraction MEMORY_EVICTION_FRACTION of the capacity is free (such that the cost of eviction
+    is amortized over subsequent insertions).
+
+    Parameters
+    ----------
+    n : int, optional
+      The number of memories to keep. If not given, `capacity` is used.
+    coeffs : tuple[float, float], default=(1., 1.)
+      A tuple of coefficients to be used to weight the recency and importance sub-scores, respectively.
+    keep : list[Memory], optional
+      Memories to keep regardless of their scores (e.g., a memory that was just stored).
+
+    Returns
+    -------
+    list[Memory]
+      The evicted memories.
+    """
+    n = self.capacity if n is None else n
+    if n is None or len(self.memories) <= n:
+      return []
+    nslots = len(self._slot_memories)
+    live = self._live[:nslots].copy()
+    for memory in self.context.union(keep):
+      if memory in self._slots:
+        live[self._slots[memory]] = False
+    idx = np.flatnonzero(live)
+    k = min(len(self.memories) - max(n, 0), len(idx))
+    if k <= 0:
+      return []
+    scores = linsum([squash(self._recency[idx]), squash(self._importance[idx])], coeffs)
+    evict = idx[np.argpartition(scores, k-1)[:k]] if k < len(idx) else idx
+    memories = [self._slot_memories[i] for i in evict]
+    self.remove(memories)
+    if self.archive is not None:
+      self.archive.add(memories)
+    self.evicted += len(memories)
+    return memories
+
+  def stats(self):
+    """Get statistics about the footprint of this storage.
+
+    Returns
+    -------
+    dict
+      A dict containing the number of memories, context facts, episode and wff keys, and wff entries, the capacity and
+      number of bytes of the retrieval arrays (including the vector index, if known), and the number of evicted and archived
+      memories (and the size of the archive file).
     """
+    array_bytes = self._live.nbytes + self._recency.nbytes + self._importance.nbytes
+    index_bytes = self.index.nbytes()
+    return {
+      'memories': len(self.memories),
+      'context': len(self.context),
+      'episodes': len(self.ep_ht),
+      'wff_keys': len(self.wff_ht),
+      'wff_entries': sum([len(v) for v in self.wff_ht.values()]),
+      'slots': len(self._live),
+      'array_bytes': array_bytes + (index_bytes if index_bytes else 0),
+      'evicted': self.evicted,
+      'archived': len(self.archive) if self.archive is not None else 0,
+      'archive_bytes': self.archive.nbytes() if self.archive is not None else 0
+    }
+
+  def close(self):
+    """Release any resources held by this storage (a no-op for in-memory storage)."""
     pass
 
   def __str__(self):
-    return '\n'.join([str(memory) for memory in self.memories])
\ No newline at end of file
+    return '\n'.join([str(memory) for memory in self.memories])
+
+
+class MemoryArchive:
+  """An append-only archive of memories (e.g., those evicted from memory storage), stored on disk.
+
+  Each archived memory is pickled and appended to the archive file, and only the file offset of each record is kept in
+  memory, in hash tables keyed on episodes and wffs and a discrimination tree of wffs (mirroring those of `MemoryStorage`),
+  as well as a vector index of the embedding of each memory. Thus, archived memories remain queryable by episode, predicate pattern, or similarity
+  with a query, but are only loaded from disk when retrieved. If the archive file already exists, it is re-indexed.
+
+  Parameters
+  ----------
+  fname : str
+    The archive file.
+  embedder : Embedder, optional
+    If provided, an embedder used to embed queries when retrieving archived memories.
+  index : str, optional
+    The type of vector index used to retrieve archived memories (see ``eta.index``).
+
+  Attributes
+  ----------
+  fname : str
+  embedder : Embedder or None
+  offsets : list[int]
+    The file offset of each archived memory.
+  ep_ht : dict[str, list[int]]
+    A hash table mapping episode variables/constants to the IDs (i.e., positions in `offsets`) of archived memories.
+  wff_ht : dict[str or tuple, list[int]]
+    A hash table mapping wff keys to the IDs of archived memories (see `MemoryStorage`).
+  wff_tree : DiscriminationTree
+    A discrimination tree mapping the wff of each archived memory to its ID (see `MemoryStorage`).
+  index : VectorIndex
+    A vector index containing the embedding of each archived memory, keyed on ID.
+  """
+
+  def __init__(self, fname, embedder=None, index=DEFAULT_VECTOR_INDEX):
+    self.fname = fname
+    self.embedder = embedder
+    self.offsets = []
+    self.ep_ht = {}
+    self.wff_ht = {}
+    self.wff_tree = DiscriminationTree()
+    self.index = make_index(index)
+    if file.exists(fname):
+      with open(fname, 'rb') as f:
+        while True:
+          offset = f.tell()
+          try:
+            memory = pickle.load(f)
+          except Exception:
+            break
+          self._add_record(memory, offset)
+
+  def _add_record(self, memory, offset):
+    """Add an archived memory at a given file offset to the hash tables and vector index."""
+    id = len(self.offsets)
+    self.offsets.append(offset)
+    wff = memory.get_wff()
+    cons_dict(self.ep_ht, memory.get_ep(), id)
+    for key in get_wff_keys(wff):
+      cons_dict(self.wff_ht, key, id)
+    self.wff_tree.insert(wff, id)
+    self.index.add(id, memory.event.embedding)
+
+  def _load(self, ids):
+    """Load the archived memories with the given IDs from disk."""
+    if not ids:
+      return []
+    memories = []
+    with open(self.fname, 'rb') as f:
+      for id in ids:
+        f.seek(self.offsets[id])
+        memories.append(pickle.load(f))
+    return memories
+
+  def add(self, memory):
+    """Append a memory (or list of memories) to the archive."""
+    memories = memory if listp(memory) else [memory]
+    if not memories:
+      return
+    file.ensure_dir_exists(os.path.dirname(self.fname))
+    with open(self.fname, 'ab') as f:
+      for m in memories:
+        offset = f.tell()
+        pickle.dump(m, f, protocol=pickle.HIGHEST_PROTOCOL)
+        self._add_record(m, offset)
+
+  def get_episode(self, ep):
+    """Get archived memories that characterize a specific episode."""
+    return self._load(dict_get(self.ep_ht, ep))
+
+  def get_matching(self, pred_patt, bindings=False):
+    """Get archived memories matching a given predicate pattern potentially containing variables, in the same way as `MemoryStorage.get_matching`.
+
+    Parameters
+    ----------
+    pred_patt : str or s-expr
+      A predicate symbol or predicate pattern, possibly containing variables at any level.
+    bindings : bool, default=False
+      Whether to also return the bindings of the variables in the pattern for each matching memory.
+
+    Returns
+    -------
+    list[Memory] or list[tuple[Memory, dict]]
+    """
+    if is_structural_pattern(pred_patt):
+      ids_bindings = self.wff_tree.match(pred_patt)
+      matches = list(zip(self._load([id for id, _ in ids_bindings]), [b for _, b in ids_bindings]))
+    else:
+      key, _ = get_pattern_key(pred_patt)
+      matches = [(m, zip_bindings(pred_patt, m.get_wff()) if listp(pred_patt) else {}) for m in self._load(dict_get(self.wff_ht, key))]
+    return matches if bindings else [m for m, _ in matches]
+
+  def retrieve(self, query, n=5):
+    """Retrieve some number of archived memories most similar to a query (requires an embedder)."""
+    if not self.embedder or not len(self.index):
+      return []
+    return self._load(self.index.search(self.embedder.embed(query), n)[0].tolist())
+
+  def nbytes(self):
+    """Get the size of the archive file in bytes."""
+    return os.path.getsize(self.fname) if file.exists(self.fname) else 0
+
+  def __len__(self):
+    return len(self.offsets)
+
+
+
+class PersistentMemoryStorage(MemoryStorage):
+  """Memory storage that is persisted incrementally to disk, such that memories are retained across sessions.
+
+  Each stored memory is written as a row of a SQLite database, containing the pickled event of the memory (without its
+  embedding), its start, end, and last access times (as POSIX timestamps), its importance, and whether it is in context.
+  The embedding of each memory is appended as a raw float32 row to a separate embeddings file, which is memory-mapped
+  upon loading, so that persisted memories never need to be re-embedded. Any existing memories are loaded lazily, i.e.,
+  only when the memories of this storage are first accessed, and all subsequent modifications are written through to
+  the database.
+
+  Parameters
+  ----------
+  path : str
+    The directory in which the database and embeddings file are kept.
+  embedder : Embedder, optional
+  importance_threshold : float, optional
+  index : str, optional
+  capacity : int, optional
+  archive : MemoryArchive, optional
+    See `MemoryStorage`. Memories evicted from this storage are also deleted from the database.
+
+  Attributes
+  ----------
+  path : str
+  db : sqlite3.Connection or None
+    The connection to the database, or None if this storage has been closed (or is an unpickled copy).
+  dim : int or None
+    The dimension of the persisted embeddings, determined by the first embedding written.
+  loaded : int
+    The number of persisted memories found upon initialization (which are loaded when first accessed).
+
+  Notes
+  -----
+  Upon initialization, only the episode name of each persisted memory is read. The memories themselves are loaded
+  (i.e., unpickled and added to the sets, hash tables, and indexes of this storage) upon the first access of any
+  attribute containing memories (see `_lazy_fields`), whether by a method of this storage or otherwise.
+
+  Updates to the last access time of memories are buffered, and only written along with the next modification (or
+  when the storage is closed), since memories are accessed far more frequently than they are modified.
+
+  Since the symbol table is cleared at the start of each session, a snapshot of the symbol table is saved when the
+  storage is closed, and merged into the symbol table upon initialization (along with the suffixes of each persisted
+  episode), such that new episode names never collide with those of persisted memories.
+  """
+  _lazy_fields = ('memories', 'ep_ht', 'wff_ht', 'wff_tree', 'context', 'telic_context', 'index',
+                  '_slots', '_slot_memories', '_free_slots', '_live', '_recency', '_importance', '_ids')
+
+  def __init__(self, path, embedder=None, importance_threshold=DEFAULT_IMPORTANCE_THRESHOLD, index=DEFAULT_VECTOR_INDEX,
+               capacity=DEFAULT_MEMORY_CAPACITY, archive=None):
+    super().__init__(embedder, importance_threshold=importance_threshold, index=index, capacity=capacity, archive=archive)
+    self.path = path
+    self._ids = {}
+    self._accessed = {}
+    self._depth = 0
+    file.ensure_dir_exists(path)
+    self.db = sqlite3.connect(path + MEMORY_DB_FILE, check_same_thread=False)
+    self.db.execute('PRAGMA journal_mode=WAL')
+    self.db.execute('PRAGMA synchronous=NORMAL')
+    self.db.execute('CREATE TABLE IF NOT EXISTS memories (id INTEGER PRIMARY KEY, event BLOB NOT NULL, start_time REAL NOT NULL, '
+                    'end_time REAL, last_access REAL NOT NULL, importance REAL NOT NULL, context INTEGER NOT NULL, embedding INTEGER, '
+                    'ep TEXT)')
+    self.db.execute('CREATE TABLE IF NOT EXISTS meta (key TEXT PRIMARY KEY, value TEXT NOT NULL)')
+    self.db.commit()
+    dim = self._get_meta('dim')
+    self.dim = int(dim) if dim is not None else None
+    self._emb_fname = path + MEMORY_EMBEDDINGS_FILE
+    self._nrows = os.path.getsize(self._emb_fname) // (4*self.dim) if self.dim and file.exists(self._emb_fname) else 0
+    self._emb_file = open(self._emb_fname, 'ab')
+    self.loaded = self._scan()
+    self._unloaded = {x: self.__dict__.pop(x) for x in self._lazy_fields}
+
+  def _get_meta(self, key):
+    row = self.db.execute('SELECT value FROM meta WHERE key = ?', (key,)).fetchone()
+    return row[0] if row else None
+
+  def _set_meta(self, key, value):
+    self.db.execute('INSERT OR REPLACE INTO meta (key, value) VALUES (?, ?)', (key, value))
+
+  def __getattr__(self, name):
+    # Only called for missing attributes, i.e., attributes containing memories that have not yet been loaded
+    if name not in PersistentMemoryStorage._lazy_fields or not self.__dict__.get('_unloaded'):
+      raise AttributeError(name)
+    self._ensure_loaded()
+    return self.__dict__[name]
+
+  def _ensure_loaded(self):
+    """Load all persisted memories, if they have not yet been loaded."""
+    if self._unloaded:
+      if self.db is None:
+        raise Exception('Cannot load persisted memories after the storage has been closed.')
+      self.__dict__.update(self._unloaded)
+      self._unloaded = None
+      self._load()
+
+  def _scan(self):
+    """Merge the persisted snapshot of the symbol table and the suffix of each persisted episode into the symbol table, returning the number of persisted memories."""
+    rows = self.db.execute('SELECT ep FROM memories').fetchall()
+    table = {}
+    for ep, in rows:
+      match = re.fullmatch(r'(\D+)(\d+)', ep) if ep is not None else None
+      if match:
+        table[match[1]] = max(table.get(match[1], 0), int(match[2]))
+    symtab = self._get_meta('symtab')
+    if symtab is not None:
+      for prefix, end in json.loads(symtab).items():
+        table[prefix] = max(table.get(prefix, 0), end)
+    merge_symtab(table)
+    return len(rows)
+
+  def _load(self):
+    """Load all persisted memories."""
+    rows = self.db.execute('SELECT id, event, start_time, end_time, last_access, importance, context, embedding '
+                           'FROM memories ORDER BY id').fetchall()
+    embeddings = None
+    if self._nrows:
+      embeddings = np.memmap(self._emb_fname, dtype=np.float32, mode='r', shape=(self._nrows, self.dim))
+    with self._transaction():
+      for id, event, start_time, end_time, last_access, importance, context, row in rows:
+        event = pickle.loads(event)
+        if row is not None and row < self._nrows:
+          event.embedding = embeddings[row]
+        memory = Memory(event, importance=importance)
+        memory.start_time = from_num(start_time)
+        memory.end_time = from_num(end_time) if end_time is not None else None
+        memory.last_access = from_num(last_access)
+        self._ids[memory] = id
+        super().store(memory, context=bool(context))
+
+  @contextmanager
+  def _transaction(self):
+    """Group all database writes made within this context into a single transaction, committed upon exiting the outermost context."""
+    self._depth += 1
+    try:
+      yield
+    finally:
+      self._depth -= 1
+      if not self._depth and self.db is not None:
+        self._commit()
+
+  def _commit(self):
+    """Write any buffered access times and commit the current transaction."""
+    if self._accessed:
+      self.db.executemany('UPDATE memories SET last_access = ? WHERE id = ?', [(t, id) for id, t in self._accessed.items()])
+      self._accessed = {}
+    self._emb_file.flush()
+    self.db.commit()
+
+  def _write_embedding(self, embedding):
+    """Append an embedding to the embeddings file, returning its row (or None if the memory is not embedded)."""
+    if embedding is None or not len(embedding):
+      return None
+    v = np.asarray(embedding, dtype=np.float32).ravel()
+    if self.dim is None:
+      self.dim = len(v)
+      self._set_meta('dim', str(self.dim))
+    elif len(v) != self.dim:
+      raise Exception(f'Embedding of dimension {len(v)} does not match persisted embeddings of dimension {self.dim}.')
+    self._emb_file.write(v.tobytes())
+    self._nrows += 1
+    return self._nrows - 1
+
+  def _insert(self, memory):
+    """Write a new memory to the database."""
+    event = copy.copy(memory.event)
+    event.embedding = []
+    ep = memory.get_ep()
+    cursor = self.db.execute('INSERT INTO memories (event, start_time, end_time, last_access, importance, context, embedding, ep) '
+                             'VALUES (?, ?, ?, ?, ?, ?, ?, ?)',
+                             (pickle.dumps(event, protocol=pickle.HIGHEST_PROTOCOL),
+                              memory.start_time.to_num(),
+                              memory.end_time.to_num() if memory.end_time else None,
+                              memory.last_access.to_num(),
+                              memory.importance,
+                              int(memory in self.context),
+                              self._write_embedding(memory.event.embedding),
+                              ep if isinstance(ep, str) else None))
+    self._ids[memory] = cursor.lastrowid
+
+  def access(self, memory):
+    if listp(memory):
+      return [self.access(m) for m in memory]
+    
+    memory = super().access(memory)
+    if memory is not None and memory in self._ids:
+      self._accessed[self._ids[memory]] = memory.last_access.to_num()
+    return memory
+
+  def store(self, memory, context=True):
+    if listp(memory):
+      with self._transaction():
+        return [self.store(m, context=context) for m in memory]
+
+    with self._transaction():
+      new = memory not in self.memories
+      in_context = memory in self.context
+      super().store(memory, context=context)
+      if self.db is None or memory not in self.memories:
+        return
+      if new:
+        self._insert(memory)
+      elif context and not in_context:
+        self.db.execute('UPDATE memories SET context = 1 WHERE id = ?', (self._ids[memory],))
+
+  def remove(self, memory):
+    if listp(memory):
+      with self._transaction():
+        return [self.remove(m) for m in memory]
+
+    with self._transaction():
+      super().remove(memory)
+      id = self._ids.pop(memory, None)
+      if self.db is not None and id is not None:
+        self._accessed.pop(id, None)
+        self.db.execute('DELETE FROM memories WHERE id = ?', (id,))
+
+  def remove_from_context(self, memory):
+    if listp(memory):
+      with self._transaction():
+        return [self.remove_from_context(m) for m in memory]
+
+    with self._transaction():
+      in_context = memory in self.context
+      super().remove_from_context(memory)
+      if self.db is not None and in_context and memory in self._ids:
+        self.db.execute('UPDATE memories SET end_time = ?, context = 0 WHERE id = ?',
+                        (memory.end_time.to_num(), self._ids[memory]))
+
+  def instantiate(self, event, importance=DEFAULT_IMPORTANCE, context=True, embed=True):
+    with self._transaction():
+      return super().instantiate(event, importance=importance, context=context, embed=embed)
+
+  def flush_context(self):
+    with self._transaction():
+      return super().flush_context()
+
+  def close(self):
+    """Write any buffered access times, save a snapshot of the symbol table, and close the database and embeddings file."""
+    if self.db is None:
+      return
+    self._set_meta('symtab', json.dumps(snapshot_symtab()))
+    self._commit()
+    self.db.close()
+    self._emb_file.close()
+    self.db = None
+
+  def __getstate__(self):
+    self._ensure_loaded()
+    state = self.__dict__.copy()
+    state['db'] = None
+    state['_emb_file'] = None
+    return state
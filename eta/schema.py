@@ -8,14 +8,19 @@ formula characterizing the schema episode potentially containing participant var
 """
 
 import glob
-from copy import deepcopy
+import hashlib
+import numpy as np
+from copy import copy
 
 from eta.constants import *
 from eta.util.general import (gentemp, remove_duplicates, get_keyword_contents, append, 
                               cons, flatten, substall, dict_substall_keys, variablep, dual_var, duplicate_var,
                               argmax)
 from eta.util.sexpr import read_lisp, list_to_s_expr
-from eta.lf import ULF, ELF, parse_eventuality_list
+from eta.util.cache import load_cached, load_keyed
+from eta.index import FlatIndex, make_index, normalize
+import eta.util.sexpr
+from eta.lf import ULF, ELF, parse_eventuality_list, embed_eventualities
 
 class Schema:
   """An abstract schema class.
@@ -38,8 +43,16 @@ class Schema:
     The ELF formula for the contents of the schema.
   sections : dict[str, list[Eventuality]]
     A dict mapping each section label (e.g., ``types``) to a list of eventualities created from the schema contents.
+    For a schema instance, this only contains the sections that have been materialized so far.
   embedding : list[float]
     A vector embedding of this schema.
+
+  Notes
+  -----
+  Instantiating a schema creates a copy-on-write instance, which shares the generic schema that it was instantiated
+  from, and only stores the variable replacements made to the generic schema and the bindings of the instance. The
+  header, contents, and each section of the instance are materialized from the generic schema when first accessed.
+  Thus, the formulas of a generic schema should never be modified once it has been instantiated.
   """
 
   def __init__(self, predicate='', participants=[], vars=[], bindings={}, header=[], contents=[]):
@@ -52,6 +65,31 @@ class Schema:
     self.contents = ELF(contents)
     self.sections = {}
     self.embedding = []
+    self._generic = None
+    self._mappings = []
+    self._index = None
+
+  @property
+  def header(self):
+    """ELF : the ELF formula for the header of the schema."""
+    if self._header is None:
+      self._header = ELF(substall(self._generic.header.get_formula(), self._mappings))
+    return self._header
+  
+  @header.setter
+  def header(self, header):
+    self._header = header
+
+  @property
+  def contents(self):
+    """ELF : the ELF formula for the contents of the schema."""
+    if self._contents is None:
+      self._contents = ELF(substall(self._generic.contents.get_formula(), self._mappings))
+    return self._contents
+  
+  @contents.setter
+  def contents(self, contents):
+    self._contents = contents
 
   def read_param_dict(predicate, schema_contents):
     """Read an S-expression containing schema contents (for a given predicate) into a dict of schema parameters."""
@@ -81,15 +119,24 @@ class Schema:
     return probabilities
   
   def subst_mappings(self, mappings):
-    """Given a list of variable replacement mappings, apply the mappings to each part of the schema."""
+    """Given a list of variable replacement mappings, apply the mappings to each part of the schema.
+    
+    For a schema instance, the mappings are only applied to the materialized sections, and are otherwise
+    recorded to be applied when the header, contents, or remaining sections are materialized.
+    """
     self.participants = substall(self.participants, mappings)
     self.vars = [m[1] for m in mappings]
     self.bindings = dict_substall_keys(self.bindings, mappings)
-    self.header = ELF(substall(self.header.get_formula(), mappings))
-    self.contents = ELF(substall(self.contents.get_formula(), mappings))
+    if self._generic is None:
+      self.header = ELF(substall(self.header.get_formula(), mappings))
+      self.contents = ELF(substall(self.contents.get_formula(), mappings))
+    else:
+      self._mappings = self._mappings + mappings
+      self.header = None
+      self.contents = None
     for sec in self.sections.values():
-      for (var1, var2) in mappings:
-        [e.replacevar(var1, var2) for e in sec]
+      for e in sec:
+        e.replacevars(mappings)
   
   def duplicate_variables(self):
     """Duplicate all variables across a schema, mapping the original variables to the duplicated ones.
@@ -105,7 +152,7 @@ class Schema:
   def instantiate(self, args):
     """Instantiate a specific instance of a schema given a list of argument values for each variable in the header.
 
-    This creates a deep copy of the schema, with duplicate variables to ensure that no collisions occur if
+    This creates a copy-on-write instance of the schema, with duplicate variables to ensure that no collisions occur if
     the events in the schema are added to a plan.
 
     Parameters
@@ -117,11 +164,35 @@ class Schema:
     -------
     Schema
     """
-    schema_instance = deepcopy(self)
+    schema_instance = copy(self)
+    schema_instance.bindings = copy(self.bindings)
+    schema_instance._index = None
+    if self._generic is None:
+      schema_instance._generic = self
+      schema_instance.sections = {}
+    else:
+      schema_instance.sections = {sec: [e.copy() for e in eventualities] for sec, eventualities in self.sections.items()}
     schema_instance.duplicate_variables()
     schema_instance.bind_args(args)
     return schema_instance
 
+  def materialize(self, sec):
+    """Get the eventualities within a given section of the schema, materializing them from the generic schema if this is a schema instance."""
+    if sec in self.sections:
+      return self.sections[sec]
+    if self._generic is None or sec not in self._generic.sections:
+      return []
+    eventualities = [e.copy(bindings=False) for e in self._generic.sections[sec]]
+    for e in eventualities:
+      e.replacevars(self._mappings)
+      for var, val in self.bindings.items():
+        e.bind(var, val)
+    return self.sections.setdefault(sec, eventualities)
+
+  def section_labels(self):
+    """Get the labels of all sections of the schema."""
+    return list(self._generic.sections.keys()) if self._generic is not None else list(self.sections.keys())
+
   def bind(self, var, val):
     """Bind the given variable symbol to the given value."""
     if not var in self.vars:
@@ -203,10 +274,27 @@ class Schema:
 
   def embed(self, embedder):
     """Embed the schema based on the natural language representation of its contents, given an embedder object."""
-    self.embedding = embedder.embed(self.contents.to_nl())
-    for sec in self.sections.values():
-      for eventuality in sec:
-        eventuality.embed(embedder)
+    embed_schemas([self], embedder)
+
+  def get_index(self):
+    """Get an exact vector index of the embeddings of all facts in the schema, keyed on the position of each fact.
+
+    Since schemas typically contain few facts, the index is always a flat index, and is built upon first use
+    (and rebuilt once the schema is re-embedded).
+
+    Returns
+    -------
+    index : FlatIndex
+    eventualities : list[Eventuality]
+      The indexed facts.
+    """
+    if self._index is None:
+      eventualities = self.get_section(':all')
+      index = FlatIndex(capacity=max(1, len(eventualities)))
+      for i, e in enumerate(eventualities):
+        index.add(i, e.embedding)
+      self._index = (index, eventualities)
+    return self._index
 
   def retrieve(self, embedder, query, n=5, header=True):
     """Retrieve some number of facts from the schema according to similarity with a query string, given an embedder object.
@@ -227,9 +315,14 @@ class Schema:
     list[s-expr]
       The retrieved schema facts as S-expressions.
     """
-    eventualities = self.get_section(':all')
-    scores = embedder.score(query, eventualities, [e.embedding for e in eventualities])
-    top = argmax(eventualities, scores, n)
+    index, eventualities = self.get_index()
+    q = normalize(embedder.embed(query)) if len(index) else None
+    if q is not None:
+      top = [eventualities[i] for i in index.search(q, n)[0]]
+    else:
+      # The index is only empty if no fact is embedded, so there are no stored embeddings to normalize here
+      scores = embedder.score(query, eventualities, [e.embedding for e in eventualities])
+      top = argmax(eventualities, scores, n)
     if header:
       return cons(self.header.get_formula(), [e.get_wff() for e in top])
     else:
@@ -281,10 +374,10 @@ class Schema:
     list[Eventuality]
     """
     if sec == ':all':
-      return append([eventualities for eventualities in self.sections.values()])
+      sec = self.section_labels()
     if isinstance(sec, str):
       sec = [sec]
-    return append([self.sections[s] if s in self.sections else [] for s in sec])
+    return append([self.materialize(s) for s in sec])
   
   def get_section_eps(self, sec, no_bind=False):
     """Get all episode symbols within a schema section or list of sections.
@@ -475,6 +568,9 @@ class SchemaLibrary:
   ----------
   embedder : Embedder, optional
     If provided, an embedder to embed all schemas that are added.
+  index : str, optional
+    The type of vector index used to retrieve schemas (see ``eta.index``). If not given, the default
+    index type defined in eta.constants will be used.
 
   Attributes
   ----------
@@ -485,13 +581,16 @@ class SchemaLibrary:
   obj : dict[str, ObjSchema]
     A dict mapping object schema predicates to object schemas.
   embedder : Embedder
+  index_type : str
   """
 
-  def __init__(self, embedder=None):
+  def __init__(self, embedder=None, index=DEFAULT_VECTOR_INDEX):
     self.dial = {}
     self.epi = {}
     self.obj = {}
     self.embedder = embedder
+    self.index_type = index
+    self._indexes = {}
 
   def add(self, schema):
     """Add a schema object to the library."""
@@ -503,21 +602,19 @@ class SchemaLibrary:
       self.obj[schema.predicate] = schema
     else:
       raise Exception(f'Unsupported schema type for {schema.predicate}')
+    self._indexes = {}
     
   def create(self, predicate, contents):
     """Create a schema object from the given predicate and contents (an S-expression) and add it to the library."""
-    if contents[0] in ['dialogue-schema', 'dial-schema']:
-      typ = DialSchema
-    elif contents[0] in ['event-schema', 'episode-schema', 'epi-schema']:
-      typ = EpiSchema
-    elif contents[0] in ['object-schema', 'obj-schema']:
-      typ = ObjSchema
-    else:
-      raise Exception(f'Schema for {predicate} must begin with either dial-schema, epi-schema or obj-schema')
-    schema = typ(**typ.read_param_dict(predicate, contents))
+    self.load(make_schema(predicate, contents))
+
+  def load(self, schema):
+    """Load a schema object (or list of schema objects) into the library, embedding them in batches if an embedder is defined."""
+    schemas = schema if isinstance(schema, list) else [schema]
     if self.embedder:
-      schema.embed(self.embedder)
-    self.add(schema)
+      embed_schemas(schemas, self.embedder)
+    for schema in schemas:
+      self.add(schema)
 
   def get_schemas(self, type):
     """Get all schemas of a particular type or list of types.
@@ -587,8 +684,54 @@ class SchemaLibrary:
       return []
     if not query or not self.embedder:
       return schemas[0]
+    index, schemas = self.get_index(type)
+    q = normalize(self.embedder.embed(query)) if len(index) else None
+    if q is not None:
+      return [schemas[i] for i in index.search(q, m)[0]]
+    # The index is only empty if no schema is embedded, so there are no stored embeddings to normalize here
     scores = self.embedder.score(query, schemas, [s.embedding for s in schemas])
     return argmax(schemas, scores, m)
+
+  def get_index(self, type):
+    """Get a vector index of the embeddings of all schemas of a particular type (or list of types).
+
+    The index is built upon first use (and rebuilt once any schema is added to the library or any indexed schema
+    is re-embedded), with each schema keyed on its position in the list of indexed schemas. Approximate indexes are also cached on disk, keyed on
+    the index type and the predicate and embedding of each schema, such that they are only rebuilt if the schemas change.
+
+    Parameters
+    ----------
+    type : str or list[str]
+      A schema type (``dial``, ``epi``, or ``obj``), or a list of types.
+
+    Returns
+    -------
+    index : VectorIndex
+    schemas : list[Schema]
+      The indexed schemas.
+    """
+    key = tuple(type) if isinstance(type, list) else type
+    if key in self._indexes:
+      index, schemas, embeddings = self._indexes[key]
+      if any(schema.embedding is not embedding for schema, embedding in zip(schemas, embeddings)):
+        del self._indexes[key]
+    if key not in self._indexes:
+      schemas = self.get_schemas(type)
+      def build():
+        index = make_index(self.index_type)
+        for i, schema in enumerate(schemas):
+          index.add(i, schema.embedding)
+        return index
+      if self.index_type == 'flat' or not any([len(s.embedding) for s in schemas]):
+        index = build()
+      else:
+        h = hashlib.sha256(str(self.index_type).encode())
+        for schema in schemas:
+          h.update(schema.predicate.encode())
+          h.update(np.asarray(schema.embedding, dtype=np.float32).tobytes())
+        index = load_keyed('index', h.hexdigest(), build)
+      self._indexes[key] = (index, schemas, [schema.embedding for schema in schemas])
+    return self._indexes[key][:2]
   
   def retrieve_knowledge(self, type, query=None, m=1, n=5, header=True):
     """Retrieve some number of facts from some number of retrieved schemas of a particular type (or list of types).
@@ -625,12 +768,7 @@ class SchemaLibrary:
     fname : str
       The LISP file to read.
     """
-    for expr in read_lisp(fname):
-      if expr[0] == 'store-schema':
-        predicate = expr[1].strip("'")
-        contents = expr[2]
-        if predicate:
-          self.create(predicate, contents)
+    self.load(read_schemas_file(fname))
     return self
 
   def from_lisp_dirs(self, dirs):
@@ -643,14 +781,64 @@ class SchemaLibrary:
     """
     if isinstance(dirs, str):
       dirs = [dirs]
+    schemas = []
     for dir in dirs:
       fnames = glob.glob(dir + '/**/*.lisp', recursive=True)
       for fname in fnames:
-        self.from_lisp_file(fname)
+        schemas += read_schemas_file(fname)
+    self.load(schemas)
     return self
 
   def __str__(self):
     ret = []
     for name, d in zip(['dialogue:', 'episode:', 'object:'], [self.dial, self.epi, self.obj]):
       ret.append(name+'\n'+'\n'.join([predicate for predicate in d.keys()]))
-    return '\n\n'.join(ret)
\ No newline at end of file
+    return '\n\n'.join(ret)
+
+
+def embed_schemas(schemas, embedder):
+  """Embed a list of schemas, as well as every eventuality within each schema, in batches (see ``eta.lf.embed_eventualities``)."""
+  eventualities = [e for schema in schemas for e in schema.get_section(':all')]
+  texts = [schema.contents.to_nl() for schema in schemas] if embedder.embeds_text() else [None for _ in schemas]
+  for schema, embedding in zip(schemas, embed_eventualities(eventualities, embedder, texts=texts)):
+    schema.embedding = embedding
+    schema._index = None
+
+
+def make_schema(predicate, contents):
+  """Make a schema object of the appropriate type from the given predicate and contents (an S-expression)."""
+  if contents[0] in ['dialogue-schema', 'dial-schema']:
+    typ = DialSchema
+  elif contents[0] in ['event-schema', 'episode-schema', 'epi-schema']:
+    typ = EpiSchema
+  elif contents[0] in ['object-schema', 'obj-schema']:
+    typ = ObjSchema
+  else:
+    raise Exception(f'Schema for {predicate} must begin with either dial-schema, epi-schema or obj-schema')
+  return typ(**typ.read_param_dict(predicate, contents))
+
+
+def read_schemas_file(fname):
+  """Read a list of schema objects from a LISP file.
+
+  The S-expressions read from the file are cached, such that the file is only re-read if it is modified. The schema
+  objects themselves are not cached, since they contain generated symbols (e.g., schema IDs, and the episode variables
+  of conditional and repeated steps) that must be unique to the current session.
+  
+  Parameters
+  ----------
+  fname : str
+    The LISP file to read.
+
+  Returns
+  -------
+  list[Schema]
+  """
+  schemas = []
+  for expr in load_cached('lisp', fname, read_lisp, deps=[eta.util.sexpr]):
+    if expr[0] == 'store-schema':
+      predicate = expr[1].strip("'")
+      contents = expr[2]
+      if predicate:
+        schemas.append(make_schema(predicate, contents))
+  return schemas
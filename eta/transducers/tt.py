@@ -11,9 +11,14 @@ i.e., string-like directives (:out, :gist, etc.) are joined to create strings, w
 directives (:ulf, :schema, :raw, etc.) are returned as-is. Results using the :and keyword are also
 flattened to create a single list of outputs.
 
+Many inputs may also be transduced at once using ``TTTransducer.batch`` (e.g., to replay a corpus of transcripts
+for evaluation), optionally using a pool of processes.
+
 Full documentation on TT can be found in the ``eta.util.tt`` package.
 """
 
+from multiprocessing import Pool
+
 from eta.transducers.base import *
 from eta.lf import parse_eventuality, is_set, extract_set
 from eta.discourse import get_prior_turn
@@ -21,13 +26,15 @@ from eta.discourse import get_prior_turn
 from eta.constants import *
 from eta.util.general import listp, cons, remove_duplicates, isquote
 from eta.util.tt.choice import choose_result_for
-from eta.util.tt.parse import from_lisp_dirs
+from eta.util.tt.parse import load_forest
 
 class TTTransducer(Transducer):
   """The abstract TT transducer class containing the core implementation of the TT mapping process.
   
   Each TT transducer is initialized with a set of trees and word features read from a directory of LISP
   choice tree packets, as well as a list of root names to use specific to that particular transducer.
+  The trees, word features, and predicates read from a given set of directories are shared by all transducers
+  in the process (see ``eta.util.tt.parse.load_forest``), with each transducer having its own latency countdowns.
 
   The transducer performs a mapping by passing its arguments (or some data derived from the arguments)
   to its root choice tree(s), processing the results based on the directive, and combining them into a
@@ -43,20 +50,30 @@ class TTTransducer(Transducer):
   Attributes
   ----------
   trees : dict
-    A dict mapping choice tree root names to the choice tree roots.
+    A dict mapping choice tree root names to overlays of the shared choice trees (with latency countdowns
+    specific to this transducer).
   feats : dict
     A dict mapping words to feature lists.
   roots : list[str]
     A list of root names to use for choosing results.
   """
+  batch_latency_modes = ['shared', 'reset', 'disabled']
 
   def __init__(self, rule_dirs, roots):
-    self.trees, self.feats, self.preds = from_lisp_dirs(rule_dirs)
+    trees, self.feats, self.preds = load_forest(rule_dirs)
+    self.trees = { name : tree.overlay() for name, tree in trees.items() }
     if isinstance(roots, str):
       self.roots = [roots]
     else:
       self.roots = roots
 
+  def __copy__(self):
+    """Copy this transducer, sharing its choice trees, but with its own (copied) latency countdowns."""
+    copied = self.__class__.__new__(self.__class__)
+    copied.__dict__.update(self.__dict__)
+    copied.trees = { name : tree.overlay() for name, tree in self.trees.items() }
+    return copied
+
   def __call__(self, inputs):
     """Choose a result for some input using TT.
 
@@ -73,6 +90,67 @@ class TTTransducer(Transducer):
     list[str or s-expr]
       A list of chosen results (which may be processed further by the specific transducer instance).
     """
+    return self._transduce(inputs)
+
+  def batch(self, inputs, latency='shared', processes=None):
+    """Choose results for each of a list of inputs using TT.
+
+    The inputs share the preprocessing of the choice trees, i.e., the indexes of patterns that can be skipped for
+    a given clause, as well as any memoized subtree searches that don't depend on latency countdowns (see
+    ``eta.util.tt.choice.choose_result_compiled``).
+
+    Parameters
+    ----------
+    inputs : list
+      A list of inputs, each of the form accepted by ``TTTransducer.__call__`` (i.e., after any processing of
+      the arguments by a specific transducer).
+    latency : str, default='shared'
+      How to use the latencies of template nodes, one of:
+
+        - ``shared``: the inputs are transduced in order, updating the latency countdowns of the choice trees,
+          as if this transducer were called on each input in turn.
+        - ``reset``: each input is transduced using the latency countdowns at the start of the batch, so the
+          result for each input does not depend on the other inputs. The countdowns are left unchanged.
+        - ``disabled``: latencies are ignored, and the countdowns are left unchanged.
+
+    processes : int, optional
+      If given, the inputs are divided among a pool of this many worker processes, each with its own copy
+      of the choice trees. Only supported if `latency` is ``reset`` or ``disabled``. Note that any random
+      choices between templates are made independently by each process.
+
+    Returns
+    -------
+    list[list[str or s-expr]]
+      The list of chosen results for each input, in the order of the inputs.
+    """
+    if latency not in self.batch_latency_modes:
+      raise Exception(f'Unsupported latency mode {latency} for TT batch; must be one of {self.batch_latency_modes}')
+    if processes and latency == 'shared':
+      raise Exception('TT batches using multiple processes require latency to be reset or disabled for each input')
+    if processes and processes > 1 and len(inputs) > 1:
+      with Pool(processes, initializer=_init_batch_worker, initargs=(self, latency)) as pool:
+        return pool.map(_batch_worker, inputs, chunksize=max(1, len(inputs) // (4*processes)))
+    memo = {}
+    if latency != 'reset':
+      return [self._transduce(x, latency=latency == 'shared', memo=memo) for x in inputs]
+    counts = self._get_counts()
+    results = []
+    for x in inputs:
+      self._set_counts(counts)
+      results.append(self._transduce(x, memo=memo))
+    self._set_counts(counts)
+    return results
+
+  def _get_counts(self):
+    """Get a copy of the latency countdowns of each choice tree."""
+    return { name : list(tree.count) for name, tree in self.trees.items() }
+
+  def _set_counts(self, counts):
+    """Restore the latency countdowns of each choice tree from a copy."""
+    for name, tree in self.trees.items():
+      tree.count[:] = counts[name]
+
+  def _transduce(self, inputs, latency=True, memo=None):
     # TODO: the following logic may not work in the case where ULF inputs are mixed with string inputs
     # (the latter of which should still be split into word lists), but for the time being we assume
     # representations won't be mixed.
@@ -85,7 +163,7 @@ class TTTransducer(Transducer):
 
     ret = []
     for root in self.roots:
-      choice = choose_result_for(clause, root, self.trees, self.feats, self.preds)
+      choice = choose_result_for(clause, root, self.trees, self.feats, self.preds, latency=latency, memo=memo)
       choice = self._process_choice(choice)
       if choice and listp(choice) and choice[0] == ':and':
         ret = ret + choice[1:]
@@ -162,8 +240,8 @@ class TTGistTransducer(TTTransducer, GistTransducer):
 
     gists = []
     if prev_gists:
-      for prev_gist in prev_gists:
-        gists += super().__call__([prev_gist.split(), utt.split()])
+      for result in self.batch([[prev_gist.split(), utt.split()] for prev_gist in prev_gists]):
+        gists += result
     else:
       gists = super().__call__([[], utt.split()])
     return gists
@@ -220,8 +298,8 @@ class TTParaphraseTransducer(TTTransducer, ParaphraseTransducer):
     utts = []
     if prior_turn:
       prev_gists = prior_turn.gists
-      for prev_gist in prev_gists:
-        utts += super().__call__([prev_gist.split(), gist.split()])
+      for result in self.batch([[prev_gist.split(), gist.split()] for prev_gist in prev_gists]):
+        utts += result
     return utts
   
 
@@ -270,4 +348,24 @@ class TTAffectTransducer(TTTransducer, AffectTransducer):
     self._validate(words, conversation_log)
     # TODO
     affects = []
-    return affects
\ No newline at end of file
+    return affects
+
+
+# The transducer (and latency mode) used by each worker process of a TT batch
+_batch_transducer = None
+_batch_latency = None
+_batch_counts = None
+_batch_memo = None
+
+def _init_batch_worker(transducer, latency):
+  global _batch_transducer, _batch_latency, _batch_counts, _batch_memo
+  _batch_transducer = transducer
+  _batch_latency = latency
+  _batch_counts = transducer._get_counts()
+  _batch_memo = {}
+
+
+def _batch_worker(inputs):
+  if _batch_latency == 'reset':
+    _batch_transducer._set_counts(_batch_counts)
+  return _batch_transducer._transduce(inputs, latency=_batch_latency == 'reset', memo=_batch_memo)
@@ -0,0 +1,132 @@
+"""Utilities for caching artifacts built from source files (e.g., parsed schemas or choice trees) on disk.
+
+Each cache entry corresponds to a single source file and a particular kind of artifact, and is keyed on a hash of
+the contents of that source file, as well as the source code of any modules used to build the artifact. Thus, an
+entry is invalidated (and rebuilt) whenever either the source file or the relevant code is modified.
+
+Artifacts that are not built from a source file (e.g., vector indexes) may instead be keyed on a hash of the data
+that they are built from, using `load_keyed`.
+
+Artifacts are stored using pickle, so any symbols that are generated while building an artifact (e.g., using
+``gentemp``) would not be unique when the artifact is loaded in a later session. Artifacts containing generated
+symbols are therefore not cached; instead, only the S-expressions read from the source file are cached, and the
+objects are built from these upon loading (e.g., schemas and initial knowledge).
+"""
+
+import os
+import pickle
+import hashlib
+import shutil
+
+from eta.constants import *
+import eta.util.file as file
+
+_MODULE_HASHES = {}
+
+def hash_module(module):
+  """Compute a hash of the source code of a given module."""
+  if module.__name__ not in _MODULE_HASHES:
+    with open(module.__file__, 'rb') as f:
+      _MODULE_HASHES[module.__name__] = hashlib.sha256(f.read()).hexdigest()
+  return _MODULE_HASHES[module.__name__]
+
+
+def cache_key(fname, deps=[]):
+  """Compute the key for a source file, given the modules used to build artifacts from that file."""
+  h = hashlib.sha256(str(CACHE_VERSION).encode())
+  for module in deps:
+    h.update(hash_module(module).encode())
+  with open(fname, 'rb') as f:
+    h.update(f.read())
+  return h.hexdigest()
+
+
+def cache_path(kind, fname):
+  """Get the path of the cache entry for a given kind of artifact and source file."""
+  return os.path.join(CACHE_PATH, kind, hashlib.sha256(os.path.abspath(fname).encode()).hexdigest() + '.pkl')
+
+
+def load_cached(kind, fname, build, deps=[]):
+  """Load the artifact of a given kind built from a source file, building and caching the artifact if necessary.
+
+  Parameters
+  ----------
+  kind : str
+    The kind of artifact (e.g., ``schemas``), used to separate cache entries built from the same file.
+  fname : str
+    The source file to build the artifact from.
+  build : function
+    A function mapping the source filename to the artifact, which must be serializable using pickle.
+  deps : list[module], optional
+    A list of modules used to build the artifact, such that the entry is invalidated if any of their code changes.
+
+  Returns
+  -------
+  object
+    The artifact built from the source file.
+  """
+  if not USE_CACHE:
+    return build(fname)
+  key = cache_key(fname, deps)
+  path = cache_path(kind, fname)
+  artifact = read_entry(path, key)
+  if artifact is None:
+    artifact = build(fname)
+    write_entry(path, key, artifact)
+  return artifact
+
+
+def load_keyed(kind, key, build):
+  """Load an artifact of a given kind identified by a key, rather than a source file, building and caching the artifact if necessary.
+
+  Parameters
+  ----------
+  kind : str
+    The kind of artifact (e.g., ``index``).
+  key : str
+    A key identifying the artifact, e.g., a hash of the data (and any parameters) that the artifact is built from.
+  build : function
+    A function with no arguments that builds the artifact, which must be serializable using pickle.
+
+  Returns
+  -------
+  object
+    The artifact identified by the key.
+  """
+  if not USE_CACHE:
+    return build()
+  path = os.path.join(CACHE_PATH, kind, hashlib.sha256(key.encode()).hexdigest() + '.pkl')
+  artifact = read_entry(path, key)
+  if artifact is None:
+    artifact = build()
+    write_entry(path, key, artifact)
+  return artifact
+
+
+def read_entry(path, key):
+  """Read the artifact in a given cache entry, returning None if the entry does not exist or does not match the given key."""
+  if file.exists(path):
+    try:
+      with open(path, 'rb') as f:
+        entry_key, artifact = pickle.load(f)
+      if entry_key == key:
+        return artifact
+    except Exception:
+      pass
+  return None
+
+
+def write_entry(path, key, artifact):
+  """Write an artifact to a given cache entry, along with its key."""
+  file.ensure_dir_exists(os.path.dirname(path))
+  tmp_path = f'{path}.{os.getpid()}.tmp'
+  with open(tmp_path, 'wb') as f:
+    pickle.dump((key, artifact), f, protocol=pickle.HIGHEST_PROTOCOL)
+  os.replace(tmp_path, path)
+
+
+def clear_cache(kind=None):
+  """Clear all cache entries (or only those of a given kind of artifact)."""
+  path = os.path.join(CACHE_PATH, kind) if kind else CACHE_PATH
+  if os.path.isdir(path):
+    shutil.rmtree(path)
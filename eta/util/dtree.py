@@ -0,0 +1,228 @@
+"""A discrimination tree for indexing S-expressions, such that all indexed expressions matching a pattern may be retrieved.
+
+Each S-expression is flattened into a sequence of tokens by a preorder traversal, where an atom is its own token, and
+a list is denoted by a token containing its length, followed by the tokens of each of its elements. These sequences are
+stored in a trie, where each node also records the nodes reached by skipping each complete subexpression beginning
+at that node. Thus, a variable in a pattern is matched against every subexpression at that position in a single step,
+without traversing the subexpressions themselves.
+
+Variables may occur anywhere in a pattern (including nested within lists), and repeated variables must match equal
+subexpressions. Variables within the indexed expressions are treated as constants (i.e., matching is one-way).
+"""
+
+from eta.util.general import variablep
+
+_LIST = '('
+
+def flatten_expr(expr):
+  """Flatten an S-expression into a list of tokens, also returning the position at which each token's subexpression ends."""
+  tokens = []
+  ends = []
+  def flatten_rec(e):
+    i = len(tokens)
+    ends.append(None)
+    if isinstance(e, list):
+      tokens.append((_LIST, len(e)))
+      for x in e:
+        flatten_rec(x)
+    else:
+      tokens.append(e)
+    ends[i] = len(tokens)
+  flatten_rec(expr)
+  return tokens, ends
+
+
+def match_expr(patt, expr, bindings=None):
+  """Match a pattern (possibly containing variables) against an S-expression.
+
+  Parameters
+  ----------
+  patt : s-expr
+    A pattern, possibly containing variables at any level.
+  expr : s-expr
+    An S-expression to match against.
+  bindings : dict, optional
+    Any existing bindings of variables in the pattern.
+
+  Returns
+  -------
+  dict or None
+    The bindings of each variable in the pattern, or None if the match fails.
+  """
+  if bindings is None:
+    bindings = {}
+  if variablep(patt):
+    if patt in bindings:
+      return bindings if bindings[patt] == expr else None
+    bindings[patt] = expr
+    return bindings
+  if isinstance(patt, list):
+    if not isinstance(expr, list) or len(patt) != len(expr):
+      return None
+    for p, e in zip(patt, expr):
+      if match_expr(p, e, bindings) is None:
+        return None
+    return bindings
+  return bindings if patt == expr else None
+
+
+def compile_pattern(patt):
+  """Flatten a pattern into a list of tokens, also returning whether each token is a variable, and the path (i.e., the sequence of list indices) of each variable."""
+  tokens = []
+  is_var = []
+  paths = []
+  def compile_rec(p, path):
+    if isinstance(p, list):
+      tokens.append((_LIST, len(p)))
+      is_var.append(False)
+      for i, x in enumerate(p):
+        compile_rec(x, path+(i,))
+    else:
+      v = variablep(p)
+      tokens.append(p)
+      is_var.append(v)
+      if v:
+        paths.append((p, path))
+  compile_rec(patt, ())
+  return tokens, is_var, paths
+
+
+class _Node:
+  __slots__ = ('children', 'jumps', 'values', 'count')
+
+  def __init__(self):
+    self.children = {}
+    self.jumps = {}
+    self.values = {}
+    self.count = 0
+
+
+class DiscriminationTree:
+  """A discrimination tree mapping S-expressions to values.
+
+  Each value is stored under a single S-expression, and values must be hashable. Values stored under the same expression
+  are kept in insertion order, and matches are returned in the order in which their values were inserted.
+
+  Attributes
+  ----------
+  root : _Node
+    The root node of the trie. Each node contains a dict mapping tokens to child nodes, a dict mapping each node reachable by
+    skipping a complete subexpression to the number of expressions passing through it, a dict mapping each value stored at
+    that node to its insertion order and expression, and the number of expressions passing through that node.
+  """
+
+  def __init__(self):
+    self.root = _Node()
+    self._seq = 0
+    self._len = 0
+
+  def _find(self, tokens):
+    """Find the node reached by a sequence of tokens (or None if no such node exists)."""
+    node = self.root
+    for t in tokens:
+      node = node.children.get(t)
+      if node is None:
+        return None
+    return node
+
+  def insert(self, expr, value):
+    """Store a value under a given S-expression (if the value is not already stored under that expression)."""
+    tokens, ends = flatten_expr(expr)
+    leaf = self._find(tokens)
+    if leaf is not None and value in leaf.values:
+      return
+    node = self.root
+    node.count += 1
+    path = [node]
+    for t in tokens:
+      child = node.children.get(t)
+      if child is None:
+        child = node.children[t] = _Node()
+      child.count += 1
+      node = child
+      path.append(node)
+    for i, end in enumerate(ends):
+      jumps = path[i].jumps
+      jumps[path[end]] = jumps.get(path[end], 0) + 1
+    node.values[value] = (self._seq, expr)
+    self._seq += 1
+    self._len += 1
+
+  def remove(self, expr, value):
+    """Remove a value stored under a given S-expression, returning whether the value was found."""
+    tokens, ends = flatten_expr(expr)
+    leaf = self._find(tokens)
+    if leaf is None or value not in leaf.values:
+      return False
+    del leaf.values[value]
+    node = self.root
+    path = [node]
+    for t in tokens:
+      node = node.children[t]
+      path.append(node)
+    for i, end in enumerate(ends):
+      jumps = path[i].jumps
+      jumps[path[end]] -= 1
+      if not jumps[path[end]]:
+        del jumps[path[end]]
+    for i, node in enumerate(path):
+      node.count -= 1
+      if not node.count and i > 0:
+        del path[i-1].children[tokens[i-1]]
+        break
+    self._len -= 1
+    return True
+
+  def match(self, patt):
+    """Retrieve all values stored under S-expressions matching a given pattern, along with the bindings of each match.
+
+    Parameters
+    ----------
+    patt : s-expr
+      A pattern, possibly containing variables at any level.
+
+    Returns
+    -------
+    list[tuple[object, dict]]
+      Each matching value and the bindings of variables in the pattern, in the order in which the values were inserted.
+    """
+    tokens, is_var, paths = compile_pattern(patt)
+    n = len(tokens)
+    leaves = []
+    def match_rec(node, i):
+      while i < n:
+        if is_var[i]:
+          for next in node.jumps:
+            match_rec(next, i+1)
+          return
+        node = node.children.get(tokens[i])
+        if node is None:
+          return
+        i += 1
+      leaves.append(node)
+    match_rec(self.root, 0)
+
+    matches = [m for leaf in leaves for m in leaf.values.items()]
+    if len(leaves) > 1:
+      matches.sort(key=lambda m: m[1][0])
+    if not paths:
+      return [(value, {}) for value, _ in matches]
+
+    # Since the structure of each matching expression is known to agree with the pattern, the value of each
+    # variable can be read directly from its path, only checking that repeated variables have equal values
+    results = []
+    for value, (_, expr) in matches:
+      bindings = {}
+      for var, path in paths:
+        val = expr
+        for i in path:
+          val = val[i]
+        if var in bindings and bindings[var] != val:
+          break
+        bindings[var] = val
+      else:
+        results.append((value, bindings))
+    return results
+
+  def __len__(self):
+    return self._len
@@ -8,16 +8,39 @@ import string
 from copy import copy
 
 from eta.constants import *
-import eta.util.file as file
+from eta.util.symtab import SymbolTable
 
 # ``````````````````````````````````````
 # "Symbol" util
 # ``````````````````````````````````````
 
+SYMTAB = SymbolTable()
+"""SymbolTable: The symbol table used by this process for creating new symbols."""
+
+
 def clear_symtab():
 	"""Clear the symbol table used for creating new symbols."""
-	file.ensure_file_exists(SYMTAB_PATH)
-	file.write_json(SYMTAB_PATH, {})
+	SYMTAB.clear()
+
+
+def save_symtab(fname):
+	"""Save a snapshot of the symbol table to a given file, e.g., in order to resume a session later."""
+	SYMTAB.save(fname)
+
+
+def load_symtab(fname):
+	"""Restore the symbol table from a snapshot file, such that new symbols never collide with previously generated ones."""
+	SYMTAB.load(fname)
+
+
+def snapshot_symtab():
+	"""Get a snapshot of the symbol table, as a dict mapping each prefix to the highest suffix reserved."""
+	return SYMTAB.snapshot()
+
+
+def merge_symtab(table):
+	"""Merge a snapshot into the symbol table, such that new symbols never collide with those of the snapshot (or any previously generated ones)."""
+	SYMTAB.merge(table)
 
 
 def gentemp(str):
@@ -35,18 +58,11 @@ def gentemp(str):
 
 	Notes
 	-----
-	This currently relies on an external symbol table stored in a file, which
-	exploits the fact that race conditions with a shared file cannot occur with Python multiprocess
-	(see: https://superfastpython.com/multiprocessing-race-condition-python/#Race_Condition_With_Shared_Data-2)
-	However, this is somewhat clumsy/inefficient and should eventually be replaced by a proper solution.
+	Symbols are allocated in memory from blocks of indices that each process reserves from a shared
+	symbol table, so that symbols are unique across all of Eta's core processes without requiring
+	any file access for most calls (see ``eta.util.symtab``).
 	"""
-	symtab = file.load_json(SYMTAB_PATH)
-	if not str in symtab:
-		symtab[str] = 1
-	else:
-		symtab[str] += 1
-	file.write_json(SYMTAB_PATH, symtab)
-	return f'{str}{symtab[str]}'
+	return SYMTAB.gentemp(str)
 
 
 def episode_name():
@@ -296,8 +312,45 @@ def subst(a, b, lst):
 	return subst_rec(a, b, lst)
 
 
+def compose_renamings(replist):
+	"""Compose a sequence of replacements of symbols with other symbols into a single dict mapping each symbol to its final replacement."""
+	reps = {}
+	inverse = {}
+	for (b, a) in replist:
+		keys = inverse.pop(b, [])
+		if b not in reps:
+			keys.append(b)
+		for k in keys:
+			reps[k] = a
+		inverse[a] = inverse[a] + keys if a in inverse else keys
+	return reps
+
+
 def substall(lst, replist):
-	"""Given a set of replacements, make a substitution in a list for each replacement."""
+	"""Given a set of replacements, make a substitution in a list for each replacement.
+
+	The substitutions are made in sequence, such that later replacements apply to the values substituted
+	by earlier ones. However, if each replacement replaces a string with another string (e.g., renaming
+	variables), the replacements are composed and made in a single pass over the list. Likewise, if each
+	replaced symbol is a distinct string that does not occur within any of the values, the substitutions
+	are independent, and are made in a single pass over the list.
+	"""
+	if len(replist) > 1 and all([isinstance(b, str) for (b, _) in replist]):
+		if all([isinstance(a, str) for (_, a) in replist]):
+			reps = compose_renamings(replist)
+		else:
+			reps = dict(replist)
+			if len(reps) < len(replist) or any([isinstance(x, str) and x in reps for a in reps.values() for x in flatten(a)]):
+				reps = None
+		if reps is not None:
+			def substall_rec(x):
+				if isinstance(x, str):
+					return reps[x] if x in reps else x
+				elif atom(x):
+					return x
+				else:
+					return [substall_rec(y) for y in x]
+			return substall_rec(lst)
 	for (b, a) in replist:
 		lst = subst(a, b, lst)
 	return lst
@@ -427,10 +480,12 @@ def dict_get(dct, k):
 
 
 def dict_rem_val(dct, k, val):
-	"""Safe version of dict remove that removes val from the list stored at key (or pops the key if it stores an atom)."""
+	"""Safe version of dict remove that removes val from the list stored at key (or pops the key if it stores an atom or the list becomes empty)."""
 	if k in dct:
 		if isinstance(dct[k], list):
 			dct[k].remove(val)
+			if not dct[k]:
+				dct.pop(k)
 		else:
 			dct.pop(k)
 
@@ -449,17 +504,19 @@ def dict_rem(dct, k):
 
 
 def squash(vector, range=(0, 1)):
-	"""Squash each number within a vector to be within the given range."""
-	if not vector:
+	"""Squash each number within a vector to be within the given range (returning a NumPy array if given one)."""
+	if len(vector) == 0:
 		return vector
-	if min(vector) == max(vector):
-		return [1. for _ in vector]
-	v = np.array(vector)
-	mn = min(vector)
-	mx = max(vector)
-	a = (range[1]-range[0]) / (mx-mn)
-	b = range[1] - (a * mx)
-	return ((a * v) + b).tolist()
+	v = np.asarray(vector, dtype=float)
+	mn = v.min()
+	mx = v.max()
+	if mn == mx:
+		v = np.ones(len(v))
+	else:
+		a = (range[1]-range[0]) / (mx-mn)
+		b = range[1] - (a * mx)
+		v = (a * v) + b
+	return v if isinstance(vector, np.ndarray) else v.tolist()
 
 
 def normalize(vector):
@@ -471,10 +528,9 @@ def normalize(vector):
 
 def linsum(vectors, coeffs):
 	"""Compute a linear sum of a list of vectors, scaling each vector by the corresponding coefficient."""
-	r = np.array([0. for _ in vectors[0]])
-	vs = [np.array(v) for v in vectors]
-	for idx, v in enumerate(vs):
-		r += coeffs[idx] * v
+	r = np.zeros(len(vectors[0]))
+	for idx, v in enumerate(vectors):
+		r += coeffs[idx] * np.asarray(v)
 	return r
 
 
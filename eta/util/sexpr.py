@@ -7,24 +7,10 @@ Some of this code is borrowed from the following repository:
 https://github.com/bitbanger/schemas/blob/master/pyschemas/sexpr.py
 """
 
-from eta.util.general import flatten, replaceall, symbolp, atom, escaped_symbol_p, isquote, standardize
-import eta.util.file as file
-
-def balanced_substr(s):
-	"""Find a substring with a balanced number of parentheses."""
-	count = 1
-	for i in range(1, len(s)):
-		c = s[i]
-
-		if c == '(':
-			count += 1
-		if c == ')':
-			count -= 1
-		if count == 0:
-			return s[:i+1]
-
-	return None
+import re
 
+from eta.util.general import flatten, replaceall, symbolp, escaped_symbol_p, isquote, standardize
+import eta.util.file as file
 
 def clean_s_expr(s_expr):
 	"""Clean a string representation of an S-expression by removing newlines and standardizing whitespace."""
@@ -43,83 +29,110 @@ def clean_s_expr(s_expr):
 	return s_expr
 
 
+def standardize_symbol(s):
+	"""Standardize a symbol by mapping to lowercase, unless enclosed in escape symbols (or a quoted string)."""
+	if escaped_symbol_p(s):
+		parts = s.split('|')
+		before = parts[0].lower()
+		escaped = parts[1]
+		after = parts[2].lower()
+		if '.' in escaped:
+			word, suffix = escaped.split('.')
+			if suffix and suffix[0] != '_':
+				escaped = word
+				suffix = suffix.strip('_')
+				after = '.'+suffix.lower()+after
+		escaped = escaped.strip('_').replace('_', ' ')
+		return before+escaped+after
+	elif isquote(s):
+		return s
+	else:
+		return s.lower()
+
+
 def standardize_symbols(s_expr):
 	"""Standardize the symbols within an S-expression by mapping to lowercase, unless enclosed in escape symbols."""
 	def standardize_rec(e):
-		if symbolp(e) and not escaped_symbol_p(e) and not isquote(e):
-			return e.lower()
-		elif symbolp(e) and escaped_symbol_p(e):
-			parts = e.split('|')
-			before = parts[0].lower()
-			escaped = parts[1]
-			after = parts[2].lower()
-			if '.' in escaped:
-				word, suffix = escaped.split('.')
-				if suffix and suffix[0] != '_':
-					escaped = word
-					suffix = suffix.strip('_')
-					after = '.'+suffix.lower()+after
-			escaped = escaped.strip('_').replace('_', ' ')
-			return before+escaped+after
-		elif symbolp(e) and isquote(e):
-			return e
+		if symbolp(e):
+			return standardize_symbol(e)
 		else:
 			return [standardize_rec(x) for x in e]
 	return standardize_rec(s_expr)
 
 
-def convert_quotes(s_expr):
-	"""Convert any quoted word lists (i.e., single ' symbol followed by a list of symbols) to a single quoted string."""
-	def convert_quotes_rec(e):
-		if atom(e):
-			return e
-		elif len(e) == 1:
-			return [convert_quotes_rec(e[0])]
+def _compress_quotes(items):
+	"""Compress quoted strings within a list of items that were split between multiple words during tokenization.
+
+	Notes
+	-----
+	Any quoted string that is interrupted by a sub-list is left uncompressed, and any quoted string that is
+	not closed before the end of the list is dropped.
+	"""
+	items1 = []
+	acc = []
+	i = 0
+	while i < len(items):
+		if isinstance(items[i], str) and items[i][0] == '"':
+			j = i
+			while j < len(items):
+				acc.append(items[j])
+				if not isinstance(items[j], str):
+					items1 += acc
+					acc = []
+					j += 1
+					break
+				elif items[j][-1] == '"':
+					items1.append(' '.join(acc))
+					acc = []
+					j += 1
+					break
+				else:
+					j += 1
+			i = j
 		else:
-			e1 = []
-			for x1, x2 in zip([None]+e[:-1], e):
-				if x1 == "'" and x2 and isinstance(x2, list) and all([isinstance(x, str) for x in x2]):
-					e1.append('"'+standardize(' '.join(x2))+'"')
-				elif x2 != "'":
-					e1.append(x2)
-			return [convert_quotes_rec(x) for x in e1]
-	return convert_quotes_rec(s_expr)
-
-
-def compress_quotes(s_expr):
-	"""Compress quoted expressions that were split between multiple words during parsing."""
-	def compress_quotes_rec(e):
-		if atom(e):
-			return e
-		elif len(e) == 1:
-			return [compress_quotes_rec(e[0])]
+			items1.append(items[i])
+			i += 1
+	return items1
+
+
+def _close_list(items):
+	"""Process the items of a list once all of its items have been tokenized.
+
+	Parameters
+	----------
+	items : list[str or tuple]
+		The items of the list, where each item is either an unprocessed symbol token, or
+		a ``(pre, post)`` tuple for a sub-list that has already been closed.
+
+	Returns
+	-------
+	tuple
+		A ``(pre, post)`` tuple, where ``pre`` is the list after compressing quoted strings and standardizing
+		symbols, and ``post`` is the final list after also converting any quoted word lists (i.e., ``'`` followed
+		by a list of symbols) to quoted strings. If no quoted word lists occur within the list, the two are identical.
+	"""
+	if len(items) > 1 and any([isinstance(x, str) and x[0] == '"' for x in items]):
+		items = _compress_quotes(items)
+	pre = [x[0] if isinstance(x, tuple) else standardize_symbol(x) for x in items]
+	post = []
+	same = True
+	prev = None
+	for x, y in zip(items, pre):
+		if len(items) > 1 and prev == "'" and isinstance(x, tuple) and y and all([isinstance(z, str) for z in y]):
+			post.append('"'+standardize(' '.join(y))+'"')
+			same = False
+		elif len(items) > 1 and y == "'":
+			same = False
+		elif isinstance(x, tuple):
+			post.append(x[1])
+			same = same and x[1] is x[0]
 		else:
-			e1 = []
-			acc = []
-			i = 0
-			while i < len(e):
-				if isinstance(e[i], str) and e[i][0] == '"':
-					j = i
-					while j < len(e):
-						acc.append(e[j])
-						if not isinstance(e[j], str):
-							e1 += acc
-							acc = []
-							j += 1
-							break
-						elif e[j][-1] == '"':
-							e1.append(' '.join(acc))
-							acc = []
-							j += 1
-							break
-						else:
-							j += 1
-					i = j
-				else:
-					e1.append(e[i])
-					i += 1
-			return [compress_quotes_rec(x) for x in e1]
-	return compress_quotes_rec(s_expr)
+			post.append(y)
+		prev = y
+	return (pre, pre) if same else (pre, post)
+
+
+_TOKEN_PATTERN = re.compile(r'[()]| +|[^() ]+')
 
 
 def parse_s_expr(s_expr):
@@ -135,47 +148,55 @@ def parse_s_expr(s_expr):
 	s-expr
 		A structured S-expression, i.e., a recursively nested list structure with string "symbols" as atoms.
 		e.g., ``['a', ['b', 'c', ['d', 'e']], "f g h"]``
+
+	Notes
+	-----
+	The string is tokenized in a single pass, with a stack of the lists that are currently open; each list is
+	processed (i.e., quoted strings are compressed, symbols are standardized, and quoted word lists are converted)
+	once it is closed, so parsing is linear in the length of the string.
+
+	Any closing parentheses at the outermost level, aside from the final one, are ignored.
 	"""
-	def parse_s_expr_rec(s_expr):
-		s_expr = clean_s_expr(s_expr)
-
-		if len(s_expr) == 0:
-			return None
-
-		if s_expr[0] != '(' or s_expr[-1] != ')':
-			return s_expr
-
-		items = []
-
-		item_buf = []
-		i = 1
-		while i < len(s_expr):
-			c = s_expr[i]
-
-			if c == ' ':
-				if len(item_buf) > 0:
-					items.append(''.join(item_buf))
-					item_buf = []
-				i += 1
-			elif c != '(':
-				if c != ')':
-					item_buf.append(c)
-				i += 1
-			else:
-				if len(item_buf) > 0:
-					items.append(''.join(item_buf))
-					item_buf = []
-				inner = balanced_substr(s_expr[i:])
-				items.append(parse_s_expr_rec(inner))
-				i += len(inner)
-
-		if len(item_buf) > 0:
-			items.append(''.join(item_buf))
-			item_buf = []
-
-		return items
-
-	return convert_quotes(standardize_symbols(compress_quotes(parse_s_expr_rec(s_expr))))
+	s_expr = clean_s_expr(s_expr)
+
+	if len(s_expr) == 0:
+		return None
+
+	if s_expr[0] != '(' or s_expr[-1] != ')':
+		return standardize_symbol(s_expr)
+
+	stack = []
+	items = []
+	buf = ''
+	for token in _TOKEN_PATTERN.findall(s_expr, 1):
+		if token == '(':
+			if buf:
+				items.append(buf)
+				buf = ''
+			stack.append(items)
+			items = []
+		elif token == ')':
+			if stack:
+				if buf:
+					items.append(buf)
+					buf = ''
+				lst = _close_list(items)
+				items = stack.pop()
+				items.append(lst)
+		elif token[0] == ' ':
+			if buf:
+				items.append(buf)
+				buf = ''
+		else:
+			buf += token
+
+	if buf:
+		items.append(buf)
+
+	if stack:
+		raise Exception(f'Unbalanced parentheses in S-expression: {s_expr}')
+
+	return _close_list(items)[1]
 
 
 def list_to_s_expr(lst):
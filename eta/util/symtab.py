@@ -0,0 +1,142 @@
+"""An in-memory symbol table for generating unique symbols across Eta's core processes.
+
+A symbol is generated by appending an integer suffix to a prefix string, e.g., ``e123`` or ``?x4``. Since
+Eta's core processes each generate symbols concurrently, suffixes must be unique across all processes.
+
+Rather than reading and rewriting a shared file for every new symbol, each process reserves a block of
+suffixes for a given prefix from a shared reservation table (stored on disk and guarded by a file lock),
+and then allocates symbols from that block entirely in memory. The reservation table only records the
+highest suffix reserved for each prefix, so it also serves as a snapshot from which a session can be
+resumed without generating any duplicate symbols.
+
+Note that suffixes are unique, but not necessarily contiguous across processes (e.g., one process may generate
+``e1``, ``e2``, ... while another generates ``e101``, ``e102``, ...).
+"""
+
+import os
+import threading
+from contextlib import contextmanager
+
+from eta.constants import *
+import eta.util.file as file
+
+try:
+  import fcntl
+except ImportError:
+  fcntl = None
+
+
+class SymbolTable:
+  """A table of symbol prefixes, allocating unique integer suffixes from blocks reserved in a shared reservation table.
+
+  Parameters
+  ----------
+  path : str, default=SYMTAB_PATH
+    The path of the shared reservation table.
+  block_size : int, default=SYMTAB_BLOCK_SIZE
+    The number of suffixes to reserve for a prefix at a time.
+
+  Attributes
+  ----------
+  path : str
+  block_size : int
+  blocks : dict[str, list[int]]
+    A dict mapping each prefix to a ``[next, end]`` pair, where ``next`` is the last suffix allocated
+    for that prefix in this process, and ``end`` is the last suffix reserved by this process.
+  pid : int
+    The ID of the process that reserved the current blocks. If the table is used from a different
+    process (e.g., after a fork), the inherited blocks are discarded.
+
+  Notes
+  -----
+  If file locking is not supported on the current platform (i.e., ``fcntl`` is unavailable), reservations are
+  only guarded against concurrent access by threads within the same process.
+  """
+
+  def __init__(self, path=SYMTAB_PATH, block_size=SYMTAB_BLOCK_SIZE):
+    self.path = path
+    self.block_size = block_size
+    self.blocks = {}
+    self.pid = os.getpid()
+    self._lock = threading.Lock()
+
+  def gentemp(self, prefix):
+    """Generate a unique symbol by appending a new integer suffix to the given prefix."""
+    with self._lock:
+      self._check_pid()
+      if prefix not in self.blocks or self.blocks[prefix][0] >= self.blocks[prefix][1]:
+        self.blocks[prefix] = self._reserve(prefix)
+      self.blocks[prefix][0] += 1
+      return f'{prefix}{self.blocks[prefix][0]}'
+
+  def clear(self):
+    """Clear the reservation table, as well as any blocks reserved by this process."""
+    with self._lock:
+      with self._file_lock():
+        file.write_json(self.path, {})
+      self.blocks = {}
+      self.pid = os.getpid()
+
+  def save(self, fname):
+    """Save a snapshot of the reservation table to a given file."""
+    with self._lock:
+      with self._file_lock():
+        table = file.load_json(self.path)
+      file.ensure_dir_exists(os.path.dirname(fname))
+      file.write_json(fname, table)
+
+  def snapshot(self):
+    """Get a snapshot of the reservation table, as a dict mapping each prefix to the highest suffix reserved."""
+    with self._lock:
+      with self._file_lock():
+        return file.load_json(self.path)
+
+  def merge(self, table):
+    """Merge a snapshot into the reservation table, such that new symbols never collide with those of the snapshot.
+
+    Unlike `load`, the highest suffix reserved for each prefix is kept, so symbols reserved since the table was last
+    cleared remain unique as well. Any blocks of this process that overlap the snapshot are discarded.
+    """
+    with self._lock:
+      with self._file_lock():
+        current = file.load_json(self.path)
+        for prefix, end in table.items():
+          current[prefix] = max(current[prefix], end) if prefix in current else end
+        file.write_json(self.path, current)
+      for prefix, end in table.items():
+        if prefix in self.blocks and self.blocks[prefix][0] < end:
+          del self.blocks[prefix]
+
+  def load(self, fname):
+    """Restore the reservation table from a snapshot file, such that new symbols never collide with those of the snapshot."""
+    table = file.load_json(fname)
+    with self._lock:
+      with self._file_lock():
+        file.write_json(self.path, table)
+      self.blocks = {}
+      self.pid = os.getpid()
+
+  def _check_pid(self):
+    if self.pid != os.getpid():
+      self.blocks = {}
+      self.pid = os.getpid()
+
+  def _reserve(self, prefix):
+    with self._file_lock():
+      table = file.load_json(self.path)
+      start = table[prefix] if prefix in table else 0
+      table[prefix] = start + self.block_size
+      file.write_json(self.path, table)
+    return [start, start + self.block_size]
+
+  @contextmanager
+  def _file_lock(self):
+    file.ensure_dir_exists(os.path.dirname(self.path))
+    with open(self.path + '.lock', 'a+') as f:
+      if fcntl is not None:
+        fcntl.flock(f, fcntl.LOCK_EX)
+      try:
+        yield
+      finally:
+        if fcntl is not None:
+          fcntl.flock(f, fcntl.LOCK_UN)
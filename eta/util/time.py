@@ -1,7 +1,7 @@
 """Utilities for recording and modifying times."""
 
 import copy
-from datetime import date,datetime,timezone
+from datetime import date,datetime,timezone,timedelta
 
 DATETIME_ARGS = ['year', 'month', 'day', 'hour', 'minute', 'second']
 DATETIME_VARS = ['?y', '?mo', '?d', '?h', '?mi', '?s']
@@ -21,6 +21,7 @@ DATETIME_UPPER = {
   'minute' : 59,
   'second' : 59
 }
+NAIVE_EPOCH = datetime(1970, 1, 1)
 
 
 class TimePoint:
@@ -43,35 +44,51 @@ class TimePoint:
     A timestamp for the lower bound on this timepoint.
   upper : datetime
     A timestamp for the upper bound on this timepoint.
+
+  Notes
+  -----
+  Since many time points are created (e.g., several for every memory), the bounds are stored compactly as float
+  timestamps, and only converted to datetime objects when accessed. Timezone-aware datetimes are stored as POSIX
+  timestamps (and are converted back to UTC datetimes), while naive datetimes are stored relative to a naive epoch.
   """
 
+  __slots__ = ('_lower', '_upper', '_naive')
+
   def __init__(self, time=None):
     self.update(time)
 
   def update(self, time=None):
     """Update this TimePoint to the given time (or current if none is given)."""
     if isinstance(time, datetime):
-      self.lower = time
-      self.upper = time
+      lower = upper = time
     elif time_pair_p(time):
-      self.lower, self.upper = time
+      lower, upper = time
     elif time_tuple_p(time):
-      self.lower, self.upper = time_pair_from_tuple(time)
+      lower, upper = time_pair_from_tuple(time)
     elif time_record_p(time):
-      self.lower, self.upper = time_pair_from_record(time)
+      lower, upper = time_pair_from_record(time)
     elif time is None:
-      now = datetime.now(timezone.utc)
-      self.lower = now
-      self.upper = now
+      self._lower = self._upper = now()
+      self._naive = False
+      return
     else:
       raise Exception("Invalid format given for 'time'.")
+    self._naive = lower.tzinfo is None
+    self._lower = datetime_to_float(lower)
+    self._upper = datetime_to_float(upper)
+
+  @property
+  def lower(self):
+    return datetime_from_float(self._lower, self._naive)
+
+  @property
+  def upper(self):
+    return datetime_from_float(self._upper, self._naive)
   
   def to_num(self, bound='upper'):
     """Convert this TimePoint to a numerical POSIX representation (using the upper bound by default)."""
-    if bound == 'upper':
-      return self.upper.timestamp()
-    else:
-      return self.lower.timestamp()
+    t = self._upper if bound == 'upper' else self._lower
+    return t if not self._naive else datetime_from_float(t, True).timestamp()
     
   def get_duration(self):
     return self.to_num(bound='upper') - self.to_num(bound='lower')
@@ -98,6 +115,20 @@ class TimePoint:
     return self.format().replace('/', ' ')
   
 
+def datetime_to_float(time):
+  """Convert a datetime to a float timestamp (a POSIX timestamp if timezone-aware, or relative to a naive epoch if naive)."""
+  if time.tzinfo is not None:
+    return time.timestamp()
+  return (time - NAIVE_EPOCH).total_seconds()
+
+
+def datetime_from_float(t, naive=False):
+  """Convert a float timestamp to a datetime (the inverse of `datetime_to_float`), as a UTC datetime unless `naive` is given."""
+  if naive:
+    return NAIVE_EPOCH + timedelta(seconds=t)
+  return datetime.fromtimestamp(t, timezone.utc)
+
+
 def get_elapsed(tp1, tp2):
   """Get lower and upper bounds on the elapsed time between two timepoints."""
   vals = [abs(tp2.lower-tp1.upper), abs(tp2.lower-tp1.lower), abs(tp2.upper-tp1.upper), abs(tp2.upper-tp1.lower)]
@@ -160,4 +191,11 @@ def record_from_time_pair(lower, upper):
 
 def now():
   """Return a POSIX timestamp corresponding to the time of the function call."""
-  return datetime.now(timezone.utc).timestamp()
\ No newline at end of file
+  return datetime.now(timezone.utc).timestamp()
+
+def from_num(num):
+  """Create a TimePoint from a POSIX timestamp (i.e., the inverse of `TimePoint.to_num`)."""
+  tp = TimePoint.__new__(TimePoint)
+  tp._lower = tp._upper = num
+  tp._naive = False
+  return tp
@@ -4,9 +4,12 @@ Contains functions for choosing a result using choice trees; primarily a reimple
 original 'choose-result-for' LISP function defined here: https://github.com/bkane2/eta/blob/master/core/eta.lisp
 """
 
+from copy import deepcopy
 from transduction import tt
 
-from eta.util.general import listp, atom, cons, subst, random_element
+from eta.util.general import listp, atom, cons, subst, random_element, to_key
+from eta.util.tt.parse import (ChoiceTree, OP_MATCH, OP_OR, OP_SUBTREE_MATCH, OP_SUBTREE, OP_SUBTREE_CLAUSE,
+                               OP_SUBTREE_PERMUTE, OP_SUBTREES, OP_SUBTREES_PERMUTE, OP_ULF_RECUR, OP_EXTERNAL)
 from eta.util.tt.preds import (comma, zero, modal, non_neg, non_neg_mod, affirm_adv,
                                lex_ulf, quote_to_list, split_sentences, prefix_each)
 
@@ -33,7 +36,7 @@ def is_tree_root_list(x):
   return x and listp(x) and all([is_tree_root(y) for y in x])
 
 
-def choose_result_for(clause, root, trees, feats, preds):
+def choose_result_for(clause, root, trees, feats, preds, latency=True, memo=None):
   """Choose a result for a given clause, starting from a given choice tree root.
 
   A choice tree consists of a tree of pattern nodes, with the leaves containing templates and associated
@@ -131,11 +134,17 @@ def choose_result_for(clause, root, trees, feats, preds):
   root : str
     The name of a choice tree (e.g., ``gist``) corresponding to the root node of that tree in `trees`.
   trees : dict
-    A dict containing all choice trees, keyed on their root names.
+    A dict containing all choice trees, keyed on their root names. If the trees are compiled (see
+    ``eta.util.tt.parse.ChoiceTree``), the result is chosen iteratively using ``choose_result_compiled``.
   feats : dict
     A dict mapping words to feature lists.
   preds : dict
     A dict mapping predicate names to functions.
+  latency : bool, default=True
+    Whether to use the latencies of template nodes. If False, no template nodes are skipped, and
+    the latency countdowns are left unchanged.
+  memo : dict, optional
+    A dict of memoized subtree searches to use (and update), for compiled trees only (see ``choose_result_compiled``).
 
   Returns
   -------
@@ -146,8 +155,11 @@ def choose_result_for(clause, root, trees, feats, preds):
       - ``[:<directive>, <result>]`` if a single result is found.
       - ``[:and, <result1>, ..., <resultk>]`` if multiple results are found.
   """
+  if isinstance(trees.get(root.strip('*')), ChoiceTree):
+    return choose_result_compiled(clause, root, trees, feats, preds, latency=latency, memo=memo)
+
   def choose_result_for_rec(clause, parts, rule_node, visited):
-    nonlocal trees, feats, preds
+    nonlocal trees, feats, preds, latency
 
     if not rule_node:
       return []
@@ -156,10 +168,10 @@ def choose_result_for(clause, root, trees, feats, preds):
     directive = rule_node['directive']
     pattern = rule_node['pattern']
     count = rule_node['count']
-    latency = rule_node['latency']
+    node_latency = rule_node['latency']
 
     # Skip rule if it has a non-zero latency and the countdown for that rule hasn't yet reached zero
-    if directive and min(count, latency) > 0:
+    if directive and latency and min(count, node_latency) > 0:
       rule_node['count'] -= 1
       return choose_result_for_rec(clause, parts, rule_node['next'], visited)
     
@@ -197,7 +209,8 @@ def choose_result_for(clause, root, trees, feats, preds):
       
     # The following is a big conditional statement for dealing with all possible directives.
     # First, we reset the countdown for the node using the node's latency.
-    rule_node['count'] = latency
+    if latency:
+      rule_node['count'] = node_latency
       
     # :subtree directive
     # ````````````````````````````
@@ -316,7 +329,7 @@ def choose_result_for(clause, root, trees, feats, preds):
       ulfs = []
       for phrase in newclause:
         if is_tree_root_clause(phrase):
-          result = choose_result_for(phrase[1:], phrase[0], trees, feats, preds)
+          result = choose_result_for(phrase[1:], phrase[0], trees, feats, preds, latency=latency)
           if result:
             ulf = result[1]
           else:
@@ -354,4 +367,342 @@ def choose_result_for(clause, root, trees, feats, preds):
   root = root.strip('*')
   if not root in trees:
     return []
-  return choose_result_for_rec(clause, [], trees[root], set())
\ No newline at end of file
+  return choose_result_for_rec(clause, [], trees[root], set())
+
+
+# Kinds of frames on the stack of ``choose_result_compiled``, each awaiting the result of a search
+_CHILD = 0
+_SUBTREE_MATCH = 1
+_SELECT = 2
+_COLLECT = 3
+_ULF = 4
+_MEMO = 5
+
+# Signals that the top frame should be resumed without the result of a search (i.e., to start its first search)
+_RESUME = object()
+
+
+def combine_and(ret, choice):
+  """Add a choice to a conjunctive ``[:and, ...]`` result, flattening the choice if it is itself conjunctive."""
+  if choice and listp(choice) and choice[0] == ':and':
+    ret.extend(choice[1:])
+  else:
+    ret.append(choice)
+
+
+def choose_result_compiled(clause, root, trees, feats, preds, latency=True, memo=None):
+  """Choose a result for a given clause, starting from a given compiled choice tree root.
+
+  This is equivalent to ``choose_result_for`` (including the updates to latency countdowns and the handling of
+  visited subtrees), but walks the flat arrays of each ``ChoiceTree`` in a loop, using an explicit stack
+  of pending frames rather than recursion. Thus, the depth of a search is not bounded by the recursion limit.
+  Pattern nodes that cannot match the words of a clause are skipped without attempting a match
+  (see ``ChoiceTree.skip``).
+
+  The result of each search of a subtree entered from a ``[:subtree, ...]`` pattern, a ``:subtrees`` or
+  ``:subtrees-permute`` directive (including the tree used to select the subtrees), a ``:subtree-permute``
+  directive, or a ``:ulf-recur`` phrase is memoized for the duration of the call, keyed on the subtree, clause,
+  and match parts (as well as the visited subtrees, if the search checked whether any subtree was visited). Thus,
+  repeated searches (e.g., of a subtree shared by the branches of a permutation) are only computed once. However,
+  a result is only memoized if the search neither reached a template node with a non-zero latency nor randomly
+  chose a result, since repeating such a search would update the latency countdowns (or random state), and may
+  yield a different result. Hence, the memoized results do not depend on any state, and a memo may be shared
+  across calls (with the same trees and the same value of `latency`).
+
+  Parameters
+  ----------
+  clause : s-expr
+    An S-expression to be matched by the patterns in a choice tree and therefore used to choose a result.
+  root : str
+    The name of a choice tree (e.g., ``gist``) corresponding to the root of that tree in `trees`.
+  trees : dict[str, ChoiceTree]
+    A dict containing all compiled choice trees, keyed on their root names.
+  feats : dict
+    A dict mapping words to feature lists.
+  preds : dict
+    A dict mapping predicate names to functions.
+  latency : bool, default=True
+    Whether to use the latencies of template nodes. If False, no template nodes are skipped, and
+    the latency countdowns are left unchanged.
+  memo : dict, optional
+    A dict of memoized subtree searches to use (and update). If not given, a new memo is used for this call.
+
+  Returns
+  -------
+  s-expr
+    See ``choose_result_for``.
+  """
+  root = root.strip('*')
+  if not root in trees:
+    return []
+
+  # The current search position, and a stack of frames to resume once the current search yields a result
+  tree = trees[root]
+  i = tree.root
+  parts = []
+  visited = set()
+  stack = []
+  result = None
+
+  # The subtree to enter next (if any), the memoized results of searches, the number of events (reaching a
+  # template node with non-zero latency, or making a random choice) that prevent a search from being memoized,
+  # and the number of checks of the visited subtrees (which require the visited subtrees to be part of the key)
+  enter = None
+  memo = {} if memo is None else memo
+  volatile = 0
+  checked = 0
+
+  while True:
+    # A result was found for the current search; pop the top frame and resume it
+    # ````````````````````````````````````````````````````````````````````````````
+    if result is not None:
+      if not stack:
+        return result
+      frame = stack.pop()
+      kind = frame[0]
+
+      # Completed search of a subtree: memoize the result if no volatile events occurred during the search
+      if kind == _MEMO:
+        _, key, entered, volatile_mark, checked_mark = frame
+        if volatile_mark == volatile:
+          memo[key if checked_mark == checked else key + (frozenset(entered),)] = result
+
+      # Child of a matching pattern node: use the result if found, otherwise try the next sibling
+      elif kind == _CHILD:
+        if result:
+          continue
+        _, clause, parts, tree, i, visited = frame
+        i = tree.next[i]
+        result = None
+
+      # Subtree of a :subtree pattern node: if found, the node matches and its children are searched
+      elif kind == _SUBTREE_MATCH:
+        _, clause, parts, tree, i, visited = frame
+        if result:
+          stack.append((_CHILD, clause, parts, tree, i, visited))
+          parts = [':seq']
+          i = tree.child[i]
+        else:
+          i = tree.next[i]
+        result = None
+
+      # Tree used to select the subtrees of a :subtrees or :subtrees-permute directive
+      elif kind == _SELECT:
+        _, newclause, visited, permute = frame
+        if not result:
+          continue
+        _, subtrees = result
+        result = None
+        if not is_tree_root_list(subtrees):
+          result = []
+          continue
+        subtrees = [x.strip('*') for x in subtrees]
+        if permute:
+          searches = [(x, y) for x in newclause for y in subtrees]
+        else:
+          searches = [(newclause, x) for x in subtrees]
+        stack.append((_COLLECT, iter(searches), visited, [':and']))
+        result = _RESUME
+
+      # One of several searches whose results are combined into an [:and, ...] result
+      elif kind == _COLLECT:
+        _, searches, visited0, ret = frame
+        if result is not _RESUME:
+          combine_and(ret, result)
+        search = next(searches, None)
+        if search is None:
+          result = ret
+          continue
+        stack.append(frame)
+        clause, enter = search
+        parts = []
+        visited = cons(enter, visited0)
+        result = None
+
+      # One of the phrases of a :ulf-recur directive
+      elif kind == _ULF:
+        _, phrases, ulfs, reassembly = frame
+        if result is not _RESUME:
+          ulf = result[1] if result else []
+          # Failure case
+          if not ulf:
+            result = []
+            continue
+          ulfs.append(ulf)
+        result = None
+        for phrase in phrases:
+          if is_tree_root_clause(phrase):
+            subtree = phrase[0].strip('*')
+            if not subtree in trees:
+              result = []
+              break
+            stack.append(frame)
+            clause = phrase[1:]
+            enter = subtree
+            parts = []
+            visited = set()
+            break
+          # Failure case
+          if not phrase:
+            result = []
+            break
+          ulfs.append(phrase)
+        else:
+          # Assemble the list of phrasal ULFs into a ULF for the entire input, using the reassembly rule
+          result = []
+          if ulfs:
+            result = reassembly
+            for j, ulf in enumerate(ulfs):
+              result = subst(ulf, str(j+1), result)
+          result = (':ulf', result)
+      continue
+
+    # Enter a subtree, reusing the result of an identical search if memoized
+    # ````````````````````````````````````````````````````````````````````````
+    if enter is not None:
+      key = (enter, to_key(clause), to_key(parts))
+      if key in memo:
+        result = deepcopy(memo[key])
+      elif key + (frozenset(visited),) in memo:
+        result = deepcopy(memo[key + (frozenset(visited),)])
+        checked += 1
+      else:
+        stack.append((_MEMO, key, visited, volatile, checked))
+        tree = trees[enter]
+        i = tree.root
+      enter = None
+      continue
+
+    # Otherwise, search from the current node
+    # `````````````````````````````````````````
+    if i < 0:
+      result = []
+      continue
+
+    op = tree.op[i]
+    pattern = tree.pattern[i]
+
+    # Pattern nodes
+    if op <= OP_SUBTREE_MATCH:
+      # Skip any pattern nodes in the chain that cannot match the clause
+      if tree.keys[i] is not None and clause and listp(clause):
+        j = tree.skip(i, clause, feats)
+        if j != i:
+          i = j
+          continue
+      newparts = []
+      if op == OP_MATCH:
+        newparts = tt.match(pattern, clause, feats, preds)
+      elif op == OP_OR:
+        for pattern_option in pattern[1:]:
+          newparts_option = tt.match(pattern_option, clause, feats, preds)
+          if not newparts and newparts_option:
+            newparts = newparts_option
+      elif atom(pattern[1]):
+        checked += 1
+        if not pattern[1] in visited:
+          enter = pattern[1].strip('*')
+          stack.append((_SUBTREE_MATCH, clause, parts, tree, i, visited))
+          visited = cons(enter, visited)
+          continue
+      if newparts:
+        stack.append((_CHILD, clause, parts, tree, i, visited))
+        parts = newparts
+        i = tree.child[i]
+      else:
+        i = tree.next[i]
+      continue
+
+    # Template nodes: skip the node if its latency countdown hasn't yet reached zero, otherwise reset the countdown
+    if latency and tree.latency[i]:
+      volatile += 1
+      if tree.count[i] > 0:
+        tree.count[i] -= 1
+        i = tree.next[i]
+        continue
+      tree.count[i] = tree.latency[i]
+
+    if op == OP_SUBTREE:
+      if not atom(pattern):
+        result = []
+        continue
+      checked += 1
+      if pattern in visited:
+        i = tree.next[i]
+      else:
+        subtree = pattern.strip('*')
+        if not subtree in trees:
+          result = []
+          continue
+        tree = trees[subtree]
+        i = tree.root
+        visited = cons(subtree, visited)
+
+    elif op == OP_SUBTREE_CLAUSE:
+      if not listp(pattern) or not len(pattern) == 2:
+        result = []
+        continue
+      newclause = tt.fill_template(pattern[1], parts, preds)
+      subtree = pattern[0].strip('*')
+      if not subtree in trees:
+        result = []
+        continue
+      clause = newclause
+      parts = []
+      tree = trees[subtree]
+      i = tree.root
+      visited = cons(subtree, visited)
+
+    elif op == OP_SUBTREE_PERMUTE:
+      if not listp(pattern) or not len(pattern) == 2 or not listp(pattern[1]):
+        result = []
+        continue
+      newclause = tt.fill_template(pattern[1], parts, preds)
+      subtree = pattern[0].strip('*')
+      if not subtree in trees:
+        result = []
+        continue
+      stack.append((_COLLECT, iter([(x, subtree) for x in newclause]), visited, [':and']))
+      result = _RESUME
+
+    elif op == OP_SUBTREES or op == OP_SUBTREES_PERMUTE:
+      permute = op == OP_SUBTREES_PERMUTE
+      if not listp(pattern) or not len(pattern) == 2 or not listp(pattern[0]) or (permute and not listp(pattern[1])):
+        result = []
+        continue
+      newpattern = tt.fill_template(pattern, parts, preds)
+      newclause = newpattern[1]
+      # [*subtree*, <clause>]
+      if not is_tree_root_list(newpattern[0]):
+        enter = newpattern[0][0].strip('*')
+        stack.append((_SELECT, newclause, visited, permute))
+        clause = newpattern[0][1]
+        parts = []
+        visited = cons(enter, visited)
+      # [*tree1*, *tree2*, ..., *treek*]
+      else:
+        stack.append((_SELECT, newclause, visited, permute))
+        result = (None, newpattern[0])
+
+    elif op == OP_ULF_RECUR:
+      if not listp(pattern) or not len(pattern) == 2:
+        result = []
+        continue
+      stack.append((_ULF, iter(tt.fill_template(pattern[0], parts, preds)), [], pattern[1]))
+      result = _RESUME
+
+    elif op == OP_EXTERNAL:
+      directive = tree.directive[i]
+      result = tt.fill_template(pattern, parts, preds)
+      # If result is disjunctive, randomly choose one element
+      if listp(result) and result[0] == ':or':
+        result = random_element(result[1:])
+        volatile += 1
+      # If result is conjunctive, return conjunction with :and prefix
+      if listp(result) and result[0] == ':and':
+        result = cons(':and', [(directive, r) for r in result[1:]])
+      else:
+        result = (directive, result)
+
+    else:
+      raise Exception(f'Unsupported directive {tree.directive[i]} encountered for rule with pattern {pattern} for clause {clause}')
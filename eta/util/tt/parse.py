@@ -1,11 +1,15 @@
 """Methods for parsing choice trees and word features from LISP definitions."""
 
+import os
+import sys
 import glob
 import importlib
-from transduction.tt import isa
+from transduction.tt import isa, dot_atom, match_var
 
-from eta.util.general import remove_duplicates
+from eta.util.general import listp, remove_duplicates
 from eta.util.sexpr import read_lisp
+from eta.util.cache import load_cached
+import eta.util.sexpr
 
 
 def init_node(pattern):
@@ -20,7 +24,294 @@ def init_node(pattern):
   }
 
 
-def readrules(packet):
+# Operations of compiled choice tree nodes. Pattern nodes are split by the form of their pattern, and
+# template nodes by their directive (any other directive beginning with ':' is an external directive).
+OP_MATCH = 0
+OP_OR = 1
+OP_SUBTREE_MATCH = 2
+OP_SUBTREE = 3
+OP_SUBTREE_CLAUSE = 4
+OP_SUBTREE_PERMUTE = 5
+OP_SUBTREES = 6
+OP_SUBTREES_PERMUTE = 7
+OP_ULF_RECUR = 8
+OP_EXTERNAL = 9
+OP_INVALID = 10
+
+DIRECTIVE_OPS = {
+  ':subtree' : OP_SUBTREE,
+  ':subtree+clause' : OP_SUBTREE_CLAUSE,
+  ':subtree-permute' : OP_SUBTREE_PERMUTE,
+  ':subtrees' : OP_SUBTREES,
+  ':subtrees-permute' : OP_SUBTREES_PERMUTE,
+  ':ulf-recur' : OP_ULF_RECUR
+}
+
+
+class ChoiceTree:
+  """A choice tree compiled into flat arrays, with one entry per node (in preorder).
+
+  Nodes are referred to by their indices, with -1 denoting the absence of a node.
+
+  Each chain of siblings is also indexed by the first non-variable element of the pattern of each of its pattern
+  nodes, where possible, so that pattern nodes that cannot match a clause (a list of words) may be skipped without
+  attempting a match. Such an element must match some word of the clause (i.e., be either that word, or a feature
+  of that word), and if it is the first element of the pattern, it must match the first word of the clause.
+  Template nodes and pattern nodes that cannot be indexed are never skipped, so the order in which nodes are
+  tried, as well as the latency countdowns of template nodes, are unchanged.
+
+  Attributes
+  ----------
+  root : int
+    The index of the root node (0, or -1 if the tree is empty).
+  pattern : list[s-expr]
+    The pattern or template of each node.
+  directive : list[str or None]
+    The (interned) directive of each node, or None for pattern nodes.
+  op : list[int]
+    The operation of each node (one of the ``OP_*`` constants), determined by its pattern and directive.
+  latency : list[int]
+    The latency of each node.
+  count : list[int]
+    The current latency countdown of each node.
+  child : list[int]
+    The index of the first child of each node.
+  next : list[int]
+    The index of the next sibling of each node.
+  keys : list[tuple[tuple[str, bool]] or None]
+    For each pattern node, the first non-variable element of its pattern (or of each option of a disjunctive pattern),
+    and whether that element is first in the pattern; or None if the node cannot be skipped.
+  chain : list[int]
+    The index of the first node in the sibling chain of each node.
+  chains : dict[int, tuple]
+    A dict mapping the first node of each chain containing nodes that can be skipped to a tuple of the nodes in
+    that chain, a dict mapping literal elements to keyed nodes, and a dict mapping features to keyed nodes.
+
+  Notes
+  -----
+  Apart from `count`, a choice tree is never modified after it is compiled, so multiple overlays of a tree (see
+  ``ChoiceTree.overlay``) may share all of its arrays, each with its own latency countdowns.
+  """
+  __slots__ = ('root', 'pattern', 'directive', 'op', 'latency', 'count', 'child', 'next', 'keys', 'chain', 'chains',
+               '_memo')
+  _fields = __slots__[:-1]
+  memo_size = 10000
+
+  def __init__(self):
+    self.root = -1
+    self.pattern = []
+    self.directive = []
+    self.op = []
+    self.latency = []
+    self.count = []
+    self.child = []
+    self.next = []
+    self.keys = []
+    self.chain = []
+    self.chains = {}
+    self._memo = { 'feats' : None, 'words' : {}, 'skips' : {} }
+
+  def overlay(self):
+    """Create a view of this tree that shares its arrays (and cached indexes), but has its own latency countdowns."""
+    tree = ChoiceTree.__new__(ChoiceTree)
+    for x in self._fields:
+      setattr(tree, x, getattr(self, x))
+    tree.count = list(self.count)
+    tree._memo = self._memo
+    return tree
+
+  def skip(self, i, clause, feats):
+    """Get the first node, starting from node `i` in its sibling chain, that cannot be skipped for a given clause.
+
+    The nodes that can be skipped in a chain are computed once for each clause (and cached).
+
+    Parameters
+    ----------
+    i : int
+      The index of a node.
+    clause : list[str]
+      A clause to be matched by the patterns in the chain. If the clause contains any elements other
+      than non-empty strings, no nodes are skipped.
+    feats : dict
+      A dict mapping words to feature lists.
+
+    Returns
+    -------
+    int
+      The index of a node, or -1 if the remaining nodes in the chain can all be skipped.
+    """
+    if not all([isinstance(w, str) and w for w in clause]):
+      return i
+    memo = self._memo
+    if memo['feats'] is not feats or len(memo['skips']) >= self.memo_size or len(memo['words']) >= self.memo_size:
+      memo['words'] = {}
+      memo['skips'] = {}
+      memo['feats'] = feats
+    key = (self.chain[i], tuple(clause))
+    skips = memo['skips'].get(key)
+    if skips is None:
+      skips = memo['skips'][key] = self._chain_skips(self.chain[i], clause, feats)
+    return skips.get(i, i)
+
+  def _chain_skips(self, start, clause, feats):
+    """Map each node in a chain that can be skipped for a given clause to the next node in the chain that cannot be skipped."""
+    skips = {}
+    if start not in self.chains:
+      return skips
+    matches = set([j for j, anchored in self._word_matches(start, clause[0], feats) if anchored])
+    for word in set(clause):
+      matches.update([j for j, anchored in self._word_matches(start, word, feats) if not anchored])
+    target = -1
+    for j in reversed(self.chains[start][0]):
+      if self.keys[j] is not None and j not in matches:
+        skips[j] = target
+      else:
+        target = j
+    return skips
+
+  def _word_matches(self, start, word, feats):
+    """Get the keyed nodes in a chain (and whether each key is anchored) whose key matches a given word."""
+    key = (start, word)
+    matches = self._memo['words'].get(key)
+    if matches is None:
+      _, literals, features = self.chains[start]
+      matches = list(literals.get(word, ()))
+      for feat, fnodes in features.items():
+        if isa(word, feat, feats):
+          matches += fnodes
+      self._memo['words'][key] = matches
+    return matches
+
+  def __len__(self):
+    return len(self.op)
+
+  def __eq__(self, other):
+    return isinstance(other, ChoiceTree) and all([getattr(self, x) == getattr(other, x) for x in self._fields])
+
+  def __getstate__(self):
+    return { x : getattr(self, x) for x in self._fields }
+
+  def __setstate__(self, state):
+    for x in self._fields:
+      setattr(self, x, state[x])
+    self._memo = { 'feats' : None, 'words' : {}, 'skips' : {} }
+
+
+def node_op(pattern, directive):
+  """Get the operation of a choice tree node given its pattern and directive."""
+  if not directive:
+    if listp(pattern) and pattern and pattern[0] == ':or':
+      return OP_OR
+    if listp(pattern) and pattern and pattern[0] == ':subtree':
+      return OP_SUBTREE_MATCH
+    return OP_MATCH
+  if isinstance(directive, str) and directive in DIRECTIVE_OPS:
+    return DIRECTIVE_OPS[directive]
+  if isinstance(directive, str) and directive[0] == ':':
+    return OP_EXTERNAL
+  return OP_INVALID
+
+
+def pattern_keys(pattern, op):
+  """Get the keys of a pattern node, i.e., the first non-variable element of its pattern, and whether that element is first.
+
+  A clause can only match the pattern if some word of the clause matches that element (or the first word, if
+  the element is first), since each top-level element of a pattern matches a top-level element of the clause.
+
+  Parameters
+  ----------
+  pattern : s-expr
+    The pattern of a pattern node.
+  op : int
+    The operation of the node.
+
+  Returns
+  -------
+  tuple[tuple[str, bool]] or None
+    The key of the pattern (or of each option of a disjunctive pattern), or None if any pattern has no key.
+  """
+  def pattern_key(p):
+    if not listp(p):
+      return None
+    for i, x in enumerate(p):
+      if isinstance(x, str) and not match_var(x):
+        # A feature that is itself a dot-atom is stripped again when matching, so such patterns aren't indexed
+        if dot_atom(x) and dot_atom(x[1:]):
+          return None
+        return (x, i == 0)
+    return None
+  if op == OP_MATCH:
+    options = [pattern]
+  elif op == OP_OR:
+    options = pattern[1:]
+  else:
+    return None
+  keys = tuple([pattern_key(p) for p in options])
+  return keys if keys and None not in keys else None
+
+
+def compile_tree(root):
+  """Compile a choice tree (as created by ``readrules``) into a ``ChoiceTree``.
+
+  Parameters
+  ----------
+  root : dict
+    The root of a choice tree.
+
+  Returns
+  -------
+  ChoiceTree
+  """
+  tree = ChoiceTree()
+  nodes = []
+  indices = {}
+  stack = [root] if root else []
+  while stack:
+    node = stack.pop()
+    indices[id(node)] = len(nodes)
+    nodes.append(node)
+    if node['next']:
+      stack.append(node['next'])
+    if node['child']:
+      stack.append(node['child'])
+  for node in nodes:
+    directive = node['directive']
+    if isinstance(directive, str):
+      directive = sys.intern(directive)
+    tree.pattern.append(node['pattern'])
+    tree.directive.append(directive)
+    tree.op.append(node_op(node['pattern'], directive))
+    tree.latency.append(node['latency'])
+    tree.count.append(node['count'])
+    tree.child.append(indices[id(node['child'])] if node['child'] else -1)
+    tree.next.append(indices[id(node['next'])] if node['next'] else -1)
+    tree.keys.append(pattern_keys(tree.pattern[-1], tree.op[-1]))
+  tree.root = 0 if nodes else -1
+
+  # Index each chain of siblings by the keys of its patterns
+  tree.chain = [-1] * len(nodes)
+  for i in range(len(nodes)):
+    if tree.chain[i] >= 0:
+      continue
+    chain = []
+    j = i
+    while j >= 0:
+      tree.chain[j] = i
+      chain.append(j)
+      j = tree.next[j]
+    literals = {}
+    features = {}
+    for j in chain:
+      for x, anchored in tree.keys[j] or ():
+        literals.setdefault(x, []).append((j, anchored))
+        if dot_atom(x):
+          features.setdefault(x[1:], []).append((j, anchored))
+    if literals:
+      tree.chains[i] = (tuple(chain), literals, features)
+  return tree
+
+
+def readrules(packet, compiled=False):
   """Create a choice tree from a packet of pattern and template rules.
 
   Parameters
@@ -36,13 +327,16 @@ def readrules(packet):
         specifying how long to wait to use a rule again, and directive is a symbol such
         as ``:out``, ``:subtree``, ``:gist``, etc. specifying how the output should be used.
 
+  compiled : bool, default=False
+    Whether to return the choice tree compiled into flat arrays (see ``ChoiceTree``).
+
   Returns
   -------
-  root : dict
-    The root of the choice tree (a nested dict structure) created from the packet.
+  root : dict or ChoiceTree
+    The root of the choice tree (a nested dict structure) created from the packet, or the compiled tree.
   """
   if len(packet) < 2:
-    return {}
+    return compile_tree({}) if compiled else {}
   root = init_node(packet[1])
   stack = [(1, root)]
   # Advance past the 1st dept-# and pattern
@@ -89,7 +383,7 @@ def readrules(packet):
       stack[-1][1]['latency'] = int(n[0])
       stack[-1][1]['directive'] = n[1]
 
-  return root
+  return compile_tree(root) if compiled else root
   # END readrules
 
 
@@ -153,7 +447,7 @@ def from_lisp_file(fname):
   Returns
   -------
   trees : dict
-    A dict containing all choice trees, keyed on their root names.
+    A dict containing all (compiled) choice trees, keyed on their root names.
   feats : dict
     A dict mapping words to feature lists.
   """
@@ -163,7 +457,7 @@ def from_lisp_file(fname):
   for decl in contents:
     if decl[0] == 'readrules':
       name = decl[1].strip("'").strip('*')
-      tree = readrules(decl[2])
+      tree = readrules(decl[2], compiled=True)
       trees[name] = tree
     elif decl[0] == 'attachfeat':
       feat_xx = decl[1]
@@ -196,6 +490,8 @@ def read_preds_file(fname):
 def from_lisp_dirs(dirs):
   """Recursively read choice trees and word features from all LISP files in a directory or list of directories.
 
+  The choice trees and word features read from each file are cached, such that they are only re-read if the file is modified.
+
   Parameters
   ----------
   dirs : str or list[str]
@@ -204,7 +500,7 @@ def from_lisp_dirs(dirs):
   Returns
   -------
   trees : dict
-    A dict containing all choice trees, keyed on their root names.
+    A dict containing all (compiled) choice trees, keyed on their root names.
   feats : dict
     A dict mapping words to feature lists.
   preds : dict
@@ -218,11 +514,49 @@ def from_lisp_dirs(dirs):
   for dir in dirs:
     fnames = glob.glob(dir + '/**/*.lisp', recursive=True)
     for fname in fnames:
-      trees_new, feats_new = from_lisp_file(fname)
+      trees_new, feats_new = load_cached('tt', fname, from_lisp_file, deps=[sys.modules[__name__], eta.util.sexpr])
       trees = merge_trees(trees, trees_new)
       feats = merge_feats(feats, feats_new)
     pred_fnames = glob.glob(dir + '/**/preds.py', recursive=True)
     for pred_fname in pred_fnames:
       preds_new = read_preds_file(pred_fname)
       preds = merge_preds(preds, preds_new)
-  return trees, feats, preds
\ No newline at end of file
+  return trees, feats, preds
+
+
+# The forests of choice trees loaded in this process, keyed on their directories
+_forests = {}
+
+def load_forest(dirs):
+  """Load the choice trees, word features, and predicates from a directory or list of directories, sharing them across the process.
+
+  The forest for a given list of directories is only read once per process (see ``from_lisp_dirs``); later calls
+  return the same objects. These must therefore be treated as read-only, except that the latency countdowns of
+  the choice trees should be modified through an overlay of each tree (see ``ChoiceTree.overlay``).
+
+  Parameters
+  ----------
+  dirs : str or list[str]
+    The directory or directories to read.
+
+  Returns
+  -------
+  trees : dict
+    A dict containing all (compiled) choice trees, keyed on their root names.
+  feats : dict
+    A dict mapping words to feature lists.
+  preds : dict
+    A dict mapping predicate names to functions.
+  """
+  if isinstance(dirs, str):
+    dirs = [dirs]
+  # Since trees from later directories override those from earlier ones, the order of the directories is part of the key
+  key = tuple([os.path.normpath(dir) for dir in dirs])
+  if key not in _forests:
+    _forests[key] = from_lisp_dirs(list(dirs))
+  return _forests[key]
+
+
+def clear_forests():
+  """Clear the forests loaded in this process, such that they are re-read when next loaded."""
+  _forests.clear()
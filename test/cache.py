@@ -0,0 +1,70 @@
+import time
+
+from eta.util.cache import clear_cache
+from eta.util.general import SYMTAB
+from eta.schema import SchemaLibrary
+from eta.util.tt.parse import from_lisp_dirs
+
+DIRS_SCHEMA = ['agents/sophie-gpt/schemas', 'agents/sophie-gpt/day1/schemas']
+DIRS_RULES = ['agents/sophie-gpt/rules', 'agents/sophie-gpt/day1/rules']
+
+def load_all():
+  schemas = SchemaLibrary().from_lisp_dirs(DIRS_SCHEMA)
+  trees, feats, preds = from_lisp_dirs(DIRS_RULES)
+  return schemas, trees, feats
+
+
+def test_equivalence():
+  clear_cache()
+  schemas1, trees1, feats1 = load_all()
+  schemas2, trees2, feats2 = load_all()
+  assert str(schemas1) == str(schemas2)
+  for predicate, schema in schemas1.dial.items():
+    assert schema.format() == schemas2.dial[predicate].format()
+    assert schema.id != schemas2.dial[predicate].id
+  assert trees1 == trees2
+  assert feats1 == feats2
+  print('cached artifacts are equivalent to parsed artifacts')
+
+
+def test_generated_symbols():
+  """Check that loading schemas from the cache generates the same kinds of symbols as reading them, rather than reusing old ones."""
+  gentemp = SYMTAB.gentemp
+  prefixes = []
+  def recording_gentemp(prefix):
+    prefixes.append(prefix)
+    return gentemp(prefix)
+  SYMTAB.gentemp = recording_gentemp
+  try:
+    clear_cache()
+    SchemaLibrary().from_lisp_dirs(DIRS_SCHEMA)
+    cold = sorted(prefixes)
+    prefixes.clear()
+    SchemaLibrary().from_lisp_dirs(DIRS_SCHEMA)
+    warm = sorted(prefixes)
+  finally:
+    SYMTAB.gentemp = gentemp
+  assert cold and cold == warm
+  print('symbols generated while reading schemas are regenerated when loading from the cache')
+
+
+def benchmark(n=3):
+  for label, clear in [('cold', True), ('warm', False)]:
+    times = []
+    for _ in range(n):
+      if clear:
+        clear_cache()
+      start = time.time()
+      load_all()
+      times.append(time.time() - start)
+    print(f'{label} start: {min(times):.3f}s (min of {n})')
+
+
+def main():
+  test_equivalence()
+  test_generated_symbols()
+  benchmark()
+
+
+if __name__ == "__main__":
+  main()
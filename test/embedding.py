@@ -1,4 +1,75 @@
+import tempfile
+import numpy as np
+
 from eta.embedding import *
+from eta.lf import parse_eventuality, embed_eventualities
+
+class CountingEmbedder(Embedder):
+  """An embedder that computes a fixed random embedding for each text, counting the number of calls to the model."""
+
+  def __init__(self, dim=16, batch_size=4):
+    self.dim = dim
+    self.batch_size = batch_size
+    self.calls = 0
+
+  def embed(self, texts):
+    self.calls += 1
+    if isinstance(texts, (list, np.ndarray)):
+      return [np.random.default_rng(abs(hash(t))).standard_normal(self.dim).tolist() for t in texts]
+    return np.random.default_rng(abs(hash(texts))).standard_normal(self.dim).tolist()
+
+
+def test_embed_batch():
+  test = CountingEmbedder()
+  texts = [f'test sentence {i%10}' for i in range(30)]
+  embeddings = test.embed_batch(texts)
+  assert embeddings.shape == (30, 16) and test.calls == 3
+  for text, v in zip(texts, embeddings):
+    assert np.allclose(v, test.embed(text))
+  assert Embedder().embed_batch(texts).shape == (30, 0)
+
+  events = [parse_eventuality(['^you', 'say-to.v', '^me', f'"test sentence {i}"']) for i in range(10)]
+  test.calls = 0
+  embed_eventualities(events, test)
+  assert test.calls == 3
+  for e in events:
+    assert np.allclose(e.embedding, test.embed(e.get_nl()))
+  embed_eventualities(events, DummyEmbedder())
+  assert all([e.embedding == [] for e in events])
+  print('batched embeddings are equivalent to embedding each text separately')
+
+
+def test_sim():
+  rng = np.random.default_rng(0)
+  docs = rng.standard_normal((50, 8))
+  query = rng.standard_normal(8)
+  scores = sim(docs, query)
+  assert scores.shape == (50,)
+  for d, score in zip(docs, scores):
+    assert np.isclose(score, np.dot(d, query)/(np.linalg.norm(d)*np.linalg.norm(query)), atol=1e-5)
+  assert np.isclose(sim(docs[0], query), scores[0])
+  assert np.allclose(sim(np.zeros((2, 8)), query), 0)
+  print('batched similarities are equivalent to computing the similarity of each vector separately')
+
+
+def test_cache():
+  with tempfile.TemporaryDirectory() as dir:
+    embedder = CountingEmbedder()
+    texts = [f'test sentence {i}' for i in range(10)]
+    test = CachedEmbedder(embedder, size=5, path=dir+'/')
+    embeddings = test.embed_batch(texts)
+    assert embedder.calls == 3 and test.misses == 10
+    assert np.allclose(test.embed_batch(texts[5:]), embeddings[5:]) and test.hits == 5
+    assert np.allclose(test.embed('test  sentence 0 '), embeddings[0]) and embedder.calls == 3
+
+    # A new cache (e.g., in a later session) reads previously computed embeddings from disk
+    test = CachedEmbedder(embedder, path=dir+'/')
+    assert np.allclose(test.embed_batch(texts), embeddings) and test.disk_hits == 10 and embedder.calls == 3
+    test.embed_batch(texts + ['test sentence 10'])
+    assert test.misses == 1 and embedder.calls == 4
+    print(test.stats())
+  print('cached embeddings are equivalent to computed embeddings, and are only computed once')
+
 
 def main():
   print(sim([1., .5], [1., .3]))
@@ -14,6 +85,10 @@ def main():
   test_set1 = ['how to test systems', 'this is a sentence for testing', 'have you ever tested code before', 'debugging code']
   print(test.score('test sentence', test_set1))
 
+  test_sim()
+  test_embed_batch()
+  test_cache()
+
 
 if __name__ == '__main__':
   main()
@@ -0,0 +1,142 @@
+import os
+import time
+import tempfile
+import numpy as np
+
+from eta.index import *
+
+def index_types():
+  """Get the index types that can be constructed in the current environment (``hnsw`` requires hnswlib)."""
+  types = ['flat', 'ivf']
+  try:
+    import hnswlib
+    types.append('hnsw')
+  except ImportError:
+    pass
+  return types
+
+
+def make_vectors(n, dim=384, clusters=100, seed=0):
+  """Make random unit vectors drawn from a mixture of clusters (roughly mimicking the structure of text embeddings)."""
+  rng = np.random.default_rng(seed)
+  centers = rng.standard_normal((clusters, dim))
+  v = centers[rng.integers(clusters, size=n)] + .75*rng.standard_normal((n, dim))
+  return (v / np.linalg.norm(v, axis=1, keepdims=True)).astype(np.float32)
+
+
+def exact_search(vectors, keys, query, k):
+  sims = vectors[keys] @ normalize(query)
+  return keys[np.argsort(-sims, kind='stable')[:k]]
+
+
+def recall_at_k(index, vectors, keys, queries, k=10):
+  """Compute the mean fraction of the exact top `k` keys of each query that are retrieved by an index."""
+  hits = 0
+  for q in queries:
+    hits += len(set(index.search(q, k)[0].tolist()) & set(exact_search(vectors, keys, q, k).tolist()))
+  return hits / (k*len(queries))
+
+
+def test_flat():
+  vectors = make_vectors(3000, dim=64)
+  queries = make_vectors(20, dim=64, seed=1)
+  index = FlatIndex(capacity=16)
+  for i, v in enumerate(vectors):
+    index.add(i, v)
+  for i in range(0, 3000, 3):
+    index.remove(i)
+  for i in range(0, 300, 3):
+    index.add(i, vectors[i])
+  index.add(1, [])
+  keys = np.array(sorted(set(range(3000)) - set(range(300, 3000, 3)) - {1}))
+  assert len(index) == len(keys)
+  for q in queries:
+    assert index.search(q, 10)[0].tolist() == exact_search(vectors, keys, q, 10).tolist()
+  assert sorted(index.search(queries[0])[0].tolist()) == keys.tolist()
+  print('flat index matches exact search after incremental inserts and removals')
+
+
+def test_make_index():
+  empty = VectorIndex()
+  empty.add(0, make_vectors(1, dim=8)[0])
+  keys, sims = empty.search(make_vectors(1, dim=8)[0])
+  assert len(empty) == 0 and 0 not in empty and len(keys) == 0 and len(sims) == 0
+  a, b = make_index('flat'), make_index('flat')
+  a.add(0, make_vectors(1, dim=8)[0])
+  assert a is not b and 0 in a and 0 not in b
+  try:
+    make_index(a)
+    assert False
+  except Exception as e:
+    assert 'Unsupported vector index type' in str(e)
+  print('each created index is a new, empty index of a given type name')
+
+
+def test_incremental(types=None):
+  types = types if types else index_types()
+  vectors = make_vectors(5000, dim=64)
+  for type in types:
+    index = make_index(type) if type != 'ivf' else make_index(type, min_train=1000)
+    for i, v in enumerate(vectors):
+      index.add(i, v)
+    for i in range(100):
+      index.remove(i)
+    for i in range(100):
+      assert i not in index
+      assert i not in index.search(vectors[i], 10)[0].tolist()
+    index.add(0, vectors[0])
+    assert index.search(vectors[0], 1)[0].tolist() == [0]
+    assert len(index) == 4901
+    print(f'{type} index supports incremental inserts and removals')
+
+
+def test_save_load(types=None):
+  types = types if types else index_types()
+  vectors = make_vectors(2000, dim=64)
+  queries = make_vectors(5, dim=64, seed=1)
+  with tempfile.TemporaryDirectory() as dir:
+    for type in types:
+      index = make_index(type) if type != 'ivf' else make_index(type, min_train=500)
+      for i, v in enumerate(vectors):
+        index.add(i, v)
+      fname = os.path.join(dir, f'{type}.pkl')
+      index.save(fname)
+      loaded = load_index(fname)
+      for q in queries:
+        assert loaded.search(q, 10)[0].tolist() == index.search(q, 10)[0].tolist()
+      print(f'{type} index is equivalent after saving and loading')
+
+
+def benchmark(sizes=[10000, 100000], k=10, queries=50, types=None):
+  """Measure the build time, query latency, and recall@k of each type of index, relative to exact search."""
+  types = types if types else index_types()
+  for size in sizes:
+    vectors = make_vectors(size)
+    keys = np.arange(size)
+    qs = make_vectors(queries, seed=1)
+    for type in types:
+      index = make_index(type)
+      start = time.time()
+      for i, v in enumerate(vectors):
+        index.add(i, v)
+      build_time = time.time() - start
+      start = time.time()
+      for q in qs:
+        index.search(q, k)
+      latency = (time.time() - start)*1e3/queries
+      recall = recall_at_k(index, vectors, keys, qs, k)
+      print(f'{type} ({size} vectors): build {build_time:.2f}s, search {latency:.2f}ms per query, recall@{k} {recall:.3f}')
+
+
+def main():
+  if 'hnsw' not in index_types():
+    print('hnswlib is not installed; skipping hnsw index')
+  test_flat()
+  test_make_index()
+  test_incremental()
+  test_save_load()
+  benchmark()
+
+
+if __name__ == '__main__':
+  main()
@@ -1,3 +1,6 @@
+import pickle
+from copy import deepcopy
+
 from eta.lf import *
 
 def test1():
@@ -50,8 +53,48 @@ def test1():
   print(remove_duplicates([facta, factb], order=True))
 
 
+def test2():
+  formula = parse_s_expr('(^me ((pres want.v) (to (see.v ?y))))')
+  lazy = Eventuality('?e1', None, formula, None)
+  eager = Eventuality('?e1', formula_to_nl(formula), formula, None)
+  for fact in [lazy, eager]:
+    fact.replacevar('^me', '^you')
+    fact.bind('^you', 'Joe')
+  assert lazy.get_nl() == eager.get_nl()
+  print(lazy.get_nl())
+  for fact in [lazy, eager]:
+    fact.unbind('^you')
+  assert lazy.get_nl() == eager.get_nl()
+  print(lazy.get_nl())
+
+
+def test3():
+  fact = parse_eventuality('i like cake .')
+  before = hash(fact)
+  fact.nl = 'i like pie .'
+  assert hash(fact) == hash(parse_eventuality('i like pie .', ep=fact.get_ep()))
+  assert hash(fact) != before
+  print(fact)
+
+
+def test4():
+  facts = [parse_eventuality('(^me ((pres like.v) ?x))'), parse_eventuality('(^you ((pres see.v) ?x))')]
+  for copied in [pickle.loads(pickle.dumps(facts)), deepcopy(facts)]:
+    a, b = copied
+    wff = b.get_wff()
+    a.bind('?x', 'cake.n')
+    assert a.get_wff() == ['^me', [['pres', 'like.v'], 'cake.n']]
+    assert b.get_wff() == wff == ['^you', [['pres', 'see.v'], '?x']]
+    assert not b.bindings and not b.ulf.bindings
+  assert not facts[0].bindings and not facts[0].ulf.bindings
+  print('copies of unbound eventualities may be bound independently')
+
+
 def main():
   test1()
+  test2()
+  test3()
+  test4()
   # knowledge = from_lisp_dirs('agents/test/knowledge')
   # for e in knowledge:
   #   print(e)
@@ -1,3 +1,12 @@
+import os
+import gc
+import sys
+import time
+import tempfile
+import tracemalloc
+import numpy as np
+
+from eta.util.general import squash, linsum, argmax, episode_name
 from eta.memory import *
 from eta.lf import *
 from eta.embedding import *
@@ -122,11 +131,339 @@ def test_retrieval():
     print(m)
 
 
+def benchmark(n=2000, lookups=10):
+  """Time storing, looking up, and removing memories of bound eventualities."""
+  facts = []
+  for i in range(n):
+    fact = parse_eventuality('(?x ((pres go.v) (to.p (the.d ?y)) (adv-e (during.p ?z))))', expectation=True)
+    fact.bind(fact.get_ep(), f'e{i}')
+    fact.bind('?x', ['the.d', f'person{i%50}.n'])
+    fact.bind('?y', f'place{i}.n')
+    fact.bind('?z', ['the.d', 'day.n'])
+    facts.append(fact)
+  memories = [Memory(fact) for fact in facts]
+
+  test = MemoryStorage()
+  start = time.time()
+  test.store(memories)
+  print(f'store: {(time.time()-start)*1e6/n:.1f}us per memory')
+
+  start = time.time()
+  for _ in range(lookups):
+    for m in memories:
+      assert m in test.memories and m in test.context
+  print(f'lookup: {(time.time()-start)*1e6/(n*lookups):.1f}us per memory')
+
+  start = time.time()
+  for _ in range(lookups):
+    test.get_from_context([['the.d', 'person0.n'], 'go.v', '?y', '?z'])
+  print(f'get_from_context: {(time.time()-start)*1e3/lookups:.2f}ms per query')
+
+  start = time.time()
+  test.remove(memories)
+  print(f'remove: {(time.time()-start)*1e6/n:.1f}us per memory')
+
+
+class RandomEmbedder(Embedder):
+  """An embedder that computes a fixed random unit embedding for each text (for testing retrieval at scale)."""
+
+  def __init__(self, dim=384):
+    self.dim = dim
+
+  def embed(self, texts):
+    if isinstance(texts, (list, np.ndarray)):
+      return [self.embed(t) for t in texts]
+    v = np.random.default_rng(abs(hash(texts))).standard_normal(self.dim)
+    return (v / np.linalg.norm(v)).tolist()
+
+
+def make_memories(n, embedder):
+  rng = np.random.default_rng(0)
+  memories = []
+  for i in range(n):
+    fact = parse_eventuality(f'fact number {i}', ep=f'e{i}')
+    fact.embedding = rng.standard_normal(embedder.dim)
+    fact.embedding /= np.linalg.norm(fact.embedding)
+    memories.append(Memory(fact, importance=float(rng.uniform(.5, 1.))))
+  return memories
+
+
+def retrieve_reference(storage, query, n=5, coeffs=(1.,1.,1.)):
+  """The original (list-based) retrieval procedure, used as a reference for `MemoryStorage.retrieve`."""
+  memories = [m for m in storage.memories if m.importance >= storage.importance_threshold]
+  recency = squash([m.last_access.to_num() for m in memories])
+  importance = squash([m.importance for m in memories])
+  salience = squash(storage.embedder.score(query, memories, [list(m.event.embedding) for m in memories]))
+  scores = linsum([recency, importance, salience], coeffs)
+  return argmax(memories, scores, n)
+
+
+def test_retrieval_equivalence():
+  embedder = RandomEmbedder()
+  test = MemoryStorage(embedder)
+  memories = make_memories(3000, embedder)
+  test.store(memories)
+  test.remove(memories[:500])
+  test.store(memories[:100])
+  for query in ['a test query', 'another test query', 'i like to travel']:
+    assert test.retrieve(query=query, n=10) == retrieve_reference(test, query, n=10)
+    test.access(test.retrieve(query=query, n=10))
+  print('vectorized retrieval matches reference retrieval')
+
+
+def benchmark_retrieval(sizes=[1000, 10000, 100000], queries=20, indexes=['flat', 'ivf']):
+  embedder = RandomEmbedder()
+  for size in sizes:
+    memories = make_memories(size, embedder)
+    for index in indexes:
+      test = MemoryStorage(embedder, index=index, capacity=None)
+      test.store(memories)
+      start = time.time()
+      for i in range(queries):
+        test.retrieve(query=f'query {i}', n=5)
+      print(f'retrieve ({size} memories, {index} index): {(time.time()-start)*1e3/queries:.2f}ms per query')
+
+
+def test_forget():
+  embedder = RandomEmbedder()
+  with tempfile.TemporaryDirectory() as dir:
+    archive = MemoryArchive(os.path.join(dir, 'archive.pkl'), embedder=embedder)
+    test = MemoryStorage(embedder, capacity=1000, archive=archive)
+    memories = make_memories(1500, embedder)
+    for m in memories:
+      fact = parse_eventuality(['^you', 'say-to.v', '^me', f'"{m.event.nl}"'], ep=m.get_ep())
+      fact.embedding = m.event.embedding
+      m.event = fact
+    # Memories in context are never evicted, nor is a memory that was just stored
+    test.store(memories[:200])
+    test.store(memories[200:], context=False)
+    stored = test.memories
+    evicted = [m for m in memories if m not in stored]
+    assert len(stored) <= 1000 and len(evicted) == test.evicted == len(archive)
+    assert all([m in stored for m in memories[:200]]) and memories[-1] in stored
+    assert all([m not in test.context and not test.get_episode(m.get_ep()) for m in evicted])
+    assert len(test.index) == len(stored) and len(test.ep_ht) == len(stored)
+    assert np.mean([m.importance for m in evicted]) < np.mean([m.importance for m in stored])
+    print(test.stats())
+
+    m = evicted[0]
+    assert archive.get_episode(m.get_ep()) == [m]
+    assert m in archive.get_matching(['^you', 'say-to.v', '^me', m.get_wff()[3]])
+    assert m in archive.get_matching(['?x', 'say-to.v', '?y', m.get_wff()[3]])
+    assert len(archive.get_matching(['?x', 'say-to.v', '?y', '?z'])) == len(evicted)
+    assert MemoryArchive(archive.fname).get_episode(m.get_ep()) == [m]
+    assert len(archive.retrieve('a test query', n=5)) == 5
+  print('evicted memories are removed from storage and remain queryable in the archive')
+
+
+def benchmark_forget(n=50000, capacity=5000, queries=20):
+  """Time storing memories beyond the capacity of storage (including eviction), and retrieval from the bounded storage."""
+  embedder = RandomEmbedder()
+  memories = make_memories(n, embedder)
+  test = MemoryStorage(embedder, capacity=capacity)
+  start = time.time()
+  test.store(memories, context=False)
+  print(f'store with eviction ({n} memories, capacity {capacity}): {(time.time()-start)*1e6/n:.1f}us per memory')
+  start = time.time()
+  for i in range(queries):
+    test.retrieve(query=f'query {i}', n=5)
+  print(f'retrieve (capacity {capacity}): {(time.time()-start)*1e3/queries:.2f}ms per query')
+
+
+def benchmark_flush_context(sizes=[1000, 10000, 100000], ntelic=10, flushes=20):
+  """Time flushing telic facts from contexts containing many atelic facts (compared to scanning the whole context)."""
+  for size in sizes:
+    test = MemoryStorage(capacity=None)
+    test.store([Memory(parse_eventuality(['^me', 'know.v', f'fact{i}.n'], ep=f'e{i}')) for i in range(size)])
+    times, times_scan = [], []
+    for j in range(flushes):
+      telic = [Memory(parse_eventuality(['^you', 'say-to.v', '^me', f'"turn {j} {i}"'], ep=f'e{size+j*ntelic+i}'))
+               for i in range(ntelic)]
+      test.store(telic)
+      start = time.time()
+      scanned = [m for m in test.context if m.is_telic()]
+      times_scan.append(time.time() - start)
+      start = time.time()
+      test.flush_context()
+      times.append(time.time() - start)
+      assert len(scanned) == ntelic and not test.telic_context and len(test.context) == size
+    print(f'flush_context ({size} facts in context): {sum(times)*1e3/flushes:.3f}ms per flush '
+          f'(scanning context: {sum(times_scan)*1e3/flushes:.3f}ms)')
+
+
+def test_persistence(n=2000):
+  """Check that persistent memory storage is equivalent after closing and reloading (without re-embedding any memories)."""
+  embedder = RandomEmbedder()
+  with tempfile.TemporaryDirectory() as dir:
+    path = os.path.join(dir, 'memory/')
+    test = PersistentMemoryStorage(path, embedder, capacity=None)
+    memories = make_memories(n, embedder)
+    test.store(memories[:n//2])
+    test.store(memories[n//2:], context=False)
+    test.remove(memories[:n//10])
+    test.remove_from_context(memories[n//10:n//5])
+    test.access(memories[n//5:n//4])
+    test.instantiate(parse_eventuality(['^you', 'say-to.v', '^me', '"hi"'], ep='e9999'))
+    retrieved = test.retrieve(query='a test query', n=10)
+    test.close()
+
+    # Persisted memories are only loaded when first accessed, but new episode names never collide with them
+    start = time.time()
+    loaded = PersistentMemoryStorage(path, RandomEmbedder(), capacity=None)
+    print(f'open ({loaded.loaded} memories): {(time.time()-start)*1e3:.1f}ms')
+    assert loaded._unloaded and int(episode_name()[1:]) > 9999
+    start = time.time()
+    assert loaded.memories == test.memories and loaded.context == test.context
+    print(f'load ({loaded.loaded} memories): {(time.time()-start)*1e3:.1f}ms')
+    assert not loaded._unloaded
+    for m in loaded.memories:
+      m1 = [m1 for m1 in test.get_episode(m.get_ep()) if m1 == m][0]
+      assert np.allclose(m.event.embedding, m1.event.embedding)
+      assert m.importance == m1.importance and m.last_access.to_num() == m1.last_access.to_num()
+      assert (m.end_time is None) == (m1.end_time is None)
+    assert loaded.get_matching(['?x', 'say-to.v', '^me', '?y'])[0].get_ep() == 'e9999'
+    assert loaded.retrieve(query='a test query', n=10) == retrieved
+    assert int(episode_name()[1:]) > 9999
+    loaded.close()
+  print('persistent memory storage is equivalent after closing and reloading')
+
+
+def benchmark_persistence(n=10000):
+  """Time storing memories in persistent storage (relative to in-memory storage), and loading them in a new session."""
+  embedder = RandomEmbedder()
+  memories = make_memories(n, embedder)
+  start = time.time()
+  MemoryStorage(embedder, capacity=None).store(memories)
+  print(f'store (in-memory, {n} memories): {(time.time()-start)*1e6/n:.1f}us per memory')
+  with tempfile.TemporaryDirectory() as dir:
+    path = os.path.join(dir, 'memory/')
+    test = PersistentMemoryStorage(path, embedder, capacity=None)
+    start = time.time()
+    for m in memories:
+      test.store(m)
+    print(f'store (persistent, {n} memories): {(time.time()-start)*1e6/n:.1f}us per memory')
+    test.close()
+    start = time.time()
+    loaded = PersistentMemoryStorage(path, embedder, capacity=None)
+    print(f'open (persistent, {n} memories): {(time.time()-start)*1e3:.1f}ms')
+    start = time.time()
+    loaded.get_episode(memories[0].get_ep())
+    print(f'load on first access (persistent, {n} memories): {(time.time()-start)*1e3:.1f}ms')
+    loaded.close()
+
+
+def benchmark_footprint(n=5000):
+  """Measure the number of bytes allocated per memory when instantiating and storing embedded facts."""
+  embedder = RandomEmbedder()
+  gc.collect()
+  tracemalloc.start()
+  test = MemoryStorage(embedder, capacity=None)
+  for i in range(n):
+    test.instantiate(parse_eventuality(['^you', 'say-to.v', '^me', f'"fact number {i}"'], ep=f'e{i}'))
+  gc.collect()
+  size = tracemalloc.get_traced_memory()[0]
+  tracemalloc.stop()
+  print(f'footprint ({n} memories): {size/n:.0f} bytes per memory')
+
+
+def get_from_context_reference(storage, pred_patt):
+  """The original (hash table-based) matching procedure, used as a reference for `MemoryStorage.get_from_context`."""
+  key, filter = get_pattern_key(pred_patt)
+  memories = dict_get(storage.wff_ht, key)
+  if filter:
+    memories = [m for m in memories if match_pattern(m.get_wff(), pred_patt)]
+  return [m for m in memories if m in storage.context]
+
+
+def test_matching():
+  test = MemoryStorage(capacity=None)
+  facts = [parse_eventuality(['^me', 'know.v'], ep='e1'),
+           parse_eventuality(['^me', 'know.v', 'fact1.n'], ep='e2'),
+           parse_eventuality(['^you', 'know.v', 'fact1.n', ['that', ['^me', 'like.v', 'cake.n']]], ep='e3')]
+  test.store([Memory(f) for f in facts])
+  eps = lambda matches: sorted([m.get_ep() for m in matches])
+
+  # A pattern with only variable arguments matches any wff with the predicate, regardless of its number of arguments
+  assert eps(test.get_matching(['?x', 'know.v'])) == ['e1', 'e2', 'e3']
+  assert eps(test.get_matching(['?x', 'know.v', '?y'])) == ['e1', 'e2', 'e3']
+  bindings = {m.get_ep(): b for m, b in test.get_matching(['?x', 'know.v', '?y'], bindings=True)}
+  assert bindings == {'e1': {'?x': '^me'}, 'e2': {'?x': '^me', '?y': 'fact1.n'}, 'e3': {'?x': '^you', '?y': 'fact1.n'}}
+
+  # Any other pattern only matches wffs with the same structure
+  assert eps(test.get_matching(['^me', 'know.v', '?y'])) == ['e2']
+  assert eps(test.get_matching(['?x', 'know.v', 'fact1.n'])) == ['e2']
+  assert eps(test.get_matching(['?x', 'know.v', '?y', ['that', ['?z', 'like.v', '?w']]])) == ['e3']
+  assert eps(test.get_matching('know.v')) == ['e1', 'e2', 'e3']
+
+  # Archived memories match each pattern in the same way (including after the archive is re-indexed)
+  with tempfile.TemporaryDirectory() as dir:
+    archive = MemoryArchive(dir+'/archive')
+    archive.add(sorted(test.memories, key=lambda m: m.get_ep()))
+    matches = lambda store, patt: sorted([(m.get_ep(), b) for m, b in store.get_matching(patt, bindings=True)])
+    for patt in ['know.v', ['?x', 'know.v'], ['?x', 'know.v', '?y'], ['^me', 'know.v', '?y'], ['?x', 'know.v', 'fact1.n'],
+                 ['?x', 'know.v', '?y', ['that', ['?z', 'like.v', '?w']]]]:
+      assert matches(archive, patt) == matches(MemoryArchive(archive.fname), patt) == matches(test, patt)
+  print('patterns with only variable arguments match by predicate; other patterns match by structure')
+
+
+def benchmark_matching(n=10000, lookups=100):
+  """Time looking up patterns in a context of `n` facts (compared to the original hash table-based matching)."""
+  test = MemoryStorage(capacity=None)
+  facts = []
+  for i in range(n):
+    if i % 100 == 0:
+      facts.append(parse_eventuality(['^you', 'say-to.v', '^me', f'"utterance {i}"'], ep=f'e{i}'))
+    elif i % 2 == 0:
+      facts.append(parse_eventuality([['the.d', f'person{i%50}.n'], 'know.v', f'fact{i}.n'], ep=f'e{i}'))
+    else:
+      facts.append(parse_eventuality(['^me', 'know.v', ['that', [f'person{i%50}.n', 'like.v', f'thing{i%20}.n']]], ep=f'e{i}'))
+  test.store([Memory(f) for f in facts])
+  patterns = [
+    ['^you', 'say-to.v', '^me', '?words'],
+    [['the.d', 'person6.n'], 'know.v', 'fact1006.n'],
+    ['?x', 'know.v', 'fact1006.n'],
+    ['^me', 'know.v', ['that', ['person3.n', 'like.v', '?y']]]
+  ]
+  for patt in patterns:
+    matches = test.get_from_context(patt, bindings=True)
+    reference = get_from_context_reference(test, patt)
+    if all([isinstance(x, str) for x in patt]):
+      assert [m for m, _ in matches] == reference
+    start = time.time()
+    for _ in range(lookups):
+      test.get_from_context(patt)
+    t = (time.time()-start)*1e6/lookups
+    start = time.time()
+    for _ in range(lookups):
+      get_from_context_reference(test, patt)
+    t_ref = (time.time()-start)*1e6/lookups
+    print(f'get_from_context {patt} ({n} facts): {t:.1f}us per lookup, {len(matches)} matches '
+          f'(hash tables: {t_ref:.1f}us, {len(reference)} matches)')
+
+
 def main():
   test1()
   test2()
+  test_retrieval_equivalence()
+  test_forget()
+  test_persistence()
+  test_matching()
   test_retrieval()
+
+
+def benchmarks():
+  benchmark()
+  benchmark_forget()
+  benchmark_persistence()
+  benchmark_footprint()
+  benchmark_flush_context()
+  benchmark_matching()
+  benchmark_retrieval()
   
 
 if __name__ == '__main__':
-  main()
\ No newline at end of file
+  # Pass --benchmark to run the (slow) benchmarks instead of the tests
+  if '--benchmark' in sys.argv[1:]:
+    benchmarks()
+  else:
+    main()
@@ -1,5 +1,9 @@
+import time
+import numpy as np
+
 from eta.schema import *
 from eta.embedding import *
+from eta.index import normalize
 
 def testschema():
   sep = '\n----------------------------\n'
@@ -126,6 +130,42 @@ def testcond():
   print(schema.get_section_wffs(['rigid-conds', 'static-conds', 'preconds']), sep)
 
 
+class WordEmbedder(Embedder):
+  """An embedder that embeds a text as a bag of hashed words (with a different hash for each seed)."""
+
+  def __init__(self, dim=64, seed=0):
+    self.dim = dim
+    self.seed = seed
+
+  def embed(self, texts):
+    if isinstance(texts, (list, np.ndarray)):
+      return [self.embed(t) for t in texts]
+    v = np.zeros(self.dim)
+    for word in texts.split():
+      v[hash((self.seed, word)) % self.dim] += 1.
+    return v.tolist()
+
+
+def test_reembed():
+  schemas = SchemaLibrary()
+  schemas.from_lisp_dirs(['agents/sophie-gpt/schemas'])
+  dial = list(schemas.dial.values())
+  schema = dial[0]
+  assert len(schema.get_index()[0]) == 0 and len(schemas.get_index('dial')[0]) == 0
+  for seed in [0, 1]:
+    embedder = WordEmbedder(seed=seed)
+    embed_schemas(dial, embedder)
+    index, eventualities = schema.get_index()
+    assert len(index) == len(eventualities)
+    for i, e in enumerate(eventualities):
+      assert np.allclose(index.get(i), normalize(embedder.embed(e.get_nl())))
+    index, indexed = schemas.get_index('dial')
+    assert len(index) == len(indexed)
+    for s in indexed[:5]:
+      assert np.isclose(index.search(embedder.embed(s.contents.to_nl()), 1)[1][0], 1., atol=1e-5)
+  print('schema and library indexes are rebuilt after re-embedding')
+
+
 def test_retrieval():
   sep = '\n----------------------------\n'
 
@@ -147,12 +187,27 @@ def test_retrieval():
 
 
 
+def benchmark_instantiate(n=5):
+  schemas = SchemaLibrary()
+  schemas.from_lisp_dirs(['agents/sophie-gpt/schemas', 'agents/sophie-gpt/day1/schemas'])
+  for label, sec in [('instantiate', None), ('instantiate + episodes', 'episodes'), ('instantiate + all sections', ':all')]:
+    start = time.time()
+    for _ in range(n):
+      for schema in schemas.dial.values():
+        schema_instance = schema.instantiate([ME, YOU])
+        if sec:
+          schema_instance.get_section(sec)
+    print(f'{label}: {(time.time()-start)*1e3/(n*len(schemas.dial)):.2f}ms per schema')
+
+
 def main():
   sep = '\n----------------------------\n'
 
   testschema()
   testcopy()
   testcond()
+  benchmark_instantiate()
+  test_reembed()
   test_retrieval()
 
 
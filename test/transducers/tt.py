@@ -1,3 +1,5 @@
+from copy import copy
+
 from eta.transducers.tt import * 
 from eta.discourse import *
 
@@ -94,6 +96,57 @@ def test6():
   print(test(observation))
 
 
+def test_batch():
+  clause = ['test', 'string', 'one', '.']
+  test = TTTransducer('agents/test/rules', 'latency-test')
+  expected = [TTTransducer.__call__(test, clause) for _ in range(6)]
+  test = TTTransducer('agents/test/rules', 'latency-test')
+  assert test.batch([clause]*6) == expected
+  assert [r for r, in expected] == ['latency test one .', 'latency test two .', 'latency test three .'] + ['latency test four .']*3
+
+  # With latency reset for each input, each result is the one that would be chosen at the start of the batch
+  test = TTTransducer('agents/test/rules', 'latency-test')
+  test(clause)
+  counts = test._get_counts()
+  assert test.batch([clause]*6, latency='reset') == [['latency test two .']]*6
+  assert test.batch([clause]*6, latency='reset', processes=2) == [['latency test two .']]*6
+  assert test.batch([clause]*6, latency='disabled') == [['latency test one .']]*6
+  assert test.batch([clause]*6, latency='disabled', processes=2) == [['latency test one .']]*6
+  assert test._get_counts() == counts
+
+  test = TTPragmaticTransducer('agents/sophie-gpt/rules')
+  inputs = [gist.split() for gist in ["there is some chance i could outlive my prognosis .", "what is my prognosis ?", "do i need chemotherapy ?"]*10]
+  expected = test.batch(inputs, latency='reset')
+  assert expected[0] and expected[2]
+  assert test.batch(inputs, latency='reset', processes=2) == expected
+  print('batched TT results are equivalent to transducing each input in turn')
+
+
+def test_shared():
+  dirs = ['agents/sophie-gpt/rules', 'agents/sophie-gpt/day1/rules']
+  gist = TTGistTransducer(dirs)
+  pragmatic = TTPragmaticTransducer(dirs)
+  assert gist.feats is pragmatic.feats and gist.preds is pragmatic.preds
+  assert all([gist.trees[name].pattern is pragmatic.trees[name].pattern for name in gist.trees])
+
+  # Each transducer has its own latency countdowns
+  clause = ['test', 'string', 'one', '.']
+  test1 = TTTransducer('agents/test/rules', 'latency-test')
+  test2 = TTTransducer('agents/test/rules', 'latency-test')
+  assert test1(clause) == test2(clause) == ['latency test one .']
+  assert test1(clause) == ['latency test two .']
+  assert test2(clause) == ['latency test two .']
+
+  # Copies of a transducer also have their own latency countdowns
+  test3 = copy(test1)
+  test4 = copy(test1)
+  assert test3.trees['latency-test'].pattern is test1.trees['latency-test'].pattern
+  assert test3.trees['latency-test'].count is not test4.trees['latency-test'].count
+  assert test3(clause) == test4(clause) == ['latency test three .']
+  assert test1(clause) == ['latency test three .']
+  print('TT transducers share choice trees, but not latency countdowns')
+
+
 def main():
   # test1()
   # test2()
@@ -101,6 +154,8 @@ def main():
   # test4()
   # test5()
   test6()
+  test_batch()
+  test_shared()
 
 
 if __name__ == '__main__':
@@ -0,0 +1,62 @@
+import random
+
+from eta.util.dtree import *
+
+ATOMS = ['^me', '^you', 'say-to.v', 'know.v', 'the.d', 'dog.n', 'cat.n', '"hi"', 'e1', 'e2']
+VARS = ['?x', '?y', '?z']
+
+def random_expr(rng, depth=0):
+  if depth > 2 or rng.random() < .5:
+    return rng.choice(ATOMS)
+  return [random_expr(rng, depth+1) for _ in range(rng.randint(1, 4))]
+
+
+def random_patt(expr, rng):
+  """Make a pattern from an expression by replacing random subexpressions with variables."""
+  if rng.random() < .25:
+    return rng.choice(VARS)
+  if isinstance(expr, list):
+    return [random_patt(e, rng) for e in expr]
+  return expr
+
+
+def test_differential(n=2000, patterns=500, seed=0):
+  """Check that matching against the tree is equivalent to matching against every expression (with random removals)."""
+  rng = random.Random(seed)
+  tree = DiscriminationTree()
+  exprs = {}
+  for i in range(n):
+    exprs[i] = random_expr(rng)
+    tree.insert(exprs[i], i)
+  for i in rng.sample(range(n), n//2):
+    assert tree.remove(exprs.pop(i), i)
+  assert not tree.remove(['not', 'stored'], 0)
+  assert len(tree) == len(exprs)
+  for _ in range(patterns):
+    patt = random_patt(rng.choice(list(exprs.values())), rng)
+    expected = [(i, b) for i, b in [(i, match_expr(patt, e)) for i, e in sorted(exprs.items())] if b is not None]
+    assert tree.match(patt) == expected, patt
+  for i, e in list(exprs.items()):
+    tree.remove(e, i)
+  assert not tree.root.children and not tree.root.jumps
+  print('discrimination tree matches are equivalent to exhaustive matching')
+
+
+def examples():
+  tree = DiscriminationTree()
+  tree.insert(['^you', 'say-to.v', '^me', '"hi"'], 'e1')
+  tree.insert(['^you', 'say-to.v', '^me', ['that', ['^you', 'be.v', 'happy.a']]], 'e2')
+  tree.insert(['^me', 'say-to.v', '^you', '"hi"'], 'e3')
+  print(tree.match(['^you', 'say-to.v', '^me', '?words']))
+  print(tree.match(['?x', 'say-to.v', '?y', '"hi"']))
+  print(tree.match(['^you', 'say-to.v', '^me', ['that', ['?x', 'be.v', '?y']]]))
+  print(tree.match(['?x', 'say-to.v', '?x', '?z']))
+
+
+def main():
+  examples()
+  test_differential()
+
+
+if __name__ == "__main__":
+  main()
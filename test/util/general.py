@@ -4,6 +4,8 @@ def main():
 	print(subst('a', 'b', ['a', 'b', ['x', 'y', 'b', ['b'], 'c', 'b']]))
 	print(subst('x', ['a', 'b'], ['a', 'b', ['c', ['a', 'b'], ['a', 'b'], 'a', 'b', 'c', [['a', 'b']]]]))
 	print(subst('a', 'b', 'b'))
+	print(substall(['?x', 'like.v', ['?y', '?x']], [('?x', 'John'), ('?y', ['the.d', 'dog.n'])]))
+	print(substall(['?x', 'like.v', '?y'], [('?x', '?y'), ('?y', 'Mary')]))
 
 	print(to_key([None, 'test.v', ['a', 'b']]))
 
@@ -1,6 +1,184 @@
+import time
+import random
+from glob import glob
+
+from eta.util.general import replaceall, atom, standardize
+import eta.util.file as file
 from eta.util.sexpr import *
 
-def main():
+# ``````````````````````````````````````
+# Reference implementation
+# ``````````````````````````````````````
+
+def balanced_substr(s):
+  """Find a substring with a balanced number of parentheses."""
+  count = 1
+  for i in range(1, len(s)):
+    c = s[i]
+    if c == '(':
+      count += 1
+    if c == ')':
+      count -= 1
+    if count == 0:
+      return s[:i+1]
+  return None
+
+
+def convert_quotes(s_expr):
+  """Convert any quoted word lists (i.e., single ' symbol followed by a list of symbols) to a single quoted string."""
+  def convert_quotes_rec(e):
+    if atom(e):
+      return e
+    elif len(e) == 1:
+      return [convert_quotes_rec(e[0])]
+    else:
+      e1 = []
+      for x1, x2 in zip([None]+e[:-1], e):
+        if x1 == "'" and x2 and isinstance(x2, list) and all([isinstance(x, str) for x in x2]):
+          e1.append('"'+standardize(' '.join(x2))+'"')
+        elif x2 != "'":
+          e1.append(x2)
+      return [convert_quotes_rec(x) for x in e1]
+  return convert_quotes_rec(s_expr)
+
+
+def compress_quotes(s_expr):
+  """Compress quoted expressions that were split between multiple words during parsing."""
+  def compress_quotes_rec(e):
+    if atom(e):
+      return e
+    elif len(e) == 1:
+      return [compress_quotes_rec(e[0])]
+    else:
+      e1 = []
+      acc = []
+      i = 0
+      while i < len(e):
+        if isinstance(e[i], str) and e[i][0] == '"':
+          j = i
+          while j < len(e):
+            acc.append(e[j])
+            if not isinstance(e[j], str):
+              e1 += acc
+              acc = []
+              j += 1
+              break
+            elif e[j][-1] == '"':
+              e1.append(' '.join(acc))
+              acc = []
+              j += 1
+              break
+            else:
+              j += 1
+          i = j
+        else:
+          e1.append(e[i])
+          i += 1
+      return [compress_quotes_rec(x) for x in e1]
+  return compress_quotes_rec(s_expr)
+
+
+def parse_s_expr_reference(s_expr):
+  """The original (recursive, quadratic-time) S-expression parser, used as a reference for `parse_s_expr`."""
+  def parse_s_expr_rec(s_expr):
+    s_expr = clean_s_expr(s_expr)
+    if len(s_expr) == 0:
+      return None
+    if s_expr[0] != '(' or s_expr[-1] != ')':
+      return s_expr
+    items = []
+    item_buf = []
+    i = 1
+    while i < len(s_expr):
+      c = s_expr[i]
+      if c == ' ':
+        if len(item_buf) > 0:
+          items.append(''.join(item_buf))
+          item_buf = []
+        i += 1
+      elif c != '(':
+        if c != ')':
+          item_buf.append(c)
+        i += 1
+      else:
+        if len(item_buf) > 0:
+          items.append(''.join(item_buf))
+          item_buf = []
+        inner = balanced_substr(s_expr[i:])
+        items.append(parse_s_expr_rec(inner))
+        i += len(inner)
+    if len(item_buf) > 0:
+      items.append(''.join(item_buf))
+      item_buf = []
+    return items
+  return convert_quotes(standardize_symbols(compress_quotes(parse_s_expr_rec(s_expr))))
+
+
+
+# ``````````````````````````````````````
+# Tests
+# ``````````````````````````````````````
+
+def lisp_contents(fname):
+  """Read the contents of a LISP file in the form that is parsed by `read_lisp`."""
+  return '(' + clean_lisp(file.read_file(fname)) + ')'
+
+
+def random_s_expr(n, rng):
+  """Generate a random (possibly malformed) S-expression string of `n` tokens."""
+  tokens = ['(', ')', ' ', "'", '"', '|', 'a', 'B.v', '|Foo Bar|', '"x', 'y"', '"z"', '^me', '\n', '  ']
+  return '(' + ''.join([rng.choice(tokens) for _ in range(n)]) + ')'
+
+
+def test_differential():
+  """Test that `parse_s_expr` produces identical output to the reference implementation.
+
+  Note that the reference implementation re-cleans the substring of each nested list, whereas `parse_s_expr` cleans the
+  string once; these only differ if cleaning is not idempotent, i.e., if a second pass re-pairs the vertical bars of
+  adjacent escaped symbols (e.g., ``|a| '|b|``), so such strings are excluded from the random tests.
+  """
+  fnames = glob('agents/**/*.lisp', recursive=True)
+  for fname in fnames:
+    contents = lisp_contents(fname)
+    assert parse_s_expr(contents) == parse_s_expr_reference(contents), fname
+  print(f'parse_s_expr matches reference implementation on {len(fnames)} LISP files')
+
+  rng = random.Random(0)
+  n = 0
+  for _ in range(20000):
+    s = random_s_expr(rng.randint(1, 30), rng)
+    if clean_s_expr(clean_s_expr(s)) != clean_s_expr(s):
+      continue
+    try:
+      expected = parse_s_expr_reference(s)
+    except Exception:
+      continue
+    assert parse_s_expr(s) == expected, s
+    n += 1
+  print(f'parse_s_expr matches reference implementation on {n} random S-expressions')
+
+
+def benchmark(n=3):
+  fnames = glob('agents/**/*.lisp', recursive=True)
+  contents = [lisp_contents(fname) for fname in fnames]
+  size = sum([len(c.encode()) for c in contents]) / 1e6
+  for label, parse in [('reference', parse_s_expr_reference), ('parse_s_expr', parse_s_expr)]:
+    times = []
+    for _ in range(n):
+      start = time.time()
+      for c in contents:
+        parse(c)
+      times.append(time.time() - start)
+    print(f'{label}: {size/min(times):.2f} MB/s ({size:.2f} MB, min of {n})')
+  big = '(' + ' '.join(contents) + ')'
+  for label, parse in [('reference', parse_s_expr_reference), ('parse_s_expr', parse_s_expr)]:
+    start = time.time()
+    parse(big)
+    t = time.time() - start
+    print(f'{label} (single S-expression of all files): {size/t:.2f} MB/s')
+
+
+def examples():
      
   sexpr = read_lisp('agents/sophie-gpt/rules/user-interpretation/gist/rules-for-yes-no.lisp')
   print(sexpr)
@@ -48,5 +226,11 @@ def main():
   print(s_expr)
 
 
+def main():
+  examples()
+  test_differential()
+  benchmark()
+
+
 if __name__ == "__main__":
   main()
\ No newline at end of file
@@ -0,0 +1,160 @@
+import glob
+import random
+
+from transduction import tt
+
+from eta.util.sexpr import read_lisp
+from eta.util.tt.choice import choose_result_for
+from eta.util.tt.parse import readrules, from_lisp_dirs
+
+SOPHIE_DIRS = ['agents/sophie/rules']
+SOPHIE_CASES = [
+  ([['what', 'is', 'my', 'prognosis', '?'], 'i am afraid the cancer has spread .'.split()], '*gist*'),
+  ([['what', 'do', 'my', 'test', 'results', 'mean', '?'], 'your test results show that the cancer has gotten worse .'.split()], '*gist*'),
+  ([['do', 'i', 'need', 'chemotherapy', '?'], 'chemotherapy could help you live longer , but it has side effects .'.split()], '*gist*'),
+  ([['my', 'pain', 'has', 'recently', 'been', 'getting', 'worse', '.'], 'where is your pain located ?'.split()], '*gist*'),
+  ([['can', 'i', 'have', 'a', 'stronger', 'pain', 'medication', '?'], 'we can give you something stronger for the pain .'.split()], '*gist*'),
+  ([['i', 'am', 'here', 'alone', '.'], 'is anyone here with you today ?'.split()], '*gist*'),
+  ([[], 'hello , how are you feeling today ?'.split()], '*gist*'),
+  ([[], 'do you have any questions for me ?'.split()], '*gist*'),
+]
+
+CASES = [
+  (SOPHIE_DIRS, SOPHIE_CASES),
+  (['agents/sophie-gpt/rules', 'agents/sophie-gpt/day1/rules'], [
+    (['do', 'i', 'need', 'chemotherapy', '?'], 'gist-clause-trees-for-input'),
+    (['my', 'lortab', 'has', 'not', 'been', 'working', 'recently', '.'], 'gist-clause-trees-for-input'),
+    (['what', 'are', 'my', 'options', 'for', 'treatment', '?'], 'gist-clause-trees-for-input'),
+    ([], 'gist-clause-trees-for-input'),
+    ('i wish i could say no , but unfortunately your cancer has spread .'.split(), '*cancer-worse-input*'),
+    ('where does it hurt the most ?'.split(), '*general-input*'),
+    ([[], 'yes , i think that would be the best option .'.split()], '*gist*'),
+    ([[], 'where is your pain located ?'.split()], '*gist*'),
+    ([['why', 'has', 'my', 'pain', 'been', 'getting', 'worse', 'recently', '?'], ['where', 'is', 'your', 'pain', '?']], '*gist*'),
+  ]),
+  (['agents/david-qa/rules'], [
+    ('that is enough for now .'.split(), 'spatial-question-input'),
+    ('where is the twitter block ?'.split(), 'spatial-question-input'),
+    ('here is my question is the mcdonalds blocked to the left of the twitter talk ?'.split(), 'spatial-question-input'),
+    (['spatial-question', 'is', 'the', 'mcdonalds', 'block', 'to_the_left_of', 'the', 'twitter', 'block', '?'], 'semantic'),
+    (['spatial-question', 'which', 'blocks', 'were', 'near', 'the', 'mercedes', 'block', '1', 'moves', 'ago', '?'], 'semantic'),
+  ]),
+  (['agents/test/rules'], [
+    (['test', 'string', 'one', '.'], 'latency-test'),
+  ]),
+]
+
+
+def read_dict_trees(dirs):
+  """Read the choice trees in a list of directories without compiling them."""
+  trees = {}
+  for dir in dirs:
+    for fname in glob.glob(dir + '/**/*.lisp', recursive=True):
+      for decl in read_lisp(fname):
+        if decl[0] == 'readrules':
+          trees[decl[1].strip("'").strip('*')] = readrules(decl[2])
+  return trees
+
+
+def counts(root):
+  """Get the latency countdowns of a dict choice tree in preorder."""
+  ret = []
+  stack = [root] if root else []
+  while stack:
+    node = stack.pop()
+    ret.append(node['count'])
+    stack += [x for x in [node['next'], node['child']] if x]
+  return ret
+
+
+def test_equivalence(repeats=5):
+  for dirs, cases in CASES:
+    compiled, feats, preds = from_lisp_dirs(dirs)
+    trees = read_dict_trees(dirs)
+    for clause, root in cases:
+      for i in range(repeats):
+        random.seed(i)
+        expected = choose_result_for(clause, root, trees, feats, preds)
+        random.seed(i)
+        assert choose_result_for(clause, root, compiled, feats, preds) == expected, (clause, root)
+    for name, tree in trees.items():
+      assert counts(tree) == compiled[name].count, name
+  print('compiled choice trees choose the same results as dict choice trees')
+
+
+def test_deep():
+  """Check that a long chain of failing siblings does not exceed the recursion limit."""
+  packet = []
+  for i in range(5000):
+    packet += [1, ['no-match', str(i)], 2, ['unused'], [0, ':out']]
+  packet += [1, ['0'], 2, ['matched'], [0, ':out']]
+  trees = { 'deep' : readrules(packet, compiled=True) }
+  assert choose_result_for(['x'], 'deep', trees, {}, {}) == (':out', ['matched'])
+  print('compiled choice trees are not limited by the recursion depth')
+
+
+def test_memo():
+  """Check that repeated searches of a subtree are only computed once, unless the subtree contains latency nodes."""
+  def make_trees(compiled):
+    return {
+      'top' : readrules([1, ['0'], 2, ['*leaf*', ['1']], [0, ':subtree-permute']], compiled=compiled),
+      'top-latency' : readrules([1, ['0'], 2, ['*leaf-latency*', ['1']], [0, ':subtree-permute']], compiled=compiled),
+      'leaf' : readrules([1, ['0', 'b'], 2, ['found', '1'], [0, ':out']], compiled=compiled),
+      'leaf-latency' : readrules([1, ['0', 'b'], 2, ['found', '1'], [1, ':out']], compiled=compiled),
+    }
+  clause = [['a', 'b'], ['c'], ['a', 'b'], ['a', 'b']]
+  match = tt.match
+  calls = 0
+  def counting_match(*args, **kwargs):
+    nonlocal calls
+    calls += 1
+    return match(*args, **kwargs)
+  tt.match = counting_match
+  try:
+    results = []
+    for compiled in [False, True]:
+      trees = make_trees(compiled)
+      calls = 0
+      results.append((choose_result_for(clause, 'top', trees, {}, {}), calls))
+      calls = 0
+      results.append((choose_result_for(clause, 'top-latency', trees, {}, {}), calls))
+  finally:
+    tt.match = match
+  assert results[0][0] == results[2][0] == [':and', (':out', ['found', 'a']), [], (':out', ['found', 'a']), (':out', ['found', 'a'])]
+  assert results[1][0] == results[3][0] == [':and', (':out', ['found', 'a']), [], [], (':out', ['found', 'a'])]
+  # Unless the leaf has latency, it is only searched once for the repeated branches (and the branch [c] is skipped)
+  assert results[0][1] == results[1][1] == 5
+  assert results[2][1] == 2 and results[3][1] == 4
+  print('repeated subtree searches are memoized, except for subtrees with latency')
+
+
+def benchmark_matches(dirs=SOPHIE_DIRS, cases=SOPHIE_CASES):
+  """Count the patterns matched in choosing results for the SOPHIE rules, with and without skipping patterns."""
+  compiled, feats, preds = from_lisp_dirs(dirs)
+  trees = read_dict_trees(dirs)
+  match = tt.match
+  calls = 0
+  def counting_match(*args, **kwargs):
+    nonlocal calls
+    calls += 1
+    return match(*args, **kwargs)
+  tt.match = counting_match
+  try:
+    for label, t in [('all patterns', trees), ('skipping patterns', compiled)]:
+      calls = 0
+      for clause, root in cases:
+        choose_result_for(clause, root, t, feats, preds)
+      print(f'{label}: {calls} match attempts for {len(cases)} inputs')
+  finally:
+    tt.match = match
+
+
+def main():
+  test_equivalence()
+  test_deep()
+  test_memo()
+  benchmark_matches()
+
+
+if __name__ == '__main__':
+  main()